@@ -1,5 +1,16 @@
 """TODO."""
 
-from . import utils
+import importlib
 
-__all__ = ("utils",)
+__all__ = ("utils", "scrape")
+
+
+def __getattr__(name: str):
+    # subpackages are imported on first access, so that `import greybox` stays cheap
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted((*globals(), *__all__))
@@ -1,52 +1,255 @@
 import os
 import argparse
 from pathlib import Path
-from tqdm import tqdm
-from PIL import Image
 
+from ..utils._concurrency import bounded_map
+from ..utils._encode import ENCODE_PROFILES, EncodeProfile, get_profile
+from ..utils._manifest import ConversionManifest
+from ..utils._metrics import (
+    Metrics,
+    disable_metrics,
+    enable_metrics,
+    get_metrics,
+    make_sink,
+)
+
+# PIL, tqdm and the process pool are imported where they are used, so that
+# `convert_png --help` is instant
+
+
+def convert_to_png(
+    input_path: str | Path,
+    output_path: str | Path | None = None,
+    manifest: ConversionManifest | None = None,
+    profile: str | EncodeProfile = "default",
+    max_size: int | tuple[int, int] | None = None,
+):
+    """Convert a single image file to PNG (or the format of `profile`).
+
+    Args:
+        input_path (str | Path): image file to convert.
+        output_path (str | Path | None, optional): file to write, `-1`, `-2`, ... is appended to its stem if it already exists. Defaults to `input_path` with the suffix of `profile`.
+        manifest (ConversionManifest | None, optional): manifest of previous runs, inputs that are unchanged since then are not converted again and changed inputs are rebuilt at their previous output path. Defaults to None.
+        profile (str | EncodeProfile, optional): encode profile, see `ENCODE_PROFILES`. Defaults to "default".
+        max_size (int | tuple[int, int] | None, optional): if given, the image is downscaled to fit in this (width, height), see `open_image`. Defaults to None.
+
+    Returns:
+        Path | None: the output file, or None if the image could not be converted.
+    """
+    from tqdm import tqdm
 
-def convert_to_png(input_path: str | Path, output_path: str | Path | None = None):
     input_path = Path(input_path).expanduser().resolve()
+    profile = get_profile(profile)
+
+    if manifest is not None and manifest.is_current(input_path):
+        return manifest.output_for(input_path)  # unchanged since the last run
 
     if output_path is None:
-        output_path = input_path.with_suffix(".png")
+        output_path = input_path.with_suffix(profile.suffix)
     else:
         output_path = Path(output_path).expanduser().resolve()
 
-    i = 0
-    _temp = output_path
-    while _temp.exists():
-        i += 1
-        _temp = _temp.with_stem(f"{output_path.stem}-{i}")
+    previous = None
+    if manifest is not None and input_path in manifest:
+        # the input (or the profile) changed, rebuild it in place rather than writing
+        # foo-1.png
+        previous = manifest.output_for(input_path)
+        output_path = previous.with_suffix(profile.suffix)
+    else:
+        i = 0
+        _temp = output_path
+        while _temp.exists():
+            i += 1
+            _temp = _temp.with_stem(f"{output_path.stem}-{i}")
+        output_path = _temp
 
-    output_path = _temp
+    if _save_png(input_path, output_path, profile, max_size) is None:
+        tqdm.write(f"Failed to convert: {input_path.as_posix()}")
+        return None
+    if manifest is not None:
+        _record(manifest, input_path, output_path, previous)
+    return output_path
 
-    try:
-        with Image.open(input_path) as img:
-            img.save(output_path, "PNG")
-            return output_path
 
+def _record(
+    manifest: ConversionManifest,
+    input_path: Path,
+    output_path: Path,
+    previous: Path | None,
+):
+    # the output of an earlier run with a different suffix is replaced by this one
+    if previous is not None and previous != output_path:
+        previous.unlink(missing_ok=True)
+    manifest.record(input_path, output_path)
+
+
+def _settings(profile: EncodeProfile, max_size) -> dict | None:
+    # recorded in the manifest so that outputs are rebuilt when the settings change,
+    # None for the defaults so that manifests of earlier versions stay valid
+    if profile == ENCODE_PROFILES["default"] and max_size is None:
+        return None
+    if isinstance(max_size, int):
+        max_size = (max_size, max_size)
+    return {
+        "format": profile.format,
+        "params": profile.params,
+        "max_size": None if max_size is None else list(max_size),
+    }
+
+
+def _save_png(
+    input_path: Path,
+    output_path: Path,
+    profile: EncodeProfile = ENCODE_PROFILES["default"],
+    max_size: int | tuple[int, int] | None = None,
+    metrics: Metrics | None = None,
+) -> Path | None:
+    from ..utils._encode import open_image, save_image
+
+    metrics = metrics or get_metrics()
+    try:
+        with metrics.time("decode"):
+            img = open_image(input_path, max_size)
+        with img, metrics.time("encode"):
+            save_image(img, output_path, profile)
     except Exception:
-        tqdm.write(f"Failed to convert: {input_path.as_posix()}")
+        return None
+    if metrics.enabled:
+        metrics.add("decode", count=0, nbytes=input_path.stat().st_size)
+        metrics.add("encode", count=0, nbytes=output_path.stat().st_size)
+    return output_path
+
+
+def _convert_job(job: tuple) -> tuple[Path, Path | None, dict | None]:
+    # module level so that it can be pickled and sent to worker processes, which
+    # record their metrics locally and send a snapshot back to be merged
+    input_path, output_path, profile, max_size, record = job
+    metrics = Metrics() if record else None
+    output_path = _save_png(input_path, output_path, profile, max_size, metrics)
+    return input_path, output_path, metrics and metrics.snapshot()
+
+
+def plan_outputs(
+    input_files: list[Path],
+    output_dir: str | Path,
+    manifest: ConversionManifest | None = None,
+    suffix: str = ".png",
+) -> list[tuple[Path, Path]]:
+    """Assign a unique output path to each input file before any conversion happens.
+
+    Names are resolved up front (in input order) so that they do not depend on which
+    worker finishes first: `foo.png`, `foo-1.png`, ... are allocated against both the
+    names already claimed by this plan and the files already present in `output_dir`.
+
+    Args:
+        input_files (list[Path]): files to convert.
+        output_dir (str | Path): directory to write the PNG files to.
+        manifest (ConversionManifest | None, optional): manifest of a previous run. Inputs that are unchanged since that run are left out of the plan and changed inputs are rebuilt at their previous output path (with `suffix`). Defaults to None.
+        suffix (str, optional): suffix of the output files. Defaults to ".png".
+
+    Returns:
+        list[tuple[Path, Path]]: (input path, output path) pairs.
+    """
+    output_dir = Path(output_dir).expanduser().resolve()
+    # names held by earlier runs stay reserved even if the output was deleted
+    claimed = set() if manifest is None else {p.name for p in manifest.outputs()}
+    plan = []
+    for input_path in input_files:
+        if manifest is not None and input_path in manifest:
+            if not manifest.is_current(input_path):
+                output_path = manifest.output_for(input_path).with_suffix(suffix)
+                plan.append((input_path, output_path))
+            continue
+        stem = input_path.stem
+        name, i = f"{stem}{suffix}", 0
+        while name in claimed or (output_dir / name).exists():
+            i += 1
+            name = f"{stem}-{i}{suffix}"
+        claimed.add(name)
+        plan.append((input_path, output_dir / name))
+    return plan
 
 
-def convert_images_to_png(input_dir: str | Path, output_dir: str | Path):
+def convert_images_to_png(
+    input_dir: str | Path,
+    output_dir: str | Path,
+    workers: int = 0,
+    incremental: bool = True,
+    prune: bool = False,
+    use_hash: bool = False,
+    profile: str | EncodeProfile = "default",
+    max_size: int | tuple[int, int] | None = None,
+):
+    """Convert all image files in `input_dir` (recursively) to PNG files in `output_dir`.
+
+    Args:
+        input_dir (str | Path): directory containing the images to convert.
+        output_dir (str | Path): directory to write the PNG files to.
+        workers (int, optional): number of worker processes used to decode/encode images, 0 converts serially in this process. Defaults to 0.
+        incremental (bool, optional): whether to keep a manifest in `output_dir` and skip inputs that are unchanged since the previous run. Defaults to True.
+        prune (bool, optional): whether to delete the outputs of inputs that no longer exist (requires `incremental`). Defaults to False.
+        use_hash (bool, optional): whether to also record a content hash of each input, so that touched-but-unmodified inputs are not rebuilt. Defaults to False.
+        profile (str | EncodeProfile, optional): encode profile, "default", "fast" (lowest zlib level), "small" (optimized PNG) or "webp" (lossless WebP files instead of PNG), see `ENCODE_PROFILES`. Outputs of a previous run with other settings are rebuilt. Defaults to "default".
+        max_size (int | tuple[int, int] | None, optional): if given, images are downscaled to fit in this (width, height), JPEGs are decoded in draft mode (see `open_image`). Defaults to None.
+
+    Returns:
+        int: the number of files that were converted successfully.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from tqdm import tqdm
+
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
-    # Loop through all files in the input directory
-    for file_path in tqdm(Path(input_dir).rglob("*.*")):
-        if file_path.is_file():  # Ensure it's a file and not a directory
-            try:
-                print(file_path.name)
-                # Convert the image to PNG and save to the output directory
-                output_file = Path(output_dir) / f"{file_path.stem}.png"
-                convert_to_png(str(file_path), str(output_file))
-            except Exception as e:
-                print(e)
+    metrics = get_metrics()
+    # sorted so that output names are deterministic across runs
+    with metrics.time("discover", count=0):
+        input_files = sorted(
+            p.resolve()
+            for p in Path(input_dir).expanduser().rglob("*.*")
+            if p.is_file()
+        )
+    metrics.add("discover", count=len(input_files))
+    profile = get_profile(profile)
+    manifest = None
+    if incremental:
+        manifest = ConversionManifest(
+            output_dir, use_hash=use_hash, settings=_settings(profile, max_size)
+        )
+        if prune:
+            for input_path in manifest.prune(input_files):
+                tqdm.write(f"Pruned: {input_path}")
+    plan = plan_outputs(
+        input_files, output_dir, manifest=manifest, suffix=profile.suffix
+    )
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    converted = 0
+    try:
+        with tqdm(total=len(plan), unit="file") as pbar:
+            pbar.set_postfix(skipped=len(input_files) - len(plan))
+            jobs = ((i, o, profile, max_size, metrics.enabled) for i, o in plan)
+            results = bounded_map(_convert_job, jobs, executor=executor, ordered=False)
+            for input_path, output_path, snapshot in results:
+                metrics.merge(snapshot)
+                if output_path is None:
+                    tqdm.write(f"Failed to convert: {input_path.as_posix()}")
+                else:
+                    converted += 1
+                    if manifest is not None:
+                        previous = manifest.output_for(input_path)
+                        _record(manifest, input_path, output_path, previous)
+                pbar.update(1)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if manifest is not None:
+            manifest.close()
+    return converted
 
 
 def main():
+    """Command line entry point of `convert_png`, see `convert_images_to_png`."""
     parser = argparse.ArgumentParser(
         description="Convert all image files in a directory to PNG format."
     )
@@ -59,10 +262,64 @@ def main():
         type=str,
         help="Path to the output directory where PNGs will be saved.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of worker processes to convert with (0 converts serially).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the manifest of previous runs and convert every file.",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete outputs whose input files no longer exist.",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Record content hashes so touched-but-unmodified files are skipped.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(ENCODE_PROFILES),
+        default="default",
+        help="Encode profile: fast (low zlib level), small (optimized) or webp (lossless WebP).",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=None,
+        help="Downscale images to fit in a square of this size (JPEGs are decoded in draft mode).",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Write per-stage metrics to this file (.prom for Prometheus, else JSON lines).",
+    )
 
     args = parser.parse_args()
 
-    convert_images_to_png(args.input_dir, args.output_dir)
+    if args.metrics is not None:
+        enable_metrics(make_sink(args.metrics), flush_interval=10.0)
+    try:
+        convert_images_to_png(
+            args.input_dir,
+            args.output_dir,
+            workers=args.workers,
+            incremental=not args.full,
+            prune=args.prune,
+            use_hash=args.hash,
+            profile=args.profile,
+            max_size=args.max_size,
+        )
+    finally:
+        if args.metrics is not None:
+            disable_metrics()
 
 
 if __name__ == "__main__":
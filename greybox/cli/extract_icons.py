@@ -1,113 +1,554 @@
-import cv2
-import numpy as np
-from PIL import Image
+"""Extract the icons of all images in a directory (and the archives in it) to files.
+
+Images are found with `FileExtractor.stream_all` and streamed through a `Pipeline`:
+decode (threads) → background detection and icon extraction (processes) → write
+(threads). Tile sheets are cut into their grid cells, the icons of other images are
+found as connected components (see `extract_icons`, `--mode contour` always does). The icons of `input_dir/a/b.png` are written to `output_dir/a/b.png/0000.png`,
+`0001.png`, ... (members of archives keep the archive in their path). With `--shards`
+the icons are streamed into a few large shard files instead (see `ShardWriter`), each
+with the path of its image and its bounding box in it. With `--dedup` files and icons
+that were seen before (in this or an earlier run) are skipped, the remaining icons
+keep their index in the image. Icons are added to the index once they are written and
+files once all of their icons are, so that an interrupted run (or a file that failed
+to decode) does not make the next run skip work that was never finished.
+
+Animated images and videos are decoded frame by frame (see `iter_frames`), the icons
+of frame 12 of `input_dir/a/b.gif` are written to `output_dir/a/b.gif/f000012/`.
+Frames are sampled with `--frame-stride`/`--frame-interval` and frames that barely
+differ from the previous one are skipped. A decode worker holds all sampled frames of
+a file, long videos are best sampled sparsely.
+
+Usage:
+    extract_icons sprites/ icons/ --depth 2 --extract-workers 8
+    extract_icons sprites/ shards/ --shards tar
+"""
+
+import argparse
 import os
-from PIL import Image
+import threading
 from collections import Counter
+from collections.abc import Callable
+from functools import partial
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING
+
+from ..utils._encode import ENCODE_PROFILES, EncodeProfile, get_profile
+from ..utils._metrics import disable_metrics, enable_metrics, make_sink
+from ..utils._pipeline import Pipeline, Stage
+
+if TYPE_CHECKING:
+    from ..utils._dedup import DedupIndex
+    from ..utils._shards import ShardWriter
+
+# OpenCV, PIL and tqdm are imported where they are used, so that `extract_icons --help`
+# is instant. The extraction functions used to live here and can still be imported
+# from this module.
+_MOVED = (
+    "extract_icons_from_color_background",
+    "combine_close_bounding_rects",
+    "most_common_color",
+)
+# as named by `sniff`, which the files are classified with
+IMAGE_SUFFIXES = (".png", ".jpeg", ".webp", ".bmp", ".tiff", ".gif", ".ico", ".psd")
+VIDEO_SUFFIXES = (".mp4", ".mov", ".avi", ".webm", ".mkv")
+
+
+def __getattr__(name: str):
+    if name in _MOVED:
+        from ..utils import _background
+
+        return getattr(_background, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _InFlight:
+    # the files and icons of a run with `dedup` that are not written yet. Icons are
+    # added to the index once they are written and files once all of their icons are,
+    # so only the work in flight is kept in memory
+
+    def __init__(self, index: "DedupIndex"):
+        self.index = index
+        self._lock = threading.Lock()
+        self._files: dict[str, list] = {}  # path -> [digest, items in flight, failed]
+        self._digests: set[bytes] = set()
+        self._icons: Counter[int] = Counter()
+
+    def add_file(self, path: str, digest: bytes) -> bool:
+        # False for a copy of a file in flight (or one recorded since it was found)
+        with self._lock:
+            if digest in self._digests or self.index.has_digest(digest):
+                return False
+            self._digests.add(digest)
+            self._files[path] = [digest, 1, False]  # held until its images are found
+            return True
+
+    def update(self, path: str, n: int, failed: bool = False):
+        # `n` more (or fewer) items of the file are in flight
+        with self._lock:
+            self._update(path, n, failed)
+
+    def _update(self, path: str, n: int, failed: bool = False):
+        entry = self._files[path]
+        entry[1] += n
+        entry[2] |= failed
+        if entry[1] > 0:
+            return
+        digest, _, failed = self._files.pop(path)
+        if not failed:  # tried again next time
+            self.index.add_digest(digest, path)
+        self._digests.discard(digest)
+
+    def accept(self, h: int) -> bool:
+        # False for a near duplicate of an icon in the index or in flight
+        from ..utils._dedup import hamming
+
+        with self._lock:
+            if (
+                self._icons
+                and (hamming(list(self._icons), h) <= self.index.max_distance).any()
+            ):
+                return False
+            if self.index.query(h):
+                return False
+            self._icons[h] += 1
+            return True
+
+    def written(self, job: tuple):
+        file, path, i, _, _, h = job
+        with self._lock:
+            self.index.add([h], [f"{path}#{i}"])
+            self._icons[h] -= 1
+            if not self._icons[h]:
+                del self._icons[h]
+            self._update(file, -1)
+
+
+def _discover(input_dir: Path, depth: int, in_flight: _InFlight | None = None):
+    from ..utils._file_utils import FileExtractor
+
+    index = None if in_flight is None else in_flight.index
+    extractor = FileExtractor(dedup=index, record_files=False)
+    for file in extractor.stream_all(input_dir, depth=depth):
+        path = file.path.as_posix()
+        if file.ext in VIDEO_SUFFIXES and Path(file.path).is_file():
+            job = path, None  # streamed from disk by `_frames`
+        elif file.ext in IMAGE_SUFFIXES or file.ext in VIDEO_SUFFIXES:
+            # handles to archive members are only valid until the next file is found
+            job = path, file.read()
+        else:
+            continue
+        if in_flight is not None and not in_flight.add_file(path, file.digest):
+            continue
+        yield job
+
 
+def _decode(job: tuple[str, bytes | None], **frame_options) -> tuple:
+    # the images of a file (one, or the sampled frames), and whether decoding failed
+    import numpy as np
+    from PIL import Image
+    from tqdm import tqdm
 
-def extract_icons_from_color_background(
-    image: Image.Image | np.ndarray,
-    background_color: tuple[int, int, int],
-    close_enough_threshold: int = 10,
-):
-    # Convert image to numpy array
-    image = np.array(image)
+    from ..utils._sniff import CATEGORIES, SNIFF_SIZE, sniff
 
-    # Validate image shape
-    if image.shape[-1] != 3 and image.shape[-1] != 4:
-        raise ValueError(f"Image must be RGB or RGBA, got shape: {image.shape}")
+    path, data = job
+    if data is None or CATEGORIES.get(sniff(data[:SNIFF_SIZE])) == "video":
+        return _frames(path, path if data is None else data, **frame_options)
+    try:
+        with Image.open(BytesIO(data)) as img:
+            if getattr(img, "n_frames", 1) > 1:
+                return _frames(path, data, **frame_options)
+            alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+            image = np.asarray(img.convert("RGBA" if alpha else "RGB"))
+    except Exception:
+        tqdm.write(f"Failed to decode: {path}")
+        return path, [], True
+    return path, [(path, image)], False
 
-    # Separate the RGB channels
-    r, g, b = image[..., 0], image[..., 1], image[..., 2]
 
-    # Create a mask where the background color is detected
-    mask = cv2.inRange(cv2.merge([r, g, b]), background_color, background_color)
-    mask = cv2.bitwise_not(
-        mask
-    )  # Invert mask to get icons as white on black background
+def _frames(path: str, source, **frame_options) -> tuple:
+    # all sampled frames are decoded here, by the decode worker, rather than lazily by
+    # the (single) thread consuming its results. The frames decoded before an error
+    # are kept, but the file is tried again by the next run
+    from tqdm import tqdm
 
-    # Find contours (icons) using the mask
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    from ..utils._frames import iter_frames
 
-    # Combine close contours
-    bounding_rects = []
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        bounding_rects.append((x, y, w, h))
+    frames = []
+    try:
+        for frame in iter_frames(source, **frame_options):
+            frames.append((f"{path}/f{frame.index:06d}", frame.image))
+    except Exception:
+        tqdm.write(f"Failed to decode: {path}")
+        return path, frames, True
+    return path, frames, False
 
-    combined_rects = combine_close_bounding_rects(
-        bounding_rects, close_enough_threshold
+
+def _images(job: tuple, in_flight: _InFlight | None = None) -> list[tuple]:
+    # inline, the images (or frames) of a decoded file, with the path of the file
+    path, images, failed = job
+    if in_flight is not None:
+        in_flight.update(path, len(images) - 1, failed=failed)  # the file is done
+    return [(path, image_path, image) for image_path, image in images]
+
+
+def _extract(
+    job: tuple, min_size: int = 1, mode: str = "auto", hash: Callable | None = None
+) -> tuple:
+    # module level so that it can be pickled and sent to worker processes
+    from ..utils._background import (
+        extract_icons_from_color_background,
+        most_common_color,
     )
+    from ..utils._extract_icons import extract_icons
+
+    file, path, image = job
+    if image.shape[-1] == 4 and (image[..., 3] < 255).any():
+        icons = extract_icons(image, mode=mode, output="array", with_boxes=True)
+    else:
+        background = most_common_color(image[..., :3], mode="border")
+        icons = extract_icons_from_color_background(
+            image, background, output="array", with_boxes=True
+        )
+    icons = [(icon, box) for icon, box in icons if min(icon.shape[:2]) >= min_size]
+    # hashed here rather than in the (single) dedup stage
+    hashes = hash([icon for icon, _ in icons]) if hash is not None and icons else None
+    return file, path, icons, hashes
+
+
+def _icons(job: tuple, in_flight: _InFlight | None = None) -> list[tuple]:
+    # inline, icons keep their index in the image when the duplicates are dropped
+    file, path, icons, hashes = job
+    jobs = []
+    for i, (icon, box) in enumerate(icons):
+        h = None
+        if in_flight is not None:
+            h = int(hashes[i])
+            if not in_flight.accept(h):
+                continue
+        jobs.append((file, path, i, icon, box, h))
+    if in_flight is not None:
+        in_flight.update(file, len(jobs) - 1)  # the image is done
+    return jobs
 
-    # Extract icons
-    for i, (x, y, w, h) in enumerate(combined_rects):
-        # Extract the icon using the bounding box
-        icon = image[y : y + h, x : x + w]
 
-        # Convert the extracted icon back to an Image (with alpha channel if available)
-        icon_image = Image.fromarray(icon)
-        yield icon_image
+def _record(job: tuple, in_flight: _InFlight | None):
+    if in_flight is not None:
+        in_flight.written(job)
 
 
-def combine_close_bounding_rects(bounding_rects, threshold):
-    combined = []
+def _write(
+    job: tuple,
+    input_dir: str,
+    output_dir: Path,
+    profile: EncodeProfile,
+    in_flight: _InFlight | None = None,
+) -> Path:
+    from PIL import Image
 
-    def are_close(rect1, rect2, threshold):
-        x1, y1, w1, h1 = rect1
-        x2, y2, w2, h2 = rect2
-        return abs(x1 - x2) <= threshold and abs(y1 - y2) <= threshold
+    from ..utils._encode import save_image
 
-    while bounding_rects:
-        rect = bounding_rects.pop(0)
-        combined_rects = [rect]
+    _, path, i, icon, *_ = job
+    # the suffix is kept, so that a/b.png and a/b.jpg do not share a directory
+    relative = PurePosixPath(path).relative_to(input_dir)
+    output_path = output_dir / relative / f"{i:04d}{profile.suffix}"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    save_image(Image.fromarray(icon), output_path, profile)
+    _record(job, in_flight)
+    return output_path
 
-        for other_rect in bounding_rects[:]:
-            if any(are_close(rect, other_rect, threshold) for rect in combined_rects):
-                combined_rects.append(other_rect)
-                bounding_rects.remove(other_rect)
 
-        # Create a bounding box that covers all combined rectangles
-        x_coords = [r[0] for r in combined_rects]
-        y_coords = [r[1] for r in combined_rects]
-        widths = [r[0] + r[2] for r in combined_rects]
-        heights = [r[1] + r[3] for r in combined_rects]
+def _write_shard(
+    job: tuple,
+    input_dir: str,
+    writer: "ShardWriter",
+    in_flight: _InFlight | None = None,
+) -> str:
+    # inline, the writer is not thread safe
+    _, path, i, icon, bbox, _ = job
+    source = PurePosixPath(path).relative_to(input_dir)
+    key = writer.write(icon, source=source, bbox=bbox, index=i)
+    _record(job, in_flight)
+    return key
 
-        x_min = min(x_coords)
-        y_min = min(y_coords)
-        x_max = max(widths)
-        y_max = max(heights)
 
-        combined.append((x_min, y_min, x_max - x_min, y_max - y_min))
+def extract_icons_from_directory(
+    input_dir: str | Path,
+    output_dir: str | Path,
+    depth: int = 1,
+    decode_workers: int = 4,
+    extract_workers: int | None = None,
+    write_workers: int = 4,
+    ordered: bool = True,
+    min_size: int = 1,
+    profile: str | EncodeProfile = "default",
+    dedup: "str | Path | DedupIndex | None" = None,
+    frame_stride: int = 1,
+    frame_interval: float | None = None,
+    frame_difference: float = 1.0,
+    shards: "str | ShardWriter | None" = None,
+    mode: str = "auto",
+) -> int:
+    """Extract the icons of all images in `input_dir` (recursively) to `output_dir`.
 
-    return combined
+    Images with transparency are split with `extract_icons`, others with
+    `extract_icons_from_color_background`, using the most common colour of their
+    border as the background.
 
+    Args:
+        input_dir (str | Path): directory containing the images (and archives of images).
+        output_dir (str | Path): directory to write the icons (or shards) to.
+        depth (int, optional): how many levels of (nested) archives to open. Defaults to 1.
+        decode_workers (int, optional): number of threads decoding images. Defaults to 4.
+        extract_workers (int | None, optional): number of processes extracting icons, 0 extracts in this process. Defaults to the number of CPUs.
+        write_workers (int, optional): number of threads encoding and writing icons. Defaults to 4.
+        ordered (bool, optional): whether icons are written in the order the images were found, otherwise as they are ready. Defaults to True.
+        min_size (int, optional): icons whose width or height is smaller are skipped. Defaults to 1.
+        profile (str | EncodeProfile, optional): encode profile of the icons, see `ENCODE_PROFILES`. Defaults to "default".
+        dedup (str | Path | DedupIndex | None, optional): index (or path of one) used to skip duplicate files and near duplicate icons. Defaults to None.
+        frame_stride (int, optional): use every `frame_stride`-th frame of animations and videos. Defaults to 1.
+        frame_interval (float | None, optional): use at most one frame per `frame_interval` seconds. Defaults to None.
+        frame_difference (float, optional): skip frames whose mean absolute difference to the last used frame is smaller (in gray levels), see `iter_frames`. Defaults to 1.0.
+        shards (str | ShardWriter | None, optional): if given, the icons are written to `ShardWriter` shards of this format ("tar" or "array"), or to this writer, instead of one file per icon, with their source image (relative to `input_dir`), bounding box and index as metadata. Tar shards use the format of `profile`. Defaults to None.
+        mode (str, optional): how images with transparency are split, "auto" cuts tile sheets into their grid cells (see `detect_grid`) and finds the icons of other images as connected components, "contour" always does the latter. Defaults to "auto".
 
-def most_common_color(image: Image.Image | np.ndarray):
-    if isinstance(image, np.ndarray):
-        image = Image.fromarray(image)
-    colors = list(image.getdata())
-    color_counts = Counter(colors)
-    return color_counts.most_common(1)[0][0]
+    Returns:
+        int: the number of icons that were written.
+    """
+    from tqdm import tqdm
 
+    from ..utils._dedup import DedupIndex
 
-# Example usage
-input_image_path = "input_image.png"
-background_color = (255, 255, 255)  # White background
-close_enough_threshold = 10  # Adjust this value as needed
+    if isinstance(dedup, (str, Path)):
+        with DedupIndex(dedup) as index:
+            return extract_icons_from_directory(
+                input_dir,
+                output_dir,
+                depth,
+                decode_workers,
+                extract_workers,
+                write_workers,
+                ordered,
+                min_size,
+                profile,
+                index,
+                frame_stride,
+                frame_interval,
+                frame_difference,
+                shards,
+                mode,
+            )
+    if isinstance(shards, str):
+        from ..utils._shards import ShardWriter
 
-# Example usage
-input_image_path = "/home/ben/Documents/repos/graybox/input-prompt/4df982325757d7789451de6dc7ba3bb5a2331ebc.png"
-image = Image.open(input_image_path).convert("RGBA")
-background_color = most_common_color(image)
-print(f"Using background color: {background_color}")
+        profile = get_profile(profile)
+        with ShardWriter(
+            output_dir,
+            format=shards,
+            image_format=profile.format,
+            image_params=profile.params,
+        ) as writer:
+            return extract_icons_from_directory(
+                input_dir,
+                output_dir,
+                depth,
+                decode_workers,
+                extract_workers,
+                write_workers,
+                ordered,
+                min_size,
+                profile,
+                dedup,
+                frame_stride,
+                frame_interval,
+                frame_difference,
+                writer,
+                mode,
+            )
+    input_dir = Path(input_dir).expanduser().resolve()
+    output_dir = Path(output_dir).expanduser().resolve()
+    if mode not in ("auto", "contour"):
+        raise ValueError(f"Unknown mode: {mode}, expected 'auto' or 'contour'")
+    if extract_workers is None:
+        extract_workers = os.cpu_count() or 1
+    # the index is not shared with the workers, files and icons are checked (and
+    # recorded) in this process
+    in_flight = None if dedup is None else _InFlight(dedup)
+    stages = [
+        Stage(
+            partial(
+                _decode,
+                stride=frame_stride,
+                interval=frame_interval,
+                min_difference=frame_difference,
+            ),
+            name="decode",
+            workers=decode_workers,
+        ),
+        Stage(
+            partial(_images, in_flight=in_flight),
+            name="images",
+            executor="inline",
+            flatten=True,
+        ),
+        Stage(
+            partial(
+                _extract,
+                min_size=min_size,
+                mode=mode,
+                hash=None if dedup is None else dedup.hash,
+            ),
+            name="extract",
+            workers=extract_workers,
+            executor="process",
+        ),
+        Stage(
+            partial(_icons, in_flight=in_flight),
+            name="icons",
+            executor="inline",
+            flatten=True,
+        ),
+    ]
+    if shards is None:
+        write = Stage(
+            partial(
+                _write,
+                input_dir=input_dir.as_posix(),
+                output_dir=output_dir,
+                profile=get_profile(profile),
+                in_flight=in_flight,
+            ),
+            name="write",
+            workers=write_workers,
+        )
+    else:
+        write = Stage(
+            partial(
+                _write_shard,
+                input_dir=input_dir.as_posix(),
+                writer=shards,
+                in_flight=in_flight,
+            ),
+            name="write",
+            executor="inline",
+        )
+    pipeline = Pipeline(*stages, write, ordered=ordered)
+    written = 0
+    with tqdm(unit="icon") as pbar:
+        for _ in pipeline.run(_discover(input_dir, depth, in_flight)):
+            written += 1
+            pbar.update(1)
+            pbar.set_postfix(images=pipeline.stats["extract"], refresh=False)
+    return written
+
+
+def main():
+    """Command line entry point of `extract_icons`, see `extract_icons_from_directory`."""
+    parser = argparse.ArgumentParser(
+        description="Extract the icons of all images in a directory to separate files."
+    )
+    parser.add_argument("input_dir", type=str, help="Directory containing the images.")
+    parser.add_argument("output_dir", type=str, help="Directory to write the icons to.")
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=1,
+        help="How many levels of (nested) archives to open.",
+    )
+    parser.add_argument(
+        "--decode-workers", type=int, default=4, help="Threads decoding images."
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=None,
+        help="Processes extracting icons (0 extracts in the main process).",
+    )
+    parser.add_argument(
+        "--write-workers", type=int, default=4, help="Threads writing icons."
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Write icons as they are ready rather than in input order.",
+    )
+    parser.add_argument(
+        "--min-size", type=int, default=1, help="Skip icons smaller than this."
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(ENCODE_PROFILES),
+        default="default",
+        help="Encode profile: fast (low zlib level), small (optimized) or webp (lossless WebP).",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["auto", "contour"],
+        default="auto",
+        help="Cut tile sheets into their grid cells (auto), or always find connected icons (contour).",
+    )
+    parser.add_argument(
+        "--shards",
+        choices=["tar", "array"],
+        default=None,
+        help="Write the icons to shards of this format (with their source and bounding box) instead of separate files.",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Write per-stage metrics to this file (.prom for Prometheus, else JSON lines).",
+    )
+    parser.add_argument(
+        "--dedup",
+        type=str,
+        default=None,
+        help="SQLite index of seen files and icons, duplicates of them are skipped.",
+    )
+    parser.add_argument(
+        "--frame-stride",
+        type=int,
+        default=1,
+        help="Use every n-th frame of animations and videos.",
+    )
+    parser.add_argument(
+        "--frame-interval",
+        type=float,
+        default=None,
+        help="Use at most one frame of animations and videos per this many seconds.",
+    )
+    parser.add_argument(
+        "--frame-difference",
+        type=float,
+        default=1.0,
+        help="Skip frames whose mean difference to the last used frame is smaller (0-255, 0 keeps all).",
+    )
+    args = parser.parse_args()
 
-# output_directory = "/home/ben/Documents/repos/graybox/dataset/input-prompts/unknown"
+    if args.metrics is not None:
+        enable_metrics(make_sink(args.metrics), flush_interval=10.0)
+    try:
+        extract_icons_from_directory(
+            args.input_dir,
+            args.output_dir,
+            depth=args.depth,
+            decode_workers=args.decode_workers,
+            extract_workers=args.extract_workers,
+            write_workers=args.write_workers,
+            ordered=not args.unordered,
+            min_size=args.min_size,
+            profile=args.profile,
+            dedup=args.dedup,
+            frame_stride=args.frame_stride,
+            frame_interval=args.frame_interval,
+            frame_difference=args.frame_difference,
+            shards=args.shards,
+            mode=args.mode,
+        )
+    finally:
+        if args.metrics is not None:
+            disable_metrics()
 
-# # Extract icons
-# for i, icon_image in enumerate(
-#     extract_icons_from_color_background(image, background_color, close_enough_threshold)
-# ):
-#     output_path = os.path.join(output_directory, f"UNKNOWN_{i+1}.png")
 
-#     icon_image.save(output_path)
+if __name__ == "__main__":
+    main()
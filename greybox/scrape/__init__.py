@@ -1 +1,45 @@
-from ._scrape import *
+"""Scraping utilities."""
+
+import importlib
+from typing import TYPE_CHECKING
+
+# name -> submodule that defines it, imported on first access (pandas, requests, ...)
+_LAZY = {
+    "AdaptiveLimit": "_scrape",
+    "ScrapeResult": "_scrape",
+    "Scheduler": "_scrape",
+    "MEDIA_COLUMNS": "_download",
+    "HostRateLimiter": "_ratelimit",
+    "MetadataStore": "_store",
+    "TokenBucket": "_ratelimit",
+    "download_media": "_download",
+}
+
+__all__ = (
+    "AdaptiveLimit",
+    "ScrapeResult",
+    "Scheduler",
+    "MEDIA_COLUMNS",
+    "HostRateLimiter",
+    "MetadataStore",
+    "TokenBucket",
+    "download_media",
+)
+
+if TYPE_CHECKING:
+    from ._download import MEDIA_COLUMNS, download_media
+    from ._ratelimit import HostRateLimiter, TokenBucket
+    from ._scrape import AdaptiveLimit, ScrapeResult, Scheduler
+    from ._store import MetadataStore
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value  # cache, __getattr__ is only called for missing names
+    return value
+
+
+def __dir__():
+    return sorted((*globals(), *__all__))
@@ -0,0 +1,271 @@
+"""Bulk, resumable download of the media (icons, header images, ...) of scraped apps."""
+
+import json
+import random
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import requests
+from tqdm import tqdm
+
+from ..utils._concurrency import bounded_map
+from ..utils._http import DEFAULT_TIMEOUT, _atomic_write, make_session
+from ..utils._metrics import get_metrics
+from ..utils._sniff import SNIFF_SIZE, sniff
+from ._ratelimit import HostRateLimiter
+from ._store import MetadataStore
+
+__all__ = ("download_media", "MEDIA_COLUMNS")
+
+MEDIA_COLUMNS = ("icon", "headerImage", "videoImage")
+RETRY_STATUS = frozenset((408, 425, 429, 500, 502, 503, 504))
+
+
+class DownloadJournal:
+    """Append-only JSON-lines record of finished downloads, used to resume a run.
+
+    Each line records the key (`{appid}/{column}`), url and file of a download (or the
+    error of a permanent failure), the last line for a key wins.
+    """
+
+    FILENAME = ".greybox-download-journal.jsonl"
+
+    def __init__(self, directory: str | Path):
+        self.path = Path(directory) / DownloadJournal.FILENAME
+        self._entries: dict[str, dict] = {}
+        self._partial = False  # whether the last line was cut off
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    self._partial = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partially written line from an interrupted run
+                    self._entries[entry["key"]] = entry
+        self._file = None
+
+    def get(self, key: str) -> dict | None:
+        """The last record of `key` (or None)."""
+        return self._entries.get(key)
+
+    def record(self, entry: dict):
+        """Append a record, it is flushed straight away."""
+        self._entries[entry["key"]] = entry
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a")
+            if self._partial:
+                self._file.write("\n")  # the new records start on a line of their own
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        """Close the journal file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _read_tables(
+    tables, columns: tuple[str, ...], id_column: str
+) -> Iterator[pd.DataFrame]:
+    # yield data frames with (only) the id and media columns, matched case-insensitively
+    # (the scraper writes lowercase column names)
+    if isinstance(tables, (pd.DataFrame, MetadataStore, str, Path)):
+        tables = [tables]
+    wanted = {c.lower() for c in (id_column, *columns)}
+    for table in tables:
+        if isinstance(table, MetadataStore):
+            # only the id and media columns are read from the store
+            yield from table.read(wanted, chunksize=10000)
+            continue
+        if not isinstance(table, pd.DataFrame):
+            path = Path(table).expanduser()
+            paths = sorted(path.glob("*.csv")) if path.is_dir() else [path]
+            for path in paths:
+                yield from _read_tables(
+                    pd.read_csv(path, usecols=lambda c: c.lower() in wanted),
+                    columns,
+                    id_column,
+                )
+            continue
+        rename = {c: c.lower() for c in table.columns if c.lower() in wanted}
+        yield table[list(rename)].rename(columns=rename)
+
+
+def _jobs(tables, columns, id_column, journal, retry_failed) -> Iterator[tuple]:
+    for table in tables:
+        media = [c for c in columns if c.lower() in table.columns]
+        for row in table.itertuples(index=False):
+            row = row._asdict()
+            appid = row.get(id_column.lower())
+            if not isinstance(appid, str):
+                continue
+            for column in media:
+                url = row[column.lower()]
+                if not isinstance(url, str) or not url.startswith("http"):
+                    continue  # missing (NaN) or not a url
+                key = f"{appid}/{column}"
+                entry = journal.get(key)
+                if entry is not None and entry["url"] == url:
+                    if "file" in entry or not retry_failed:
+                        yield None  # finished (or failed for good) in a previous run
+                        continue
+                yield key, url, appid.replace(".", "-"), column
+
+
+def _download(
+    job: tuple,
+    output_dir: Path,
+    session: requests.Session,
+    limiter: HostRateLimiter,
+    retries: int,
+    backoff: float,
+    timeout: float,
+) -> dict:
+    key, url, folder, column = job
+    entry = {"key": key, "url": url}
+    # times include rate limiting and retries, i.e. the latency of each file
+    metrics, start = get_metrics(), time.perf_counter()
+    for attempt in range(retries + 1):
+        limiter.acquire(url)
+        wait = backoff * 2**attempt * (1 + random.random())  # exponential + jitter
+        try:
+            response = session.get(url, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            entry["error"] = repr(e)
+            if attempt < retries:
+                time.sleep(wait)
+            continue
+        if response.status_code in RETRY_STATUS:
+            entry["error"], entry["status"] = response.reason, response.status_code
+            retry_after = response.headers.get("Retry-After", "")
+            if attempt < retries:
+                time.sleep(float(retry_after) if retry_after.isdigit() else wait)
+            continue
+        if not response.ok:
+            # permanent failure (e.g. 404), no point in retrying
+            entry["error"], entry["status"] = response.reason, response.status_code
+            entry["permanent"] = True
+            break
+        ext = sniff(response.content[:SNIFF_SIZE], response.headers.get("Content-Type"))
+        if ext is None:
+            entry["error"] = "unknown content type"
+            entry["permanent"] = True
+            break
+        path = output_dir / folder / f"{column}{ext}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(path, response.content)
+        entry.pop("error", None)
+        entry.pop("status", None)
+        entry["file"] = path.relative_to(output_dir).as_posix()
+        entry["bytes"] = len(response.content)
+        metrics.add("download", time.perf_counter() - start, nbytes=entry["bytes"])
+        return entry
+    metrics.add("download_failed", time.perf_counter() - start)
+    return entry
+
+
+def download_media(
+    tables: pd.DataFrame
+    | MetadataStore
+    | str
+    | Path
+    | Iterable[pd.DataFrame | MetadataStore | str | Path],
+    output_dir: str | Path,
+    columns: Iterable[str] = MEDIA_COLUMNS,
+    id_column: str = "appId",
+    concurrency: int = 16,
+    rate: float = 10.0,
+    burst: float | None = None,
+    retries: int = 5,
+    backoff: float = 0.5,
+    timeout: float = DEFAULT_TIMEOUT,
+    retry_failed: bool = False,
+) -> Counter:
+    """Download the media referenced by scraped app metadata.
+
+    The file of column `c` of the app with id `a` is written to
+    `output_dir/{a with "." replaced by "-"}/{c}{ext}`, where the extension is sniffed
+    from the downloaded bytes (see `greybox.utils._sniff.sniff`). Downloads run on a
+    pool of `concurrency` threads sharing one connection pool, are rate limited per
+    host and are retried with exponential backoff on connection errors, timeouts, 429
+    and 5xx responses (honouring `Retry-After`). Files are written atomically and every
+    finished download is appended to a journal in `output_dir`, so an interrupted run
+    can be resumed without re-requesting anything that was already downloaded.
+
+    Example:
+        ```python
+        download_media(
+            "~/.dataset/google-play/game_metadata", "~/.dataset/google-play/media"
+        )
+        ```
+
+    Args:
+        tables (pd.DataFrame | MetadataStore | str | Path | Iterable[pd.DataFrame | MetadataStore | str | Path]): metadata tables, stores (see `MetadataStore`), csv files or directories of csv files. Column names are matched case-insensitively.
+        output_dir (str | Path): directory to download the media to.
+        columns (Iterable[str], optional): columns holding media urls. Defaults to ("icon", "headerImage", "videoImage").
+        id_column (str, optional): column holding the app id. Defaults to "appId".
+        concurrency (int, optional): number of concurrent downloads. Defaults to 16.
+        rate (float, optional): maximum requests per second to each host. Defaults to 10.
+        burst (float | None, optional): maximum burst of requests to each host. Defaults to max(1, rate).
+        retries (int, optional): number of retries of each download. Defaults to 5.
+        backoff (float, optional): base of the exponential backoff between retries in seconds. Defaults to 0.5.
+        timeout (float, optional): request timeout in seconds. Defaults to 30.
+        retry_failed (bool, optional): whether to retry downloads that failed permanently (e.g. 404) in a previous run. Defaults to False.
+
+    Returns:
+        Counter: number of media that were "downloaded", "skipped" (done in a previous run) or "failed".
+    """
+    output_dir = Path(output_dir).expanduser().resolve()
+    columns = tuple(columns)
+    journal = DownloadJournal(output_dir)
+    session = make_session(pool_size=concurrency, retries=0)  # retried here instead
+    limiter = HostRateLimiter(rate, burst)
+    counts = Counter()
+
+    def _job(job):
+        return _download(job, output_dir, session, limiter, retries, backoff, timeout)
+
+    jobs = _jobs(
+        _read_tables(tables, columns, id_column),
+        columns,
+        id_column,
+        journal,
+        retry_failed,
+    )
+
+    def _pending():
+        for job in jobs:
+            if job is None:
+                counts["skipped"] += 1
+            else:
+                yield job
+
+    try:
+        with (
+            ThreadPoolExecutor(max_workers=concurrency) as executor,
+            tqdm(unit="file") as pbar,
+        ):
+            for entry in bounded_map(
+                _job, _pending(), executor=executor, ordered=False
+            ):
+                if "file" in entry:
+                    counts["downloaded"] += 1
+                    journal.record(entry)
+                else:
+                    counts["failed"] += 1
+                    if entry.get("permanent"):
+                        journal.record(entry)
+                    tqdm.write(f"Failed to download: {entry['url']} ({entry['error']})")
+                pbar.update(1)
+                pbar.set_postfix(counts)
+    finally:
+        journal.close()
+        session.close()
+    return counts
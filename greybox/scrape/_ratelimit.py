@@ -0,0 +1,99 @@
+"""Token bucket rate limiting, shared between threads."""
+
+import math
+import threading
+import time
+from urllib.parse import urlparse
+
+__all__ = ("TokenBucket", "HostRateLimiter")
+
+
+class TokenBucket:
+    """Allow on average `rate` events per second, with bursts of up to `burst` events.
+
+    Thread safe, `acquire` blocks (outside of the lock) until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        """Create a token bucket, it starts full.
+
+        Args:
+            rate (float): tokens added per second, `math.inf` (or <= 0) disables the limit.
+            burst (float | None, optional): capacity of the bucket. Defaults to max(1, rate).
+        """
+        self._lock = threading.Lock()
+        self.set_rate(rate, burst)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def set_rate(self, rate: float, burst: float | None = None):
+        """Change the rate (and capacity) of the bucket, e.g. to back off."""
+        with self._lock:
+            self.rate = math.inf if rate is None or rate <= 0 else rate
+            if burst is None:
+                burst = max(1.0, self.rate) if math.isfinite(self.rate) else 1.0
+            self.capacity = burst
+
+    def acquire(self, tokens: float = 1.0, block: bool = True) -> bool:
+        """Take `tokens` from the bucket.
+
+        Args:
+            tokens (float, optional): number of tokens to take. Defaults to 1.
+            block (bool, optional): whether to wait for the tokens to become available. Defaults to True.
+
+        Returns:
+            bool: whether the tokens were taken (always True if `block`).
+        """
+        while True:
+            with self._lock:
+                if math.isinf(self.rate):
+                    return True
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if not block:
+                return False
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One `TokenBucket` per host, so that slow hosts do not throttle fast ones."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        overrides: dict[str, float] | None = None,
+    ):
+        """Create a per-host rate limiter.
+
+        Args:
+            rate (float): requests per second allowed for each host.
+            burst (float | None, optional): burst size for each host. Defaults to max(1, rate).
+            overrides (dict[str, float] | None, optional): rate of specific hosts (e.g. {"play-lh.googleusercontent.com": 50}). Defaults to None.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides or {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        """The bucket of the host of `url`."""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate = self.overrides.get(host, self.rate)
+                bucket = self._buckets[host] = TokenBucket(rate, self.burst)
+            return bucket
+
+    def acquire(self, url: str):
+        """Wait until a request to the host of `url` is allowed."""
+        self.bucket(url).acquire()
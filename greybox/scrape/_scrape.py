@@ -0,0 +1,240 @@
+"""Concurrent, rate limited and self-throttling scraping of many items."""
+
+import random
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple
+
+from ..utils._concurrency import bounded_map
+from ._ratelimit import TokenBucket
+
+__all__ = ("AdaptiveLimit", "ScrapeResult", "Scheduler")
+
+
+class ScrapeResult(NamedTuple):
+    """Outcome of scraping one item."""
+
+    item: Any
+    value: Any  # the result of `fetch`, None unless the status is "ok"
+    status: str  # "ok", "skipped" or "failed"
+    error: BaseException | None  # the last exception raised by `fetch`
+    attempts: int
+
+
+class AdaptiveLimit:
+    """A concurrency limit that adapts to the server (additive increase, multiplicative decrease).
+
+    Every `limit` successes the limit grows by one (up to `maximum`), and when the
+    server throttles a request the limit is halved (down to `minimum`), at most once
+    per `cooldown` seconds so that a burst of throttled requests that were already in
+    flight only counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int | None = None,
+        cooldown: float = 1.0,
+    ):
+        """Create a limit.
+
+        Args:
+            initial (int): initial number of concurrent requests.
+            minimum (int, optional): the limit never drops below this. Defaults to 1.
+            maximum (int | None, optional): the limit never grows above this. Defaults to `initial`.
+            cooldown (float, optional): minimum number of seconds between two decreases. Defaults to 1.
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = -float("inf")
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """Free a slot taken with `acquire`."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        """Record a successful request, see `AdaptiveLimit`."""
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+
+    def on_throttle(self):
+        """Record a throttled request, see `AdaptiveLimit`."""
+        with self._cond:
+            self._successes = 0
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._last_decrease = now
+
+
+class Scheduler:
+    """Run a `fetch` function over many items with bounded, adaptive concurrency.
+
+    Items are fetched by a pool of threads. Requests are rate limited by a token bucket
+    and the number of concurrent requests is adapted with an `AdaptiveLimit`, which
+    backs off whenever `fetch` raises one of `throttle_on`. Failed items are retried
+    with exponential backoff, items that raise one of `skip_on` (e.g. "not found") are
+    not retried. `fetch` is any callable, so the scheduler can be run against a fake
+    backend (see `scripts/benchmarks/bench_scrape.py`).
+
+    Example:
+        ```python
+        from google_play_scraper import app, exceptions
+
+        scheduler = Scheduler(
+            lambda appid: app(appid, lang="en", country="us"),
+            concurrency=8,
+            max_concurrency=64,
+            rate=20,
+            throttle_on=(exceptions.ExtraHTTPError,),
+            skip_on=(exceptions.NotFoundError,),
+        )
+        for result in scheduler.run(appids):
+            if result.status == "ok":
+                save(result.value)
+        ```
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Any], Any],
+        concurrency: int = 8,
+        max_concurrency: int | None = None,
+        min_concurrency: int = 1,
+        rate: float | None = None,
+        burst: float | None = None,
+        retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        throttle_on: tuple[type[BaseException], ...] = (),
+        skip_on: tuple[type[BaseException], ...] = (),
+        retry_on: tuple[type[BaseException], ...] = (Exception,),
+    ):
+        """Create a scheduler.
+
+        Args:
+            fetch (Callable[[Any], Any]): function that scrapes a single item.
+            concurrency (int, optional): initial number of concurrent calls to `fetch`. Defaults to 8.
+            max_concurrency (int | None, optional): the concurrency grows up to this while nothing is throttled, if None it is fixed at `concurrency`. Defaults to None.
+            min_concurrency (int, optional): the concurrency never drops below this. Defaults to 1.
+            rate (float | None, optional): maximum calls to `fetch` per second, None for no limit. Defaults to None.
+            burst (float | None, optional): maximum burst of calls to `fetch`. Defaults to max(1, rate).
+            retries (int, optional): number of retries of each item. Defaults to 3.
+            backoff (float, optional): base of the exponential backoff between retries in seconds. Defaults to 1.
+            max_backoff (float, optional): maximum backoff between retries in seconds. Defaults to 60.
+            throttle_on (tuple[type[BaseException], ...], optional): exceptions that mean the server is throttling us, the concurrency is reduced and the item is retried. Defaults to ().
+            skip_on (tuple[type[BaseException], ...], optional): exceptions that mean the item cannot be scraped, the item is skipped without retrying. Defaults to ().
+            retry_on (tuple[type[BaseException], ...], optional): other exceptions after which the item is retried, any other exception fails the item straight away. Defaults to (Exception,).
+        """
+        self.fetch = fetch
+        self.limit = AdaptiveLimit(
+            concurrency,
+            minimum=min_concurrency,
+            maximum=max_concurrency or concurrency,
+        )
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.throttle_on = tuple(throttle_on)
+        self.skip_on = tuple(skip_on)
+        self.retry_on = tuple(retry_on)
+        # all keys up front, so that the stats can be read while the threads count
+        self.stats = Counter(
+            dict.fromkeys(("ok", "skipped", "failed", "retried", "throttled"), 0)
+        )
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        wait = self.backoff * 2 ** (attempt - 1) * (1 + random.random())
+        return min(wait, self.max_backoff)
+
+    def scrape(self, item: Any) -> ScrapeResult:
+        """Scrape a single item, retrying it if needed.
+
+        Args:
+            item (Any): item to pass to `fetch`.
+
+        Returns:
+            ScrapeResult: the outcome.
+        """
+        error = None
+        for attempt in range(1, self.retries + 2):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            self.limit.acquire()
+            throttled = False
+            try:
+                value = self.fetch(item)
+            except self.skip_on as e:
+                self._count("skipped")
+                return ScrapeResult(item, None, "skipped", e, attempt)
+            except self.throttle_on as e:
+                error, throttled = e, True
+            except self.retry_on as e:
+                error = e
+            except Exception as e:
+                self._count("failed")
+                return ScrapeResult(item, None, "failed", e, attempt)
+            else:
+                self.limit.on_success()
+                self._count("ok")
+                return ScrapeResult(item, value, "ok", None, attempt)
+            finally:
+                self.limit.release()
+            if throttled:
+                self.limit.on_throttle()
+                self._count("throttled")
+            if attempt <= self.retries:
+                self._count("retried")
+                time.sleep(self._backoff(attempt))  # without holding a slot
+        self._count("failed")
+        return ScrapeResult(item, None, "failed", error, self.retries + 1)
+
+    def run(
+        self, items: Iterable[Any], ordered: bool = False
+    ) -> Iterator[ScrapeResult]:
+        """Scrape all items.
+
+        Args:
+            items (Iterable[Any]): items to scrape, consumed lazily.
+            ordered (bool, optional): whether to yield results in input order, otherwise results are yielded as they complete. Defaults to False.
+
+        Yields:
+            ScrapeResult: the outcome of each item.
+        """
+        # enough threads for the largest limit, the limit decides how many are busy
+        with ThreadPoolExecutor(max_workers=self.limit.maximum) as executor:
+            yield from bounded_map(
+                self.scrape,
+                items,
+                executor=executor,
+                max_in_flight=2 * self.limit.maximum,
+                ordered=ordered,
+            )
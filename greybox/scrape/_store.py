@@ -0,0 +1,196 @@
+"""SQLite store of scraped metadata, indexed by app id."""
+
+import json
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+__all__ = ("MetadataStore",)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _value(value):
+    # sqlite stores scalars, anything else (e.g. the list of categories) is stored as json
+    if value is None or isinstance(value, (str, int, float, bytes)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+class MetadataStore:
+    """Append-only table of scraped records in a single SQLite file.
+
+    Records are dicts (or data frame rows) with one column holding a unique key (the app
+    id), column names are lowercased and new columns are added as they appear. Writing a
+    record whose key is already stored is a no-op, so duplicates are dropped on write.
+    The key is a primary key, so `existing_ids` reads only its index (not the long text
+    columns) and `read` can select just the columns that are needed.
+
+    Example:
+        ```python
+        with MetadataStore("game_metadata.sqlite") as store:
+            todo = set(appids) - store.existing_ids()
+            store.write(scrape(todo))
+            media = store.read(["appid", "icon"])
+        ```
+    """
+
+    def __init__(self, path: str | Path, key: str = "appid", table: str = "metadata"):
+        """Open (or create) a store.
+
+        Args:
+            path (str | Path): path of the SQLite database.
+            key (str, optional): name of the key column. Defaults to "appid".
+            table (str, optional): name of the table. Defaults to "metadata".
+        """
+        self.path = Path(path).expanduser().resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.key = key.lower()
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {_quote(table)} "
+            f"({_quote(self.key)} TEXT PRIMARY KEY NOT NULL)"
+        )
+        self._conn.commit()
+        self._columns = self._table_columns()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            (n,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM {_quote(self.table)}"
+            ).fetchone()
+        return n
+
+    def __contains__(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT 1 FROM {_quote(self.table)} WHERE {_quote(self.key)} = ?",
+                (key,),
+            ).fetchone()
+        return row is not None
+
+    @property
+    def columns(self) -> list[str]:
+        """Names of the stored columns."""
+        return list(self._columns)
+
+    def _table_columns(self) -> list[str]:
+        rows = self._conn.execute(f"PRAGMA table_info({_quote(self.table)})")
+        return [row[1] for row in rows]
+
+    def write(self, records: Iterable[dict] | pd.DataFrame) -> int:
+        """Store records, skipping those whose key is already stored.
+
+        Args:
+            records (Iterable[dict] | pd.DataFrame): records to store, each must have the key column (matched case-insensitively).
+
+        Returns:
+            int: number of records that were added.
+        """
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict("records")
+        rows = [{k.lower(): v for k, v in r.items()} for r in records]
+        if not rows:
+            return 0
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+        if self.key not in columns:
+            raise KeyError(f"Records are missing the key column: {self.key}")
+        table = _quote(self.table)
+        names = ", ".join(_quote(c) for c in columns)
+        params = ", ".join("?" * len(columns))
+        with self._lock, self._conn:
+            for column in columns:
+                if column not in self._columns:
+                    self._conn.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {_quote(column)}"
+                    )
+                    self._columns.append(column)
+            before = self._conn.total_changes
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO {table} ({names}) VALUES ({params})",
+                ([_value(row.get(c)) for c in columns] for row in rows),
+            )
+            return self._conn.total_changes - before
+
+    def existing_ids(self) -> set[str]:
+        """All stored keys, read from the primary key index only."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_quote(self.key)} FROM {_quote(self.table)}"
+            )
+            return {row[0] for row in rows}
+
+    def read(
+        self, columns: Iterable[str] | None = None, chunksize: int | None = None
+    ) -> pd.DataFrame | Iterator[pd.DataFrame]:
+        """Read the stored records.
+
+        Args:
+            columns (Iterable[str] | None, optional): columns to read (case-insensitive), columns that are not stored are skipped. Defaults to all columns.
+            chunksize (int | None, optional): if given, an iterator of data frames of this many rows is returned. Defaults to None.
+
+        Returns:
+            pd.DataFrame | Iterator[pd.DataFrame]: the records.
+        """
+        if columns is None:
+            columns = self.columns
+        else:
+            columns = [c.lower() for c in columns if c.lower() in self._columns]
+        query = (
+            f"SELECT {', '.join(_quote(c) for c in columns)} FROM {_quote(self.table)}"
+        )
+        if chunksize is None:
+            with self._lock:
+                return pd.read_sql_query(query, self._conn)
+        return self._read_chunks(query, columns, chunksize)
+
+    def _read_chunks(self, query: str, columns: list[str], chunksize: int):
+        # a separate connection so that writes can go on while the chunks are consumed
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(query)
+            while rows := cursor.fetchmany(chunksize):
+                yield pd.DataFrame.from_records(rows, columns=columns)
+        finally:
+            conn.close()
+
+    def import_csv(self, paths: Iterable[str | Path]) -> int:
+        """Store the records of csv files (e.g. written by an earlier version of the scraper).
+
+        Args:
+            paths (Iterable[str | Path]): csv files.
+
+        Returns:
+            int: number of records that were added.
+        """
+        added = 0
+        for path in paths:
+            added += self.write(pd.read_csv(path))
+        return added
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
@@ -1,22 +1,173 @@
 """Utility package."""
 
-from ._extract_icons import extract_icons
-from ._file_utils import (
-    FileExtractor,
-    extract_archive,
-    find_all_files,
-    find_all_files_with_keyword,
-)
-from . import _image_utils as image
+import importlib
+from typing import TYPE_CHECKING
 
-from . import dataset
+# submodules (and their dependencies, e.g. cv2, requests, patoolib) are only imported
+# when one of their names is first accessed
+_SUBMODULES = {"dataset": "dataset", "image": "_image_utils"}
+# name -> submodule that defines it
+_LAZY = {
+    "ENCODE_PROFILES": "_encode",
+    "EncodeProfile": "_encode",
+    "ConversionManifest": "_manifest",
+    "DedupIndex": "_dedup",
+    "ExtractionScheduler": "_file_utils",
+    "FileClassifier": "_sniff",
+    "FileExtractor": "_file_utils",
+    "FontRenderer": "_fonts",
+    "Frame": "_frames",
+    "GlyphAtlas": "_fonts",
+    "HttpCache": "_http",
+    "JsonLinesSink": "_metrics",
+    "Metrics": "_metrics",
+    "Pipeline": "_pipeline",
+    "PrometheusSink": "_metrics",
+    "ShardReader": "_shards",
+    "ShardWriter": "_shards",
+    "Stage": "_pipeline",
+    "IconBatch": "_extract_icons",
+    "IconBoxes": "_extract_icons",
+    "TileGrid": "_extract_icons",
+    "detect_grid": "_extract_icons",
+    "extract_icons": "_extract_icons",
+    "find_icon_boxes": "_extract_icons",
+    "find_icon_boxes_tiled": "_extract_icons",
+    "is_tilesheet": "_extract_icons",
+    "pack_icons": "_extract_icons",
+    "slice_grid": "_extract_icons",
+    "combine_close_bounding_rects": "_background",
+    "extract_icons_from_color_background": "_background",
+    "most_common_color": "_background",
+    "dhash": "_dedup",
+    "file_digest": "_dedup",
+    "hamming": "_dedup",
+    "phash": "_dedup",
+    "extract_archive": "_file_utils",
+    "iter_frames": "_frames",
+    "render_fonts": "_fonts",
+    "find_all_files": "_file_utils",
+    "find_all_files_with_keyword": "_file_utils",
+    "font_codepoints": "_fonts",
+    "scan_files": "_file_utils",
+    "capture_metrics": "_metrics",
+    "disable_metrics": "_metrics",
+    "enable_metrics": "_metrics",
+    "get_metrics": "_metrics",
+    "make_sink": "_metrics",
+}
 
 __all__ = (
     "dataset",
     "image",
+    "ENCODE_PROFILES",
+    "EncodeProfile",
+    "ConversionManifest",
+    "DedupIndex",
+    "ExtractionScheduler",
+    "FileClassifier",
     "FileExtractor",
+    "FontRenderer",
+    "Frame",
+    "GlyphAtlas",
+    "HttpCache",
+    "JsonLinesSink",
+    "Metrics",
+    "Pipeline",
+    "PrometheusSink",
+    "ShardReader",
+    "ShardWriter",
+    "Stage",
+    "IconBatch",
+    "IconBoxes",
+    "TileGrid",
+    "detect_grid",
     "extract_icons",
+    "find_icon_boxes",
+    "find_icon_boxes_tiled",
+    "is_tilesheet",
+    "pack_icons",
+    "slice_grid",
+    "combine_close_bounding_rects",
+    "extract_icons_from_color_background",
+    "most_common_color",
+    "dhash",
+    "file_digest",
+    "hamming",
+    "phash",
     "extract_archive",
+    "iter_frames",
+    "render_fonts",
     "find_all_files",
     "find_all_files_with_keyword",
+    "font_codepoints",
+    "scan_files",
+    "capture_metrics",
+    "disable_metrics",
+    "enable_metrics",
+    "get_metrics",
+    "make_sink",
 )
+
+if TYPE_CHECKING:
+    from . import _image_utils as image
+    from . import dataset
+    from ._background import (
+        combine_close_bounding_rects,
+        extract_icons_from_color_background,
+        most_common_color,
+    )
+    from ._dedup import DedupIndex, dhash, file_digest, hamming, phash
+    from ._encode import ENCODE_PROFILES, EncodeProfile
+    from ._extract_icons import (
+        IconBatch,
+        IconBoxes,
+        TileGrid,
+        detect_grid,
+        extract_icons,
+        find_icon_boxes,
+        find_icon_boxes_tiled,
+        is_tilesheet,
+        pack_icons,
+        slice_grid,
+    )
+    from ._file_utils import (
+        ExtractionScheduler,
+        FileExtractor,
+        extract_archive,
+        find_all_files,
+        find_all_files_with_keyword,
+        scan_files,
+    )
+    from ._fonts import FontRenderer, GlyphAtlas, font_codepoints, render_fonts
+    from ._frames import Frame, iter_frames
+    from ._http import HttpCache
+    from ._manifest import ConversionManifest
+    from ._metrics import (
+        JsonLinesSink,
+        Metrics,
+        PrometheusSink,
+        capture_metrics,
+        disable_metrics,
+        enable_metrics,
+        get_metrics,
+        make_sink,
+    )
+    from ._pipeline import Pipeline, Stage
+    from ._shards import ShardReader, ShardWriter
+    from ._sniff import FileClassifier
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        value = importlib.import_module(f".{_SUBMODULES[name]}", __name__)
+    elif name in _LAZY:
+        value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value  # cache, __getattr__ is only called for missing names
+    return value
+
+
+def __dir__():
+    return sorted((*globals(), *__all__))
@@ -0,0 +1,316 @@
+"""Icon extraction from images with a solid background colour (no alpha channel)."""
+
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except ImportError as e:
+    raise ImportError(
+        "Icon extraction requires OpenCV, install it with `pip install greybox[opencv]`."
+    ) from e
+
+from ._extract_icons import (
+    _connected_components,
+    _first,
+    _RegionReader,
+    find_icon_boxes_tiled,
+)
+from ._metrics import get_metrics
+
+if TYPE_CHECKING:
+    from ._dedup import DedupIndex
+
+__all__ = (
+    "extract_icons_from_color_background",
+    "combine_close_bounding_rects",
+    "most_common_color",
+)
+
+
+def extract_icons_from_color_background(
+    image: Image.Image | np.ndarray,
+    background_color: tuple[int, int, int],
+    close_enough_threshold: int = 10,
+    memory_budget: int | None = None,
+    output: str = "pil",
+    dedup: "DedupIndex | None" = None,
+    with_boxes: bool = False,
+):
+    """Extract all icons from an image with a solid background colour.
+
+    Pixels that differ from `background_color` belong to icons, the bounding boxes of
+    their contours are merged with `combine_close_bounding_rects`, so that icons made
+    of several disconnected parts are extracted whole. Use `most_common_color` (e.g.
+    with `mode="border"`) to guess the background colour.
+
+    Args:
+        image (Image.Image | np.ndarray): RGB(A) image (or a path to one if `memory_budget` is given).
+        background_color (tuple[int, int, int]): RGB background colour.
+        close_enough_threshold (int, optional): rectangles whose top-left corners are within this many pixels are merged. Defaults to 10.
+        memory_budget (int | None, optional): if given, the image is processed in strips with `find_icon_boxes_tiled`, and only the icons are read from it. Defaults to None.
+        output (str, optional): "pil" yields a PIL image per icon, "array" yields NumPy views into the source image. Defaults to "pil".
+        dedup (DedupIndex | None, optional): if given, icons that are near duplicates of an icon in this index (or of an earlier icon of this image) are skipped. Defaults to None.
+        with_boxes (bool, optional): whether to yield the (x, y, w, h) box of each icon in the image with it. Defaults to False.
+
+    Yields:
+        Image.Image | np.ndarray | tuple: each icon, cropped to its bounding box, or `(icon, box)` if `with_boxes`.
+    """
+    if output not in ("pil", "array"):
+        raise ValueError(f"Unknown output: {output}, expected 'pil' or 'array'")
+    if dedup is not None:
+        icons = extract_icons_from_color_background(
+            image,
+            background_color,
+            close_enough_threshold,
+            memory_budget,
+            output,
+            with_boxes=with_boxes,
+        )
+        yield from dedup.filter(icons, key=_first if with_boxes else None)
+        return
+    metrics, start = get_metrics(), time.perf_counter()
+    if memory_budget is not None:
+        # process the image in strips, only the icons themselves are read in full
+        reader = _RegionReader(image)
+        icons = find_icon_boxes_tiled(
+            reader.image, background_color=background_color, memory_budget=memory_budget
+        )
+        combined_rects = combine_close_bounding_rects(
+            icons.boxes, close_enough_threshold
+        )
+        metrics.add(
+            "extract_icons",
+            time.perf_counter() - start,
+            len(combined_rects),
+            reader.height * reader.width * reader.channels,
+        )
+        for x, y, w, h in combined_rects:
+            icon = reader.read(x, y, w, h)
+            icon = Image.fromarray(icon) if output == "pil" else icon
+            yield (icon, (int(x), int(y), int(w), int(h))) if with_boxes else icon
+        return
+
+    # Convert image to numpy array (without copying, icons are views into it)
+    image = np.asarray(image)
+
+    # Validate image shape
+    if image.shape[-1] != 3 and image.shape[-1] != 4:
+        raise ValueError(f"Image must be RGB or RGBA, got shape: {image.shape}")
+
+    # Separate the RGB channels
+    r, g, b = image[..., 0], image[..., 1], image[..., 2]
+
+    # Create a mask where the background color is detected
+    mask = cv2.inRange(cv2.merge([r, g, b]), background_color, background_color)
+    mask = cv2.bitwise_not(
+        mask
+    )  # Invert mask to get icons as white on black background
+
+    # Find contours (icons) using the mask
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # Combine close contours
+    bounding_rects = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        bounding_rects.append((x, y, w, h))
+
+    combined_rects = combine_close_bounding_rects(
+        bounding_rects, close_enough_threshold
+    )
+    metrics.add(
+        "extract_icons", time.perf_counter() - start, len(combined_rects), image.nbytes
+    )
+
+    # Extract icons
+    for i, (x, y, w, h) in enumerate(combined_rects):
+        # Extract the icon using the bounding box
+        icon = image[y : y + h, x : x + w]
+
+        if output == "pil":
+            # Convert the extracted icon back to an Image (with alpha channel if available)
+            icon = Image.fromarray(icon)
+        yield (icon, (int(x), int(y), int(w), int(h))) if with_boxes else icon
+
+
+def combine_close_bounding_rects(
+    bounding_rects,
+    threshold: int,
+    metric: str = "corner",
+    max_pairs_per_chunk: int = 1 << 22,
+) -> np.ndarray:
+    """Merge bounding rectangles that are close to each other.
+
+    Two rectangles are close if their top-left corners are within `threshold` pixels
+    of each other along both axes (`metric="corner"`), or if the gap between the
+    rectangles is at most `threshold` pixels along both axes (`metric="gap"`, which
+    also merges overlapping rectangles). Closeness is transitive, each group of
+    (transitively) close rectangles is replaced by the bounding box that covers it.
+
+    Candidate pairs are found with a sort-and-sweep along x and grouped with a
+    vectorized union-find, so the cost grows with the number of candidate pairs
+    rather than quadratically with the number of rectangles.
+
+    Args:
+        bounding_rects (array-like): rectangles (x, y, w, h), shape (N, 4).
+        threshold (int): maximum distance (in pixels) between close rectangles.
+        metric (str, optional): "corner" or "gap", see above. Defaults to "corner".
+        max_pairs_per_chunk (int, optional): bounds the memory used when generating candidate pairs. Defaults to 2**22.
+
+    Returns:
+        np.ndarray: merged rectangles (x, y, w, h), shape (M, 4), ordered by the first rectangle of each group.
+    """
+    rects = np.asarray(bounding_rects, dtype=np.int64).reshape(-1, 4)
+    n = len(rects)
+    if n == 0:
+        return rects.copy()
+
+    x0, y0 = rects[:, 0], rects[:, 1]
+    x1, y1 = x0 + rects[:, 2], y0 + rects[:, 3]
+    if metric == "corner":
+        reach = x0 + threshold
+    elif metric == "gap":
+        reach = x1 + threshold
+    else:
+        raise ValueError(f"Unknown metric: {metric}, expected 'corner' or 'gap'")
+
+    # sweep along x: sorted by x0, the candidates of i are the contiguous run of
+    # rectangles that start before `reach[i]`
+    order = np.argsort(x0, kind="stable")
+    xs = x0[order]
+    end = np.searchsorted(xs, reach[order], side="right")
+    counts = np.maximum(end - np.arange(n) - 1, 0)
+
+    edges_i, edges_j = [], []
+    cumulative = np.cumsum(counts)
+    start = 0
+    while start < n:
+        # chunk the rows so that at most `max_pairs_per_chunk` pairs are alive at once
+        offset = cumulative[start - 1] if start > 0 else 0
+        stop = np.searchsorted(cumulative, offset + max_pairs_per_chunk, side="right")
+        stop = min(max(stop, start + 1), n)
+        rows = np.arange(start, stop)
+        c = counts[start:stop]
+        i = np.repeat(rows, c)
+        j = i + 1 + np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        i, j = order[i], order[j]
+        if metric == "corner":
+            close = np.abs(y0[i] - y0[j]) <= threshold
+        else:
+            close = np.maximum(y0[j] - y1[i], y0[i] - y1[j]) <= threshold
+        edges_i.append(i[close])
+        edges_j.append(j[close])
+        start = stop
+
+    labels = _connected_components(n, np.concatenate(edges_i), np.concatenate(edges_j))
+
+    # relabel groups in order of their first rectangle, then reduce each group
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty_like(first)
+    rank[np.argsort(first)] = np.arange(len(first))
+    group = rank[inverse]
+    m = len(first)
+    merged_x0 = np.full(m, np.iinfo(np.int64).max)
+    merged_y0 = np.full(m, np.iinfo(np.int64).max)
+    merged_x1 = np.full(m, np.iinfo(np.int64).min)
+    merged_y1 = np.full(m, np.iinfo(np.int64).min)
+    np.minimum.at(merged_x0, group, x0)
+    np.minimum.at(merged_y0, group, y0)
+    np.maximum.at(merged_x1, group, x1)
+    np.maximum.at(merged_y1, group, y1)
+    return np.stack(
+        [merged_x0, merged_y0, merged_x1 - merged_x0, merged_y1 - merged_y0], axis=1
+    )
+
+
+def most_common_color(
+    image: Image.Image | np.ndarray | list,
+    mode: str = "all",
+    k: int | None = None,
+    border: int = 1,
+    stride: int = 4,
+):
+    """Find the most common color(s) of an image, e.g. to guess its background color.
+
+    Pixels are packed into a single uint32 each and counted with `np.unique`, ties are
+    broken by the first occurrence (as with `collections.Counter`).
+
+    Args:
+        image (Image.Image | np.ndarray | list): image (HW or HWC, up to 4 channels), or a batch of images given as a list or an NHWC array.
+        mode (str, optional): which pixels to count: "all", "border" (only pixels within `border` pixels of the edge) or "sample" (every `stride`-th pixel along both axes). Defaults to "all".
+        k (int | None, optional): if given, return the `k` most common colors with their counts. Defaults to None.
+        border (int, optional): width of the border used by mode="border". Defaults to 1.
+        stride (int, optional): stride used by mode="sample". Defaults to 4.
+
+    Raises:
+        ValueError: if `k` is smaller than 1, the mode is unknown or the image is not uint8 with up to 4 channels.
+
+    Returns:
+        tuple | int | list: the most common color (a tuple, or an int for single channel images), or a list of (color, count) pairs if `k` is given. For a batch, a list with one result per image.
+    """
+    if k is not None and k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+    if isinstance(image, (list, tuple)) or (
+        isinstance(image, np.ndarray) and image.ndim == 4
+    ):
+        return [
+            most_common_color(x, mode=mode, k=k, border=border, stride=stride)
+            for x in image
+        ]
+
+    array = np.asarray(image)
+    if array.ndim == 2:
+        array = array[..., None]
+    channels = array.shape[-1]
+    if channels > 4 or array.dtype != np.uint8:
+        raise ValueError(
+            f"Image must be uint8 with at most 4 channels, got: {array.shape} {array.dtype}"
+        )
+
+    if mode == "all":
+        pixels = array.reshape(-1, channels)
+    elif mode == "sample":
+        pixels = array[::stride, ::stride].reshape(-1, channels)
+    elif mode == "border":
+        h, w = array.shape[:2]
+        if h <= 2 * border or w <= 2 * border:
+            pixels = array.reshape(-1, channels)
+        else:
+            pixels = np.concatenate(
+                [
+                    array[:border].reshape(-1, channels),
+                    array[-border:].reshape(-1, channels),
+                    array[border:-border, :border].reshape(-1, channels),
+                    array[border:-border, -border:].reshape(-1, channels),
+                ]
+            )
+    else:
+        raise ValueError(f"Unknown mode: {mode}, expected 'all', 'border' or 'sample'")
+
+    packed = pixels[:, 0].astype(np.uint32)
+    for c in range(1, channels):
+        packed |= pixels[:, c].astype(np.uint32) << np.uint32(8 * c)
+    values, counts = np.unique(packed, return_counts=True)
+    top = 1 if k is None else min(k, len(values))
+    # only colors that can make the top-k need their first occurrence (for ties)
+    cutoff = np.partition(counts, len(counts) - top)[len(counts) - top]
+    candidates = np.flatnonzero(counts >= cutoff)
+    if len(candidates) == 1:
+        first = np.zeros(1, dtype=np.int64)
+    elif len(candidates) <= 16:
+        first = np.array([np.argmax(packed == values[i]) for i in candidates])
+    else:
+        first = np.unique(packed, return_index=True)[1][candidates]
+    order = candidates[np.lexsort((first, -counts[candidates]))][:top]
+
+    def _unpack(value):
+        color = tuple(int(value >> (8 * c)) & 0xFF for c in range(channels))
+        return color[0] if channels == 1 else color
+
+    if k is None:
+        return _unpack(values[order[0]])
+    return [(_unpack(values[i]), int(counts[i])) for i in order]
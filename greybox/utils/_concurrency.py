@@ -0,0 +1,72 @@
+"""Helpers for running work concurrently with a bounded amount of work in flight."""
+
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Any
+
+__all__ = ("bounded_map",)
+
+
+def bounded_map(
+    fn: Callable[[Any], Any],
+    iterable: Iterable[Any],
+    executor: Executor | None = None,
+    max_in_flight: int | None = None,
+    ordered: bool = True,
+) -> Iterator[Any]:
+    """Lazily map `fn` over `iterable` using `executor`, bounding the work in flight.
+
+    Unlike `Executor.map`, the input iterable is consumed lazily, so at most
+    `max_in_flight` submitted tasks (and their results) are alive at once. This keeps
+    memory flat when mapping over very large (or unbounded) inputs.
+
+    Args:
+        fn (Callable): function to apply to each item, must be picklable when using a process pool.
+        iterable (Iterable): items to map over.
+        executor (Executor | None, optional): executor to submit work to. If None, `fn` is applied serially in the calling thread. Defaults to None.
+        max_in_flight (int | None, optional): maximum number of submitted but unconsumed tasks. Defaults to 4 * executor._max_workers (or 16 if unknown).
+        ordered (bool, optional): whether to yield results in input order, otherwise results are yielded as they complete. Defaults to True.
+
+    Yields:
+        Any: the result of `fn` for each item. Exceptions raised by `fn` are re-raised here.
+    """
+    if executor is None:
+        yield from map(fn, iterable)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = 4 * getattr(executor, "_max_workers", 4)
+    max_in_flight = max(1, max_in_flight)
+
+    iterator = iter(iterable)
+    pending: deque[Future] | set[Future] = deque() if ordered else set()
+
+    def _submit(n: int) -> None:
+        for item in iterator:
+            future = executor.submit(fn, item)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+            n -= 1
+            if n <= 0:
+                break
+
+    try:
+        _submit(max_in_flight)
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+                _submit(1)
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                _submit(len(done))
+                for future in done:
+                    yield future.result()
+    finally:
+        # the consumer stopped early (or an exception was raised), drop queued work
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,406 @@
+"""Exact and near-duplicate detection of images with a persistent hash index."""
+
+import functools
+import hashlib
+import itertools
+import sqlite3
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+
+__all__ = ("DedupIndex", "dhash", "phash", "hamming", "file_digest")
+
+
+def _gray(images: np.ndarray) -> np.ndarray:
+    # (..., H, W[, C]) uint8 -> (..., H, W) float32, transparent pixels are composited
+    # over white so that their (arbitrary) colour does not change the hash
+    images = np.asarray(images)
+    if images.ndim == 2:
+        return images.astype(np.float32)
+    channels = images.shape[-1]
+    if channels >= 3:
+        gray = images[..., :3].astype(np.float32) @ np.float32([0.299, 0.587, 0.114])
+    else:
+        gray = images[..., 0].astype(np.float32)
+    if channels in (2, 4):
+        alpha = images[..., -1].astype(np.float32) / 255
+        gray = gray * alpha + 255 * (1 - alpha)
+    return gray
+
+
+@functools.lru_cache(maxsize=1024)
+def _area_matrix(src: int, dst: int) -> np.ndarray:
+    # (dst, src) weights of area resampling: output pixel i is the mean of the source
+    # pixels it covers, weighted by how much of each it covers (as cv2.INTER_AREA)
+    edges = np.arange(dst + 1) * (src / dst)
+    j = np.arange(src)[None, :]
+    overlap = np.minimum(edges[1:, None], j + 1) - np.maximum(edges[:-1, None], j)
+    overlap = np.clip(overlap, 0, None)
+    return (overlap / overlap.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def _resize_gray(images, width: int, height: int) -> np.ndarray:
+    # an image (H, W[, C]), a batch (N, H, W, C) or a list of images of any size
+    # -> (N, height, width), a batch is resized with two (batched) matrix products
+    if isinstance(images, np.ndarray) and images.ndim == 4:
+        _, h, w, _ = images.shape
+        return _area_matrix(h, height) @ _gray(images) @ _area_matrix(w, width).T
+    if isinstance(images, np.ndarray):
+        images = [images]
+    out = np.empty((len(images), height, width), np.float32)
+    for i, image in enumerate(images):
+        h, w = image.shape[:2]
+        out[i] = _area_matrix(h, height) @ _gray(image) @ _area_matrix(w, width).T
+    return out
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    # (N, 64) bool -> (N,) uint64, the first bit is the most significant
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def dhash(images) -> np.ndarray:
+    """64 bit difference hashes: whether each pixel is brighter than its left neighbour.
+
+    Args:
+        images (np.ndarray | Iterable[np.ndarray | Image.Image]): an image (H, W[, C]), a batch (N, H, W, C) (e.g. `IconBatch.images`, hashed without a python loop) or a list of images of any size. Alpha is composited over white.
+
+    Returns:
+        np.ndarray: (N,) uint64 hashes.
+    """
+    if not isinstance(images, np.ndarray):
+        images = [np.asarray(image) for image in images]
+    small = _resize_gray(images, 9, 8)
+    return _pack((small[:, :, 1:] > small[:, :, :-1]).reshape(len(small), 64))
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return (matrix * np.sqrt(2 / n)).astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(images) -> np.ndarray:
+    """64 bit perceptual hashes: the signs of the 8x8 lowest DCT frequencies around their median.
+
+    More robust than `dhash` to rescaling and recompression, slightly slower.
+
+    Args:
+        images (np.ndarray | Iterable[np.ndarray | Image.Image]): see `dhash`.
+
+    Returns:
+        np.ndarray: (N,) uint64 hashes.
+    """
+    if not isinstance(images, np.ndarray):
+        images = [np.asarray(image) for image in images]
+    small = _resize_gray(images, 32, 32)
+    low = (_DCT32 @ small @ _DCT32.T)[:, :8, :8].reshape(len(small), 64)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)  # without the DC term
+    return _pack(low > median)
+
+
+def hamming(a: np.ndarray | int, b: np.ndarray | int) -> np.ndarray:
+    """Number of differing bits between 64 bit hashes (broadcasting)."""
+    x = np.bitwise_xor(np.asarray(a, np.uint64), np.asarray(b, np.uint64))
+    if hasattr(np, "bitwise_count"):  # numpy >= 2
+        return np.bitwise_count(x)
+    return np.unpackbits(x[..., None].view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def file_digest(
+    source: str | Path | bytes | BinaryIO, chunk_size: int = 1 << 20
+) -> bytes:
+    """16 byte BLAKE2 digest of a file (a path, open binary file or bytes)."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+    elif isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            while chunk := f.read(chunk_size):
+                h.update(chunk)
+    else:
+        while chunk := source.read(chunk_size):
+            h.update(chunk)
+    return h.digest()
+
+
+def _signed(h: int) -> int:
+    # sqlite integers are signed 64 bit
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _chunk_bits(chunks: int) -> list[int]:
+    # the 64 bits split as evenly as possible, e.g. 5 chunks -> [13, 13, 13, 13, 12]
+    return [64 // chunks + (i < 64 % chunks) for i in range(chunks)]
+
+
+def _chunks(h: int, widths: list[int]) -> list[int]:
+    out = []
+    for width in widths:
+        out.append(h & ((1 << width) - 1))
+        h >>= width
+    return out
+
+
+def _neighbours(value: int, radius: int, width: int) -> list[int]:
+    # all `width` bit chunk values within `radius` bits of `value`
+    out = [value]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(width), r):
+            flip = 0
+            for b in bits:
+                flip |= 1 << b
+            out.append(value ^ flip)
+    return out
+
+
+class DedupIndex:
+    """Persistent index of file digests and perceptual hashes, to skip duplicates.
+
+    Exact duplicates are found by the digest of the encoded bytes (`add_file`), so they
+    are skipped before they are decoded. Near duplicates are found by the hamming
+    distance between 64 bit perceptual hashes (`dhash` or `phash`, see `add_images`).
+    Hashes are looked up with multi-index hashing: each hash is split into `chunks`
+    chunks that are indexed separately. Two hashes within distance `d` of each other
+    differ in at most `d // chunks` bits in at least one chunk, so a query only reads
+    the rows that have a chunk within that many bits of the queried one (enumerated
+    exhaustively) instead of all rows.
+
+    Example:
+        ```python
+        with DedupIndex("icons.sqlite") as index:
+            for file in FileExtractor(dedup=index).stream_all("packs"):
+                icons = list(extract_icons(Image.open(file.open()), dedup=index))
+        ```
+
+    Everything that was added is kept when the database is reopened, so a corpus can
+    be deduplicated across runs (and against earlier corpora).
+    """
+
+    HASHES = {"dhash": dhash, "phash": phash}
+
+    def __init__(
+        self,
+        path: str | Path = ":memory:",
+        max_distance: int = 4,
+        method: str | Callable = "dhash",
+        chunks: int = 3,
+    ):
+        """Open (or create) an index.
+
+        Args:
+            path (str | Path, optional): path of the SQLite database. Defaults to an in-memory index.
+            max_distance (int, optional): images whose hashes differ in at most this many bits are duplicates. Defaults to 4.
+            method (str | Callable, optional): "dhash", "phash" or a function mapping a list of images to (N,) uint64 hashes. Do not mix methods in one index. Defaults to "dhash".
+            chunks (int, optional): number of chunks of a new index (an existing one keeps its own). Fewer, wider chunks read fewer candidate rows per query but enumerate more chunk values, 3 suits indexes of millions to hundreds of millions of hashes at a `max_distance` of up to 5, see `scripts/benchmarks/bench_dedup.py`. Defaults to 3.
+        """
+        if path != ":memory:":
+            path = Path(path).expanduser().resolve()
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_distance = max_distance
+        self.hash = self.HASHES[method] if isinstance(method, str) else method
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)"
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta VALUES ('chunks', ?)", (chunks,)
+            )
+            (self.chunks,) = self._conn.execute(
+                "SELECT value FROM meta WHERE name = 'chunks'"
+            ).fetchone()
+            self._widths = _chunk_bits(self.chunks)
+            columns = ", ".join(f"c{i} INTEGER NOT NULL" for i in range(self.chunks))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files (digest BLOB PRIMARY KEY, key TEXT)"
+            )
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS hashes "
+                f"(hash INTEGER NOT NULL, key TEXT, {columns})"
+            )
+            for i in range(self.chunks):
+                # covering, candidates are compared without reading the table
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS hashes_c{i} ON hashes (c{i}, hash)"
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()
+        return n
+
+    def add_file(
+        self, source: str | Path | bytes | BinaryIO, key: str | None = None
+    ) -> bool:
+        """Record the digest of a file, without decoding it.
+
+        Args:
+            source (str | Path | bytes | BinaryIO): the file (a path, open binary file or its bytes).
+            key (str | None, optional): name stored with the digest, e.g. the path. Defaults to None.
+
+        Returns:
+            bool: True if the file is new, False if a file with the same bytes was added before.
+        """
+        return self.add_digest(file_digest(source), key)
+
+    def add_digest(self, digest: bytes, key: str | None = None) -> bool:
+        """Record a file digest (see `file_digest`), e.g. once the file was processed.
+
+        Args:
+            digest (bytes): digest of the file.
+            key (str | None, optional): name stored with the digest, e.g. the path. Defaults to None.
+
+        Returns:
+            bool: True if the digest is new, False if it was added before.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO files (digest, key) VALUES (?, ?)", (digest, key)
+            )
+            return cursor.rowcount == 1
+
+    def has_digest(self, digest: bytes) -> bool:
+        """Whether a file digest (see `file_digest`) was added before."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM files WHERE digest = ?", (digest,)
+            ).fetchone()
+        return row is not None
+
+    def query(
+        self, h: int, max_distance: int | None = None
+    ) -> list[tuple[str | None, int]]:
+        """Find the stored hashes within `max_distance` bits of `h`.
+
+        Args:
+            h (int): 64 bit hash.
+            max_distance (int | None, optional): maximum hamming distance. Defaults to `self.max_distance`.
+
+        Returns:
+            list[tuple[str | None, int]]: (key, distance) of each match, closest first.
+        """
+        with self._lock:
+            return self._query(int(h), self._max(max_distance))
+
+    def _max(self, max_distance: int | None) -> int:
+        return self.max_distance if max_distance is None else max_distance
+
+    def _query(self, h: int, max_distance: int) -> list[tuple[str | None, int]]:
+        radius = max_distance // self.chunks
+        conditions, params = [], []
+        for i, (value, width) in enumerate(zip(_chunks(h, self._widths), self._widths)):
+            values = _neighbours(value, radius, width)
+            conditions.append(f"c{i} IN ({', '.join('?' * len(values))})")
+            params += values
+        rows = self._conn.execute(
+            f"SELECT rowid, hash FROM hashes WHERE {' OR '.join(conditions)}", params
+        ).fetchall()
+        if not rows:
+            return []
+        rowids, hashes = zip(*rows)
+        distances = hamming(np.array(hashes, np.int64).view(np.uint64), h)
+        matches = np.flatnonzero(distances <= max_distance)
+        matches = matches[np.argsort(distances[matches], kind="stable")]
+        # only the keys of the matches are read from the table
+        keys = self._conn.execute(
+            f"SELECT rowid, key FROM hashes WHERE rowid IN "
+            f"({', '.join('?' * len(matches))})",
+            [rowids[i] for i in matches],
+        )
+        keys = dict(keys.fetchall())
+        return [(keys[rowids[i]], int(distances[i])) for i in matches]
+
+    def add(self, hashes: Iterable[int], keys: Iterable[str | None] | None = None):
+        """Store hashes (without checking for duplicates)."""
+        hashes = [int(h) for h in hashes]
+        keys = [None] * len(hashes) if keys is None else list(keys)
+        with self._lock, self._conn:
+            self._insert(hashes, keys)
+
+    def _insert(self, hashes: list[int], keys: list):
+        params = ", ".join("?" * (self.chunks + 2))
+        self._conn.executemany(
+            f"INSERT INTO hashes VALUES ({params})",
+            (
+                [_signed(h), key, *_chunks(h, self._widths)]
+                for h, key in zip(hashes, keys)
+            ),
+        )
+
+    def add_images(
+        self,
+        images,
+        keys: Iterable[str | None] | None = None,
+        max_distance: int | None = None,
+    ) -> np.ndarray:
+        """Hash images and store those that are not near duplicates of a stored one.
+
+        Images are also compared to the earlier images of the same batch.
+
+        Args:
+            images (np.ndarray | Iterable[np.ndarray | Image.Image]): a batch (N, H, W, C) or list of images, see `dhash`.
+            keys (Iterable[str | None] | None, optional): name stored with each hash. Defaults to None.
+            max_distance (int | None, optional): maximum hamming distance of duplicates. Defaults to `self.max_distance`.
+
+        Returns:
+            np.ndarray: (N,) bool, True for the images that are new.
+        """
+        hashes = self.hash(images)
+        keys = [None] * len(hashes) if keys is None else list(keys)
+        max_distance = self._max(max_distance)
+        new = np.zeros(len(hashes), dtype=bool)
+        with self._lock, self._conn:
+            for i, h in enumerate(hashes):
+                # the inserts of this batch are visible to the queries that follow
+                if not self._query(int(h), max_distance):
+                    self._insert([int(h)], [keys[i]])
+                    new[i] = True
+        return new
+
+    def filter(
+        self,
+        images: Iterable,
+        keys: Iterable[str | None] | None = None,
+        batch_size: int = 256,
+        key: Callable | None = None,
+    ) -> Iterator:
+        """Lazily drop the images that are near duplicates (see `add_images`).
+
+        Args:
+            images (Iterable[np.ndarray | Image.Image]): images, e.g. the icons yielded by `extract_icons`.
+            keys (Iterable[str | None] | None, optional): name stored with each hash. Defaults to None.
+            batch_size (int, optional): number of images hashed at once. Defaults to 256.
+            key (Callable | None, optional): function that returns the image of each item, for items that are not images themselves (e.g. `(icon, box)` pairs). Defaults to None.
+
+        Yields:
+            np.ndarray | Image.Image: the images (or items) that are new, in order.
+        """
+        images = iter(images)
+        keys = itertools.repeat(None) if keys is None else iter(keys)
+        while batch := list(itertools.islice(images, batch_size)):
+            hashed = batch if key is None else [key(item) for item in batch]
+            new = self.add_images(hashed, itertools.islice(keys, len(batch)))
+            yield from itertools.compress(batch, new)
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,93 @@
+"""Lossless encode profiles for image conversion and draft-mode decoding."""
+
+from pathlib import Path
+from typing import NamedTuple
+
+# PIL is imported where it is used, so that the profiles can be listed by CLIs without
+# importing it
+
+__all__ = (
+    "EncodeProfile",
+    "ENCODE_PROFILES",
+    "get_profile",
+    "open_image",
+    "save_image",
+)
+
+
+class EncodeProfile(NamedTuple):
+    """Output format, file suffix and PIL save parameters of an encode profile."""
+
+    format: str
+    suffix: str
+    params: dict
+
+
+ENCODE_PROFILES = {
+    # zlib level 6, what PIL uses by default
+    "default": EncodeProfile("PNG", ".png", {}),
+    # several times faster to encode, files are typically 10-30% larger
+    "fast": EncodeProfile("PNG", ".png", {"compress_level": 1}),
+    # level 9 with the smallest encoder settings, slow
+    "small": EncodeProfile("PNG", ".png", {"optimize": True}),
+    # lossless WebP, usually much smaller than PNG at a similar encode speed
+    "webp": EncodeProfile("WEBP", ".webp", {"lossless": True, "method": 4}),
+}
+
+
+def get_profile(profile: str | EncodeProfile) -> EncodeProfile:
+    """Look up an encode profile by name (profiles are returned as they are).
+
+    Args:
+        profile (str | EncodeProfile): name of one of `ENCODE_PROFILES` or a profile.
+
+    Raises:
+        ValueError: if there is no profile with this name.
+
+    Returns:
+        EncodeProfile: the profile.
+    """
+    if isinstance(profile, EncodeProfile):
+        return profile
+    try:
+        return ENCODE_PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f"Unknown encode profile: {profile}, expected one of {list(ENCODE_PROFILES)}"
+        ) from None
+
+
+def open_image(path: str | Path, max_size: int | tuple[int, int] | None = None):
+    """Open and decode an image, optionally downscaled to fit in `max_size`.
+
+    When `max_size` is given JPEGs are decoded in draft mode, i.e. the decoder itself
+    scales by 1/2, 1/4 or 1/8 (to the smallest scale that still fits `max_size`), which
+    skips most of the decoding work. The image is then resized to fit `max_size`.
+
+    Args:
+        path (str | Path): image file.
+        max_size (int | tuple[int, int] | None, optional): maximum (width, height), an int is used for both. Defaults to None.
+
+    Returns:
+        Image.Image: the decoded image.
+    """
+    from PIL import Image
+
+    img = Image.open(path)
+    try:
+        if max_size is not None:
+            if isinstance(max_size, int):
+                max_size = (max_size, max_size)
+            img.draft(None, max_size)  # no-op for formats other than JPEG
+            img.thumbnail(max_size)
+        img.load()  # thumbnail does not load images that already fit
+        return img
+    except BaseException:
+        img.close()
+        raise
+
+
+def save_image(img, path: str | Path, profile: str | EncodeProfile = "default"):
+    """Save `img` to `path` with an encode profile (see `ENCODE_PROFILES`)."""
+    profile = get_profile(profile)
+    img.save(path, profile.format, **profile.params)
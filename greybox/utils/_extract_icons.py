@@ -1,42 +1,744 @@
-import cv2
+try:
+    import cv2
+except ImportError as e:
+    raise ImportError(
+        "Icon extraction requires OpenCV, install it with `pip install greybox[opencv]`."
+    ) from e
 from PIL import Image
 import numpy as np
 import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
 
+from ._metrics import get_metrics
 
-def extract_icons(image: Image.Image | np.ndarray, alpha_threshold: float = 0.0):
+if TYPE_CHECKING:
+    from ._dedup import DedupIndex
 
-    # Convert image to numpy array
-    image = np.array(image)
 
-    # Validate image shape
-    if image.shape[-1] != 4:
+class IconBoxes(NamedTuple):
+    """Bounding boxes and statistics of the icons found in an image."""
+
+    boxes: np.ndarray  # (N, 4) int32 (x, y, w, h)
+    areas: np.ndarray  # (N,) int32 number of pixels in each icon
+    centroids: np.ndarray  # (N, 2) float64 (x, y)
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+def find_icon_boxes(
+    image: Image.Image | np.ndarray,
+    alpha_threshold: float = 0.0,
+    min_area: int | None = None,
+    max_area: int | None = None,
+    min_aspect: float | None = None,
+    max_aspect: float | None = None,
+    fill_holes: bool = True,
+    connectivity: int = 8,
+) -> IconBoxes:
+    """Find the bounding boxes of all icons in an image with an alpha channel.
+
+    Icons are the connected components of the pixels whose alpha is above
+    `alpha_threshold`, found with a single call to `cv2.connectedComponentsWithStats`.
+    No crops are made, use `extract_icons` to get the icon images.
+
+    Args:
+        image (Image.Image | np.ndarray): RGBA image.
+        alpha_threshold (float, optional): pixels with alpha above this value belong to an icon. Defaults to 0.0.
+        min_area (int | None, optional): drop icons with fewer pixels. Defaults to None.
+        max_area (int | None, optional): drop icons with more pixels. Defaults to None.
+        min_aspect (float | None, optional): drop icons whose box aspect ratio (w / h) is smaller. Defaults to None.
+        max_aspect (float | None, optional): drop icons whose box aspect ratio (w / h) is larger. Defaults to None.
+        fill_holes (bool, optional): whether transparent holes are part of the icon that surrounds them, so that components inside holes are not reported separately (as with external contours). Defaults to True.
+        connectivity (int, optional): 4 or 8 connectivity of icon pixels. Defaults to 8.
+
+    Returns:
+        IconBoxes: boxes, areas and centroids of the icons, roughly in raster order of their first pixel (OpenCV scans two rows at a time).
+    """
+    image = np.asarray(image)
+    if image.ndim != 3 or image.shape[-1] != 4:
         raise ValueError(f"Image must have an alpha channel, got shape: {image.shape}")
+    mask = (image[..., -1] > alpha_threshold).view(np.uint8)
+    return _component_boxes(
+        mask,
+        min_area=min_area,
+        max_area=max_area,
+        min_aspect=min_aspect,
+        max_aspect=max_aspect,
+        fill_holes=fill_holes,
+        connectivity=connectivity,
+    )
+
+
+def _fill_holes(mask: np.ndarray, connectivity: int) -> np.ndarray:
+    # flood the background from the (padded) border, what is left unreached are holes
+    padded = np.pad(mask, 1)
+    cv2.floodFill(padded, None, (0, 0), 2, flags=12 - connectivity)
+    return (padded[1:-1, 1:-1] != 2).view(np.uint8)
+
+
+def _component_boxes(
+    mask: np.ndarray,
+    fill_holes: bool = True,
+    connectivity: int = 8,
+    **filters,
+) -> IconBoxes:
+    if fill_holes:
+        mask = _fill_holes(mask, connectivity)
+    _, _, stats, centroids = cv2.connectedComponentsWithStats(
+        mask, connectivity=connectivity
+    )
+    # label 0 is the background
+    stats, centroids = stats[1:], centroids[1:]
+    icons = IconBoxes(stats[:, :4], stats[:, cv2.CC_STAT_AREA], centroids)
+    return _filter_boxes(icons, **filters)
+
+
+def _filter_boxes(
+    icons: IconBoxes,
+    min_area: int | None = None,
+    max_area: int | None = None,
+    min_aspect: float | None = None,
+    max_aspect: float | None = None,
+) -> IconBoxes:
+    boxes, areas, centroids = icons
+    keep = np.ones(len(boxes), dtype=bool)
+    if min_area is not None:
+        keep &= areas >= min_area
+    if max_area is not None:
+        keep &= areas <= max_area
+    if min_aspect is not None or max_aspect is not None:
+        aspect = boxes[:, 2] / boxes[:, 3]
+        if min_aspect is not None:
+            keep &= aspect >= min_aspect
+        if max_aspect is not None:
+            keep &= aspect <= max_aspect
+    return IconBoxes(np.ascontiguousarray(boxes[keep]), areas[keep], centroids[keep])
+
+
+def _connected_components(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    # vectorized union-find: hook the larger root onto the smaller one, then compress
+    # paths with pointer jumping until every edge joins two nodes with the same root
+    parent = np.arange(n)
+    while len(i):
+        pi, pj = parent[i], parent[j]
+        unsatisfied = pi != pj
+        if not unsatisfied.any():
+            break
+        i, j = i[unsatisfied], j[unsatisfied]
+        pi, pj = pi[unsatisfied], pj[unsatisfied]
+        np.minimum.at(parent, np.maximum(pi, pj), np.minimum(pi, pj))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+class _RegionReader:
+    # reads rows/regions of an image without requiring it to be a numpy array
+    # .npy files are memory-mapped, other files are decoded by PIL on first access
+
+    def __init__(self, image: str | Path | Image.Image | np.ndarray):
+        if isinstance(image, (str, Path)):
+            path = Path(image).expanduser()
+            image = (
+                np.load(path, mmap_mode="r")
+                if path.suffix == ".npy"
+                else Image.open(path)
+            )
+        self.image = image
+        if isinstance(image, Image.Image):
+            self.width, self.height = image.size
+            self.channels = len(image.getbands())
+        else:
+            self.height, self.width = image.shape[:2]
+            self.channels = image.shape[2] if image.ndim == 3 else 1
+
+    def read(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        if isinstance(self.image, Image.Image):
+            return np.asarray(self.image.crop((x, y, x + w, y + h)))
+        return np.asarray(self.image[y : y + h, x : x + w])
+
+
+def _strip_masks(
+    reader: _RegionReader, mask_fn, rows: int
+) -> Iterator[tuple[int, np.ndarray]]:
+    # consecutive strips share one row, so components that cross a strip border share
+    # at least one pixel with the same component in the neighbouring strip
+    y0 = 0
+    while True:
+        y1 = min(y0 + rows, reader.height)
+        strip = reader.read(0, y0, reader.width, y1 - y0)
+        yield y0, np.ascontiguousarray(mask_fn(strip)).view(np.uint8)
+        if y1 >= reader.height:
+            return
+        y0 = y1 - 1
+
+
+def _label_strips(
+    strips, connectivity: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[int]]:
+    # label each strip and stitch the components that meet in the shared rows
+    # returns per-part stats, the root of each part and the label offset of each strip
+    parts, edges_i, edges_j, offsets = [], [], [], []
+    prev_row, offset = None, 0
+    for y0, mask in strips:
+        n, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            mask, connectivity=connectivity
+        )
+        offsets.append(offset)
+        area = stats[1:, cv2.CC_STAT_AREA].astype(np.int64)
+        sum_x = centroids[1:, 0] * area
+        sum_y = (centroids[1:, 1] + y0) * area
+        if prev_row is not None:
+            # the shared row was already counted by the previous strip
+            row = labels[0]
+            count = np.bincount(row, minlength=n)[1:]
+            area -= count
+            sum_x -= np.bincount(row, weights=np.arange(len(row)), minlength=n)[1:]
+            sum_y -= y0 * count
+            fg = row > 0
+            pairs = np.unique(np.stack([prev_row[fg], row[fg] + offset - 1]), axis=1)
+            edges_i.append(pairs[0])
+            edges_j.append(pairs[1])
+        x, y, w, h = (stats[1:, i].astype(np.int64) for i in range(4))
+        parts.append(np.stack([x, y + y0, x + w, y + y0 + h, area]))
+        parts.append(np.stack([sum_x, sum_y]))
+        prev_row = np.where(labels[-1] > 0, labels[-1] + offset - 1, -1)
+        offset += n - 1
+        del labels
+
+    ints = np.concatenate(parts[0::2], axis=1)
+    sums = np.concatenate(parts[1::2], axis=1)
+    empty = np.zeros(0, dtype=np.int64)
+    roots = _connected_components(
+        offset,
+        np.concatenate(edges_i) if edges_i else empty,
+        np.concatenate(edges_j) if edges_j else empty,
+    )
+    return ints, sums, roots, offsets
+
+
+def _reduce_parts(ints: np.ndarray, sums: np.ndarray, roots: np.ndarray) -> IconBoxes:
+    # roots are the smallest part id of each component, so sorting by root gives the
+    # raster order of the first pixel (a single connectedComponents call scans two rows
+    # at a time, so icons that start on neighbouring rows may be ordered differently)
+    _, group = np.unique(roots, return_inverse=True)
+    m = group.max() + 1 if len(group) else 0
+    x0 = np.full(m, np.iinfo(np.int64).max)
+    y0 = np.full(m, np.iinfo(np.int64).max)
+    x1 = np.zeros(m, dtype=np.int64)
+    y1 = np.zeros(m, dtype=np.int64)
+    np.minimum.at(x0, group, ints[0])
+    np.minimum.at(y0, group, ints[1])
+    np.maximum.at(x1, group, ints[2])
+    np.maximum.at(y1, group, ints[3])
+    area = np.bincount(group, weights=ints[4], minlength=m)
+    sum_x = np.bincount(group, weights=sums[0], minlength=m)
+    sum_y = np.bincount(group, weights=sums[1], minlength=m)
+    boxes = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1).astype(np.int32)
+    centroids = np.stack([sum_x, sum_y], axis=1) / np.maximum(area, 1)[:, None]
+    return IconBoxes(boxes, area.astype(np.int32), centroids)
+
+
+def find_icon_boxes_tiled(
+    image: str | Path | Image.Image | np.ndarray,
+    alpha_threshold: float = 0.0,
+    background_color: tuple[int, int, int] | None = None,
+    memory_budget: int = 256 * 2**20,
+    fill_holes: bool = True,
+    connectivity: int = 8,
+    **filters,
+) -> IconBoxes:
+    """Find the bounding boxes of all icons in a (very large) image, one strip at a time.
+
+    The image is processed in horizontal strips that overlap by one row, components
+    that cross strip borders are stitched together, so the icons are the same as
+    those of `find_icon_boxes` on the whole image (up to their order). Masks and label images only ever exist for
+    one strip, whose height is chosen to fit in `memory_budget`.
+
+    Pass a memory-mapped array (or the path of a `.npy` file) to keep the image itself
+    out of memory. Other image files are decoded by PIL, which holds the decoded image
+    (but none of the intermediate buffers) in memory.
+
+    Args:
+        image (str | Path | Image.Image | np.ndarray): RGB(A) image, a `.npy` file or an image file.
+        alpha_threshold (float, optional): pixels with alpha above this value belong to an icon (ignored if `background_color` is given). Defaults to 0.0.
+        background_color (tuple[int, int, int] | None, optional): if given, icons are the pixels whose RGB color differs from this color instead of the opaque pixels. Defaults to None.
+        memory_budget (int, optional): approximate number of bytes used for the buffers of each strip. Defaults to 256MiB.
+        fill_holes (bool, optional): see `find_icon_boxes`. Defaults to True.
+        connectivity (int, optional): 4 or 8 connectivity of icon pixels. Defaults to 8.
+        filters: `min_area`, `max_area`, `min_aspect`, `max_aspect`, see `find_icon_boxes`.
+
+    Returns:
+        IconBoxes: boxes, areas and centroids of the icons.
+    """
+    reader = _RegionReader(image)
+    if background_color is not None:
+        background_color = np.asarray(background_color[:3], dtype=np.uint8)
+
+        def mask_fn(strip):
+            return np.any(strip[..., :3] != background_color, axis=-1)
+
+    else:
+        if reader.channels != 4:
+            raise ValueError(
+                f"Image must have an alpha channel, got {reader.channels} channels"
+            )
+
+        def mask_fn(strip):
+            return strip[..., -1] > alpha_threshold
+
+    # strip copy + mask + filled mask + two int32 label images (+ numpy temporaries)
+    bytes_per_row = reader.width * (reader.channels + 16)
+    rows = max(2, memory_budget // bytes_per_row)
+
+    def _strips():
+        return _strip_masks(reader, mask_fn, rows)
+
+    if fill_holes:
+        # pass 1: find the background components that touch the image border, the
+        # remaining background components are holes
+        def _backgrounds():
+            for y0, mask in _strips():
+                yield y0, (mask == 0).view(np.uint8)
+
+        b_ints, _, b_roots, b_offsets = _label_strips(_backgrounds(), 12 - connectivity)
+        outside = (
+            (b_ints[0] == 0)
+            | (b_ints[1] == 0)
+            | (b_ints[2] == reader.width)
+            | (b_ints[3] == reader.height)
+        )
+        outside_root = np.zeros(len(b_roots), dtype=bool)
+        outside_root[b_roots[outside]] = True
+        is_hole = ~outside_root[b_roots]
+
+        def _filled():
+            for (y0, mask), offset in zip(_strips(), b_offsets):
+                _, labels = cv2.connectedComponents(
+                    (mask == 0).view(np.uint8), connectivity=12 - connectivity
+                )
+                hole = (labels > 0) & is_hole[np.maximum(labels + offset - 1, 0)]
+                yield y0, (mask.astype(bool) | hole).view(np.uint8)
+
+        strips = _filled()
+    else:
+        strips = _strips()
+
+    ints, sums, roots, _ = _label_strips(strips, connectivity)
+    return _filter_boxes(_reduce_parts(ints, sums, roots), **filters)
+
+
+def extract_icons(
+    image: str | Path | Image.Image | np.ndarray,
+    alpha_threshold: float = 0.0,
+    memory_budget: int | None = None,
+    mode: str = "contour",
+    output: str = "pil",
+    dedup: "DedupIndex | None" = None,
+    with_boxes: bool = False,
+    **kwargs,
+):
+    """Extract all icons from an image with an alpha channel.
 
-    # Separate the alpha channel
-    a = image[..., -1]
+    Args:
+        image (str | Path | Image.Image | np.ndarray): RGBA image (or a path to one if `memory_budget` is given).
+        alpha_threshold (float, optional): pixels with alpha above this value belong to an icon. Defaults to 0.0.
+        memory_budget (int | None, optional): if given, the image is processed in strips with `find_icon_boxes_tiled`, and only the icons are read from it. Defaults to None.
+        mode (str, optional): "contour" finds each icon as a connected component, "grid" cuts the image into the cells found by `detect_grid` (skipping empty cells) and "auto" uses the grid if one is detected. Defaults to "contour".
+        output (str, optional): "pil" yields a PIL image per icon, "array" yields NumPy views into the source image (no copies are made unless `memory_budget` is given). Use `pack_icons` to get all icons in one batch array. Defaults to "pil".
+        dedup (DedupIndex | None, optional): if given, icons that are near duplicates of an icon in this index (or of an earlier icon of this image) are skipped. Defaults to None.
+        with_boxes (bool, optional): whether to yield the (x, y, w, h) box of each icon in the image with it. Defaults to False.
+        kwargs: additional filters passed to `find_icon_boxes` (e.g. `min_area`).
 
-    # Create a binary mask using the alpha channel
-    _, mask = cv2.threshold(a, alpha_threshold, 255, cv2.THRESH_BINARY)
+    Yields:
+        Image.Image | np.ndarray | tuple: each icon, cropped to its bounding box (or its grid cell), or `(icon, box)` if `with_boxes`.
+    """
+    if mode not in ("contour", "grid", "auto"):
+        raise ValueError(f"Unknown mode: {mode}, expected 'contour', 'grid' or 'auto'")
+    if output not in ("pil", "array"):
+        raise ValueError(f"Unknown output: {output}, expected 'pil' or 'array'")
+    if dedup is not None:
+        icons = extract_icons(
+            image,
+            alpha_threshold,
+            memory_budget,
+            mode,
+            output,
+            with_boxes=with_boxes,
+            **kwargs,
+        )
+        yield from dedup.filter(icons, key=_first if with_boxes else None)
+        return
+    if memory_budget is None:
+        image = np.asarray(image)
+        if image.ndim != 3 or image.shape[-1] != 4:
+            raise ValueError(
+                f"Image must have an alpha channel, got shape: {image.shape}"
+            )
+    convert = Image.fromarray if output == "pil" else _identity
 
-    # Find contours (icons) using the mask
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    def wrap(icon, box):
+        icon = convert(icon)
+        return (icon, tuple(int(v) for v in box)) if with_boxes else icon
 
-    # Loop through each contour and save the extracted icon
-    for i, contour in enumerate(contours):
-        # Get the bounding box for each contour
-        x, y, w, h = cv2.boundingRect(contour)
+    # the time spent finding the icons (not cropping them) is recorded
+    metrics, start = get_metrics(), time.perf_counter()
+    if mode != "contour" and memory_budget is None:
+        grid = detect_grid(image, alpha_threshold=alpha_threshold)
+        if grid is None and mode == "grid":
+            raise ValueError("No grid was detected in the image.")
+        if grid is not None:
+            tiles = slice_grid(image, grid)
+            boxes = grid.boxes().reshape(grid.rows, grid.columns, 4)
+            filled = (tiles[..., -1] > alpha_threshold).any(axis=(2, 3))
+            cells = np.nonzero(filled)
+            metrics.add(
+                "extract_icons",
+                time.perf_counter() - start,
+                len(cells[0]),
+                image.nbytes,
+            )
+            for r, c in zip(*cells):
+                yield wrap(tiles[r, c], boxes[r, c])
+            return
 
+    if memory_budget is not None:
+        reader = _RegionReader(image)
+        icons = find_icon_boxes_tiled(
+            reader.image,
+            alpha_threshold=alpha_threshold,
+            memory_budget=memory_budget,
+            **kwargs,
+        )
+        metrics.add(
+            "extract_icons",
+            time.perf_counter() - start,
+            len(icons),
+            reader.height * reader.width * reader.channels,
+        )
+        for x, y, w, h in icons.boxes:
+            yield wrap(reader.read(x, y, w, h), (x, y, w, h))
+        return
+
+    icons = find_icon_boxes(image, alpha_threshold=alpha_threshold, **kwargs)
+    metrics.add("extract_icons", time.perf_counter() - start, len(icons), image.nbytes)
+    for x, y, w, h in icons.boxes:
         # Extract the icon using the bounding box
-        icon = image[y : y + h, x : x + w]
+        yield wrap(image[y : y + h, x : x + w], (x, y, w, h))
+
+
+def _identity(x):
+    return x
+
+
+def _first(x):
+    return x[0]
+
+
+class TileGrid(NamedTuple):
+    """A regular grid of `rows` x `columns` cells of `width` x `height` pixels.
+
+    Cell `(r, c)` starts at `x = offset_x + c * (width + spacing_x)` and
+    `y = offset_y + r * (height + spacing_y)`.
+    """
+
+    width: int
+    height: int
+    offset_x: int
+    offset_y: int
+    spacing_x: int
+    spacing_y: int
+    columns: int
+    rows: int
+
+    def boxes(self) -> np.ndarray:
+        """(rows * columns, 4) int32 (x, y, w, h) boxes of the cells, in raster order."""
+        r, c = np.mgrid[: self.rows, : self.columns].reshape(2, -1)
+        boxes = np.empty((len(r), 4), dtype=np.int32)
+        boxes[:, 0] = self.offset_x + c * (self.width + self.spacing_x)
+        boxes[:, 1] = self.offset_y + r * (self.height + self.spacing_y)
+        boxes[:, 2] = self.width
+        boxes[:, 3] = self.height
+        return boxes
+
+
+def _occupancy_mask(
+    image: np.ndarray,
+    alpha_threshold: float = 0.0,
+    background_color: tuple[int, int, int] | None = None,
+) -> np.ndarray:
+    if image.ndim != 3 or image.shape[-1] not in (3, 4):
+        raise ValueError(f"Image must be RGB or RGBA, got shape: {image.shape}")
+    if background_color is None and image.shape[-1] == 4:
+        return image[..., -1] > alpha_threshold
+    if background_color is None:
+        background_color = image[0, 0, :3]  # sprite sheets are padded with background
+    return np.any(image[..., :3] != np.asarray(background_color[:3]), axis=-1)
+
+
+def _detect_axis(
+    profile: np.ndarray, min_cell: int
+) -> tuple[int, int, int, int, float]:
+    # find the periods whose boundaries only cross empty lines (with all of the content
+    # inside the cells) and pick the fundamental one among those whose cells are not
+    # split by other empty lines. Returns (offset, cell size, spacing, count,
+    # correlation), the cell being the tightest window that holds the content of every
+    # cell.
+    empty = profile == 0
+    indices = np.flatnonzero(~empty)
+    profile = profile.astype(np.float64)
+    candidates = []
+    for period in _candidate_periods(~empty, min_cell):
+        candidate = _axis_layout(empty, indices, profile, period)
+        if candidate is not None:
+            candidates.append(candidate)
+    if not candidates:
+        return int(indices[0]), int(indices[-1] - indices[0] + 1), 0, 1, 1.0
+    if not all(split for split, _ in candidates):
+        candidates = [c for c in candidates if not c[0]]
+    # regular layouts that explain more cells win, which favours the true period over
+    # its multiples (half the cells) and over coincidental periods (low correlation)
+    return max((c for _, c in candidates), key=lambda c: c[-1] * c[3])
+
+
+# number of autocorrelation peaks whose periods are checked by `_detect_axis`
+_MAX_PEAKS = 16
+
+
+def _candidate_periods(occupied: np.ndarray, min_cell: int) -> list[int]:
+    # checking every period is quadratic in the length of the axis, so only the periods
+    # around the highest peaks of the autocorrelation of the occupancy (one FFT) are
+    # checked. The content of the cells varies, so the exact period may be next to a
+    # peak rather than on it.
+    length = len(occupied)
+    if length // 2 < min_cell:
+        return []
+    x = occupied - occupied.mean()
+    n = 1 << (2 * length - 1).bit_length()  # no circular wrap-around
+    spectrum = np.fft.rfft(x, n)
+    autocorrelation = np.fft.irfft(spectrum * spectrum.conj(), n)[: length // 2 + 2]
+    lags = np.arange(min_cell, length // 2 + 1)
+    values = autocorrelation[lags]
+    peaks = lags[
+        (values > 0)
+        & (values >= autocorrelation[lags - 1])
+        & (values >= autocorrelation[lags + 1])
+    ]
+    peaks = peaks[np.argsort(-autocorrelation[peaks], kind="stable")[:_MAX_PEAKS]]
+    periods = np.unique((peaks[:, None] + np.arange(-2, 3)).ravel())
+    return periods[(periods >= min_cell) & (periods <= length // 2)].tolist()
+
+
+def _axis_layout(
+    empty: np.ndarray, indices: np.ndarray, profile: np.ndarray, period: int
+) -> tuple[bool, tuple] | None:
+    # the layout of the cells of one period (see `_detect_axis`), and whether they are
+    # split by other empty lines, or None if the content crosses the cell boundaries
+    length = len(empty)
+    n = -(-length // period)
+    padded = np.ones(n * period, dtype=bool)
+    padded[:length] = empty
+    valid = padded.reshape(n, period).all(axis=0)  # phases that are always empty
+    if not valid.any():
+        return None
+    # the longest (cyclic) run of empty phases is the gutter between cells
+    shift = int(np.argmin(valid))
+    rolled = np.concatenate([[False], np.roll(valid, -shift), [False]])
+    edges = np.flatnonzero(np.diff(rolled.view(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    longest = np.argmax(ends - starts)
+    spacing = int(ends[longest] - starts[longest])
+    cell = period - spacing
+    # the cells that hold content, all of the content must be inside them
+    phase = int((ends[longest] + shift) % period)
+    index = (indices - phase) // period
+    first, count = index[0], int(index[-1] - index[0] + 1)
+    offset = int(phase + first * period)
+    if (
+        count <= 1
+        or offset < 0
+        or offset + count * period - spacing > length
+        or not ((indices - phase) % period < cell).all()
+    ):
+        return None
+    window = profile[offset : offset + count * period]
+    correlation = _correlation(window[:-period], window[period:])
+    # a multiple of the true period has another empty run inside its cells
+    split = len(starts) > 1
+    return split, (offset, cell, spacing, count, correlation)
+
 
-        # Convert the extracted icon back to an Image (with alpha channel)
-        icon_image = Image.fromarray(icon)
-        yield icon_image
+def _correlation(a: np.ndarray, b: np.ndarray) -> float:
+    a, b = a - a.mean(), b - b.mean()
+    norm = np.sqrt((a * a).sum() * (b * b).sum())
+    return float((a * b).sum() / norm) if norm > 0 else 1.0
 
 
-def is_tilesheet(image: Image.Image | np.ndarray):
-    image = np.array(image)
+def detect_grid(
+    image: Image.Image | np.ndarray,
+    alpha_threshold: float = 0.0,
+    background_color: tuple[int, int, int] | None = None,
+    min_cell: int = 4,
+    min_cells: int = 4,
+    min_filled: float = 0.5,
+    min_correlation: float = 0.5,
+) -> TileGrid | None:
+    """Detect whether the icons of an image are laid out on a regular grid.
+
+    The periods around the peaks of the autocorrelation (computed with an FFT) of the
+    projection profiles of the occupied (opaque, or non-background) pixels are
+    searched for those whose cell boundaries only cross empty lines, of which the one
+    that best trades off the autocorrelation of the profile against the number of
+    cells is used. This takes O(n log n) time in the size of the image.
+    This relies on the cells being separated by (at least one line of) empty space.
+    The returned cells are the tightest window that holds the content of every cell,
+    so they may be smaller than the cells the sheet was authored with.
+
+    Args:
+        image (Image.Image | np.ndarray): RGB(A) image.
+        alpha_threshold (float, optional): pixels with alpha above this value are occupied. Defaults to 0.0.
+        background_color (tuple[int, int, int] | None, optional): if given (or if the image has no alpha channel), pixels that differ from this color are occupied. Defaults to None, which uses the alpha channel or else the color of the top-left pixel.
+        min_cell (int, optional): smallest cell size (in pixels) to consider. Defaults to 4.
+        min_cells (int, optional): smallest number of cells in a grid. Defaults to 4.
+        min_filled (float, optional): more than this fraction of the cells must contain something. Defaults to 0.5.
+        min_correlation (float, optional): minimum autocorrelation of the projection profiles at the period of the grid, this rejects layouts that happen to have empty lines but do not repeat. Defaults to 0.5.
+
+    Returns:
+        TileGrid | None: the grid, or None if the image is not a grid of at least `min_cells` cells (and at least 3 cells along one of the axes).
+    """
+    mask = _occupancy_mask(np.asarray(image), alpha_threshold, background_color)
+    profile_x = np.count_nonzero(mask, axis=0)
+    if not profile_x.any():
+        return None
+    ox, w, sx, cols, correlation_x = _detect_axis(profile_x, min_cell)
+    oy, h, sy, rows, correlation_y = _detect_axis(
+        np.count_nonzero(mask, axis=1), min_cell
+    )
+    if rows * cols < min_cells or min(correlation_x, correlation_y) < min_correlation:
+        return None
+    if max(rows, cols) < 3:
+        # any two icons that do not overlap along both axes form a 2x2 "grid"
+        return None
+    grid = TileGrid(w, h, ox, oy, sx, sy, cols, rows)
+    filled = slice_grid(mask[..., None], grid).any(axis=(2, 3, 4))
+    if filled.mean() <= min_filled:
+        return None
+    return grid
+
+
+def is_tilesheet(image: Image.Image | np.ndarray, **kwargs) -> bool:
+    """Whether the icons of an image are laid out on a regular grid, see `detect_grid`."""
+    return detect_grid(image, **kwargs) is not None
+
+
+def slice_grid(image: Image.Image | np.ndarray, grid: TileGrid) -> np.ndarray:
+    """Cut an image into the cells of a grid without copying any of the cells.
+
+    Args:
+        image (Image.Image | np.ndarray): HWC image.
+        grid (TileGrid): grid to slice, see `detect_grid`.
+
+    Returns:
+        np.ndarray: read-only strided view of shape (rows, columns, height, width, channels).
+    """
+    image = np.asarray(image)
+    windows = np.lib.stride_tricks.sliding_window_view(
+        image, (grid.height, grid.width), axis=(0, 1)
+    )
+    tiles = windows[
+        grid.offset_y :: grid.height + grid.spacing_y,
+        grid.offset_x :: grid.width + grid.spacing_x,
+    ][: grid.rows, : grid.columns]
+    return np.moveaxis(tiles, 2, -1)
+
+
+class IconBatch(NamedTuple):
+    """Icons of an image packed into a single padded array."""
+
+    images: np.ndarray  # (N, H, W, C) icons, top-left aligned and padded
+    boxes: np.ndarray  # (N, 4) int32 (x, y, w, h) source box of each icon
+    mask: np.ndarray  # (N, H, W) bool, True where the pixel belongs to the icon
+
+    def __len__(self):
+        return len(self.images)
+
+
+def pack_icons(
+    image: Image.Image | np.ndarray,
+    boxes: IconBoxes | TileGrid | np.ndarray,
+    size: tuple[int, int] | None = None,
+    keep_aspect: bool = True,
+    pad_value: int = 0,
+    interpolation: int = cv2.INTER_AREA,
+) -> IconBatch:
+    """Pack the icons of an image into one preallocated (N, H, W, C) batch array.
+
+    The batch is allocated once and each icon is copied (or resized) straight into
+    its slot, which makes this the cheapest way to go from a sheet to model input.
+
+    Example:
+        ```python
+        batch = pack_icons(image, find_icon_boxes(image), size=(64, 64))
+        x = batch.images  # (N, 64, 64, 4)
+        ```
+
+    Args:
+        image (Image.Image | np.ndarray): HWC image the boxes refer to.
+        boxes (IconBoxes | TileGrid | np.ndarray): (N, 4) (x, y, w, h) boxes, e.g. from `find_icon_boxes` or `detect_grid` (all cells).
+        size (tuple[int, int] | None, optional): (width, height) every icon is resized to. If None, icons are not resized and are padded to the largest box. Defaults to None.
+        keep_aspect (bool, optional): whether to keep the aspect ratio of icons when resizing, the rest of the slot is padded. Defaults to True.
+        pad_value (int, optional): value of the padding pixels. Defaults to 0.
+        interpolation (int, optional): OpenCV interpolation flag used for resizing. Defaults to cv2.INTER_AREA.
+
+    Returns:
+        IconBatch: the packed icons, their source boxes and a mask of the valid pixels.
+    """
+    image = np.asarray(image)
+    if image.ndim != 3:
+        raise ValueError(f"Image must be HWC, got shape: {image.shape}")
+    if isinstance(boxes, IconBoxes):
+        boxes = boxes.boxes
+    elif isinstance(boxes, TileGrid):
+        boxes = boxes.boxes()
+    boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    n = len(boxes)
+
+    if size is None:
+        # no resizing, the slot is the largest box and every icon keeps its size
+        width = int(boxes[:, 2].max()) if n else 0
+        height = int(boxes[:, 3].max()) if n else 0
+        sizes = boxes[:, 2:]
+    else:
+        width, height = size
+        if keep_aspect:
+            scale = np.minimum(width / boxes[:, 2], height / boxes[:, 3])
+            sizes = np.empty((n, 2), dtype=np.int32)
+            sizes[:, 0] = np.clip(np.rint(boxes[:, 2] * scale), 1, width)
+            sizes[:, 1] = np.clip(np.rint(boxes[:, 3] * scale), 1, height)
+        else:
+            sizes = np.broadcast_to(np.array([width, height], dtype=np.int32), (n, 2))
+
+    images = np.full((n, height, width, image.shape[-1]), pad_value, dtype=image.dtype)
+    mask = np.zeros((n, height, width), dtype=bool)
+    for i, ((x, y, w, h), (sw, sh)) in enumerate(zip(boxes, sizes)):
+        icon = image[y : y + h, x : x + w]
+        slot = images[i, :sh, :sw]
+        if sw == w and sh == h:
+            slot[...] = icon
+        else:
+            # resize straight into the batch, cv2 writes to the (strided) slot in place
+            if slot.shape[-1] == 1:
+                icon, slot = icon[..., 0], slot[..., 0]  # cv2 drops single channels
+            cv2.resize(icon, (int(sw), int(sh)), dst=slot, interpolation=interpolation)
+        mask[i, :sh, :sw] = True
+    return IconBatch(images, boxes, mask)
 
 
 if __name__ == "__main__":
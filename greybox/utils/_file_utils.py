@@ -1,87 +1,703 @@
 import os
-import patoolib
-from pathlib import Path
-from tqdm import tqdm
+import re
+import bz2
+import gzip
+import io
+import itertools
+import lzma
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, BinaryIO
 import time
 
-patoolib.log.logger.setLevel("ERROR")
+from ._metrics import get_metrics
+from ._sniff import (
+    CATEGORIES,
+    SNIFF_SIZE,
+    FileClassifier,
+    sniff_file,
+    suffix_of,
+)
+
+if TYPE_CHECKING:
+    from ._dedup import DedupIndex
 
 
 __all__ = (
+    "ExtractionScheduler",
     "FileExtractor",
+    "StreamedFile",
     "find_all_files_with_keyword",
     "find_all_files",
     "extract_archive",
+    "scan_files",
 )
 
 
-def find_all_files_with_keyword(directory: str | Path, keywords_whitelist: list[str]):
-    # Traverse the directory tree
-    for root, _, files in os.walk(Path(directory).as_posix()):
-        for file in files:
-            # Check if any of the keywords are in the filename
-            if any(keyword.lower() in file.lower() for keyword in keywords_whitelist):
-                yield Path(root, file)
+def find_all_files_with_keyword(
+    directory: str | Path,
+    keywords_whitelist: list[str],
+    workers: int = 0,
+    ordered: bool = True,
+):
+    # keywords are matched case-insensitively in a single precompiled pass
+    return scan_files(
+        directory, keywords=keywords_whitelist, workers=workers, ordered=ordered
+    )
 
 
-def find_all_files(directory: str | Path):
-    for root, _, files in os.walk(Path(directory).as_posix()):
-        for file in files:
-            yield Path(root, file)
+def find_all_files(directory: str | Path, workers: int = 0, ordered: bool = True):
+    return scan_files(directory, workers=workers, ordered=ordered)
+
+
+def _make_filter(
+    extensions: Iterable[str] | None, keywords: Iterable[str] | None
+) -> Callable[[str], bool] | None:
+    if extensions is not None:
+        extensions = frozenset(e.lower() for e in extensions)
+    if keywords is not None:
+        keywords = list(keywords)
+        if not keywords:
+            return lambda name: False  # an empty whitelist matches nothing
+        keywords = re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE)
+    if extensions is None and keywords is None:
+        return None
+    if keywords is None:
+        return lambda name: os.path.splitext(name)[1].lower() in extensions
+    if extensions is None:
+        return lambda name: keywords.search(name) is not None
+    return lambda name: (
+        os.path.splitext(name)[1].lower() in extensions
+        and keywords.search(name) is not None
+    )
+
+
+def _scan_dir(
+    path: str, match: Callable[[str], bool] | None, symlinks: bool = True
+) -> tuple[str, list[str], list[str]]:
+    # the same rules as os.walk: errors are ignored, symlinks to directories are not
+    # followed and are not reported as files. Symlinks to files are reported unless
+    # `symlinks` is False (checked without a system call where the OS tells the type)
+    files, dirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        dirs.append(entry.path)
+                elif not symlinks and entry.is_symlink():
+                    continue
+                elif match is None or match(entry.name):
+                    files.append(entry.name)
+    except OSError:
+        pass
+    return path, files, dirs
+
+
+def scan_files(
+    directory: str | Path,
+    extensions: Iterable[str] | None = None,
+    keywords: Iterable[str] | None = None,
+    workers: int = 0,
+    ordered: bool = True,
+    symlinks: bool = True,
+) -> Iterator[Path]:
+    """Recursively find files in `directory` using `os.scandir`, optionally in parallel.
+
+    Names are filtered on plain strings before any `Path` is created. With `workers`
+    > 1, subdirectories are listed concurrently in a thread pool, which hides the
+    latency of network-mounted file systems.
+
+    Args:
+        directory (str | Path): directory to search.
+        extensions (Iterable[str] | None, optional): only yield files with one of these suffixes (e.g. ".png"), compared case-insensitively. Defaults to None (all files).
+        keywords (Iterable[str] | None, optional): only yield files whose name contains one of these keywords, compared case-insensitively. Defaults to None (all files).
+        workers (int, optional): number of threads used to list directories, 0 or 1 scans serially. Defaults to 0.
+        ordered (bool, optional): whether to yield files in the same order as `os.walk` (top-down), otherwise files are yielded as soon as their directory has been listed. Defaults to True.
+        symlinks (bool, optional): whether to yield symlinks to files (symlinks to directories are never followed). Defaults to True.
+
+    Yields:
+        Path: path of each matching file.
+    """
+    root = Path(directory).as_posix()
+    match = _make_filter(extensions, keywords)
+    scan = partial(_scan_dir, match=match, symlinks=symlinks)
+
+    if workers <= 1:
+        stack = [root]
+        while stack:
+            path, files, dirs = scan(stack.pop())
+            for file in files:
+                yield Path(path, file)
+            stack.extend(reversed(dirs))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if ordered:
+
+            def _visit(future: Future):
+                path, files, dirs = future.result()
+                # list the children while the files of this directory are consumed
+                children = [executor.submit(scan, d) for d in dirs]
+                for file in files:
+                    yield Path(path, file)
+                for child in children:
+                    yield from _visit(child)
+
+            try:
+                yield from _visit(executor.submit(scan, root))
+            finally:
+                executor.shutdown(cancel_futures=True)
+        else:
+            pending = {executor.submit(scan, root)}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, files, dirs = future.result()
+                        pending.update(executor.submit(scan, d) for d in dirs)
+                        for file in files:
+                            yield Path(path, file)
+            finally:
+                executor.shutdown(cancel_futures=True)
+
+
+def _patool():
+    # patool is slow to import and only needed for formats that python cannot read
+    import patoolib
+
+    patoolib.log.logger.setLevel("ERROR")
+    return patoolib
 
 
 def extract_archive(path: str | Path, out: str | Path):
     path, out = Path(path).expanduser().resolve(), Path(out).expanduser().resolve()
-    return patoolib.extract_archive(path.as_posix(), outdir=out.as_posix())
+    return _patool().extract_archive(path.as_posix(), outdir=out.as_posix())
+
+
+def _tree_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def _extract_job(archive: str, out: str) -> tuple[float, int]:
+    # runs in a worker process, returns the time taken and the size of the extracted tree
+    start = time.perf_counter()
+    extract_archive(archive, out)
+    return time.perf_counter() - start, _tree_size(out)
+
+
+class ExtractionScheduler:
+    """Extracts archives with patool in a process pool, ahead of their consumer.
+
+    Archives are extracted to a private scratch directory, each to its own tree, which
+    is deleted as soon as the consumer moves on to the next archive. New extractions
+    are only started while the trees on disk (and the archives being extracted,
+    counted at their compressed size until they are done) fit in `quota` bytes, but
+    each `extract` call always has at least one extraction running, so an archive
+    larger than the quota (or nested calls for archives inside archives) can exceed
+    it. The scratch directory is removed by `close`.
+
+    Example:
+        ```python
+        with ExtractionScheduler(workers=4, quota=2**30) as scheduler:
+            for archive, tree in scheduler.extract(Path("packs").glob("*.rar")):
+                images = list(tree.rglob("*.png"))  # gone once the loop continues
+        ```
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        quota: int = 8 * 2**30,
+        scratch_dir: str | Path | None = None,
+        max_in_flight: int | None = None,
+    ):
+        """Constructor.
+
+        Args:
+            workers (int | None, optional): number of extraction processes. Defaults to the number of CPUs.
+            quota (int, optional): scratch disk space (in bytes) to stay within. Defaults to 8 GiB.
+            scratch_dir (str | Path | None, optional): directory in which the scratch directory is created. Defaults to the system temporary directory.
+            max_in_flight (int | None, optional): maximum number of extractions started ahead of the consumer (per `extract` call). Defaults to 2 * workers.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.quota = quota
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.scratch_dir = scratch_dir
+        self.used = 0  # bytes on disk or reserved for running extractions
+        self._names = itertools.count()
+        self._scratch = None
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def extract(self, archives: Iterable[str | Path]) -> Iterator[tuple[Path, Path]]:
+        """Extract archives ahead of the consumer, starting right away.
+
+        Args:
+            archives (Iterable[str | Path]): archives (of any format patool supports), consumed lazily.
+
+        Returns:
+            Iterator[tuple[Path, Path]]: (archive, directory it was extracted to) in input order. Each directory is deleted when the next one is requested, or by the iterator's `close` method (which also cancels the extractions that were started ahead). Extraction errors are re-raised here.
+        """
+        if self._executor is None:
+            if self.scratch_dir is not None:
+                Path(self.scratch_dir).expanduser().mkdir(parents=True, exist_ok=True)
+            self._scratch = Path(
+                tempfile.mkdtemp(prefix="greybox-", dir=self.scratch_dir)
+            )
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        extractions = _Extractions(self, archives)
+        extractions.submit()
+        return extractions
+
+    def close(self):
+        """Stop the workers and delete the scratch directory."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self._scratch is not None:
+            shutil.rmtree(self._scratch, ignore_errors=True)
+            self._scratch = None
+        self.used = 0
+
+
+class _Queue:
+    # archives that are appended while an `_Extractions` consumes them, it resumes
+    # after running out when more are appended
+
+    def __init__(self):
+        self._items = deque()
+
+    def append(self, item: Path):
+        self._items.append(item)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Path:
+        if not self._items:
+            raise StopIteration
+        return self._items.popleft()
+
+
+class _Extractions:
+    # the state of one `ExtractionScheduler.extract` call
+
+    def __init__(self, scheduler: ExtractionScheduler, archives: Iterable[str | Path]):
+        self.scheduler = scheduler
+        self.archives = iter(archives)
+        self.waiting = None  # the next archive, if it did not fit in the quota
+        self.pending = deque()  # (archive, tree, reserved bytes, future)
+        self.current = None  # (tree, size) of the archive being consumed
+
+    def submit(self):
+        scheduler = self.scheduler
+        while len(self.pending) < scheduler.max_in_flight:
+            archive = self.waiting or next(self.archives, None)
+            if archive is None:
+                return
+            archive = Path(archive)
+            size = archive.stat().st_size
+            if self.pending and scheduler.used + size > scheduler.quota:
+                self.waiting = archive
+                return
+            self.waiting = None
+            tree = scheduler._scratch / f"{next(scheduler._names)}-{archive.name}"
+            scheduler.used += size
+            future = scheduler._executor.submit(
+                _extract_job, archive.as_posix(), tree.as_posix()
+            )
+            self.pending.append((archive, tree, size, future))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple[Path, Path]:
+        scheduler = self.scheduler
+        self._remove_current()
+        self.submit()
+        if not self.pending:
+            raise StopIteration
+        archive, tree, reserved, future = self.pending.popleft()
+        scheduler.used -= reserved
+        self.current = (tree, 0)
+        seconds, size = future.result()
+        scheduler.used += size
+        self.current = (tree, size)
+        get_metrics().add("extract_archive", seconds, nbytes=reserved)
+        self.submit()  # now that the actual size of this tree is known
+        return archive, tree
+
+    def _remove_current(self):
+        if self.current is not None:
+            tree, size = self.current
+            shutil.rmtree(tree, ignore_errors=True)
+            self.scheduler.used -= size
+            self.current = None
+
+    def close(self):
+        self._remove_current()
+        for _, tree, reserved, future in self.pending:
+            # running extractions cannot be cancelled, their trees are removed when done
+            if not future.cancel():
+                future.add_done_callback(partial(_remove_tree, tree.as_posix()))
+            self.scheduler.used -= reserved
+        self.pending.clear()
+
+
+def _remove_tree(path: str, _future: Future):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class StreamedFile:
+    """Lightweight handle to a file found by `FileExtractor.stream_all`.
+
+    The file may live on disk or inside a (possibly nested) archive, its contents are
+    only read when `open` or `read` is called. Handles to archive members are only
+    valid while the generator that produced them has not been advanced, read the
+    member before requesting the next one (or keep the bytes from `read`).
+    """
+
+    __slots__ = ("path", "size", "ext", "digest", "_opener")
+
+    def __init__(
+        self,
+        path: str | PurePosixPath,
+        size: int,
+        opener: Callable[[], BinaryIO],
+        ext: str | None = None,
+        digest: bytes | None = None,
+    ):
+        """Constructor.
+
+        Args:
+            path (str | PurePosixPath): virtual path of the file, members of an archive are given as `<archive path>/<member name>`.
+            size (int): uncompressed size of the file in bytes.
+            opener (Callable[[], BinaryIO]): callable that opens the file for binary reading.
+            ext (str | None, optional): type of the file as an extension (e.g. ".jpeg"), which may differ from its suffix. Defaults to the suffix (see `greybox.utils._sniff.suffix_of`).
+            digest (bytes | None, optional): digest of the file (see `file_digest`), set when it was checked against a `DedupIndex`. Defaults to None.
+        """
+        self.path = PurePosixPath(path)
+        self.size = size
+        self.ext = suffix_of(self.path) if ext is None else ext
+        self.digest = digest
+        self._opener = opener
+
+    @property
+    def name(self) -> str:
+        """Name of the file."""
+        return self.path.name
+
+    @property
+    def suffix(self) -> str:
+        """Suffix of the file."""
+        return self.path.suffix
+
+    def open(self) -> BinaryIO:
+        """Open the file for binary reading."""
+        return self._opener()
+
+    def read(self) -> bytes:
+        """Read the full contents of the file."""
+        with self.open() as f:
+            return f.read()
+
+    def __repr__(self):
+        return f"StreamedFile({self.path.as_posix()!r}, size={self.size})"
+
+
+def _extensions_of(category: str) -> list[str]:
+    return [ext for ext, c in CATEGORIES.items() if c == category]
 
 
 class FileExtractor:
+    """Finds image, video and font files in directories and the archives in them.
 
-    ARCHIVE_EXTENSIONS = [".zip", ".rar", ".gz", ".tar"]
-    IMAGE_EXTENSIONS = [
-        ".png",
-        ".jpg",
-        ".jpeg",
-        ".svg",
-        ".webp",
-        ".tiff",
-        ".tif",
-        ".bmp",
-        ".psd",
-    ]
-    VIDEO_EXTENSIONS = [".mp4", ".mov", ".gif"]
-
-    FONT_EXTENSIONS = [".otf"]
+    Files on disk are classified by their first bytes (see `FileClassifier`), so files
+    with upper-case, unusual or missing suffixes are found too. Members of archives are
+    classified by their name and only read when it does not tell their type.
+    """
+
+    # the extensions of each category, see `greybox.utils._sniff.CATEGORIES`
+    ARCHIVE_EXTENSIONS = _extensions_of("archive")
+    # archives that can be read in memory with `zipfile`/`tarfile`, others need patool
+    STREAMABLE_ARCHIVE_EXTENSIONS = frozenset(ARCHIVE_EXTENSIONS) - {".rar", ".7z"}
+    # nested archives larger than this are spooled to a temporary file
+    SPOOL_MAX_SIZE = 256 * 2**20
+    IMAGE_EXTENSIONS = _extensions_of("image")
+    VIDEO_EXTENSIONS = _extensions_of("video")
+    FONT_EXTENSIONS = _extensions_of("font")  # for icon fonts
+    CATEGORIES = frozenset(("image", "video", "font"))
 
     def __init__(
         self,
         extract_archives: bool = True,
+        dedup: "DedupIndex | None" = None,
+        classifier: FileClassifier | None = None,
+        record_files: bool = True,
     ):
+        """Constructor.
+
+        Args:
+            extract_archives (bool, optional): whether to look inside archives. Defaults to True.
+            dedup (DedupIndex | None, optional): if given, files whose bytes were already added to this index (by any run that used it) are skipped, without being decoded. Defaults to None.
+            classifier (FileClassifier | None, optional): classifier of the files on disk, e.g. with threads or a cache for large or network-mounted trees. Defaults to a serial one without a cache.
+            record_files (bool, optional): whether files are added to `dedup` as they are found. If False, found files are only checked against it and the caller adds their `StreamedFile.digest` with `DedupIndex.add_digest` once they are processed, so that a file is not skipped by the next run if processing it fails. Copies of a file that is still being processed are not skipped then, the caller can check the digests it has in flight. Defaults to True.
+        """
         super().__init__()
-        self._extensions = (
-            FileExtractor.IMAGE_EXTENSIONS
-            + FileExtractor.VIDEO_EXTENSIONS
-            + FileExtractor.FONT_EXTENSIONS  # for icon fonts
-        )
+        self._dedup = dedup
+        self._record_files = record_files
+        self._classifier = FileClassifier() if classifier is None else classifier
         self._extract_archives = extract_archives
-        if self._extract_archives:
-            assert not any(
-                ext in self._extensions for ext in FileExtractor.ARCHIVE_EXTENSIONS
-            )
 
-    def find_all(self, path: str | Path, depth: int = 1):
-        if depth == 0:
-            yield from []
-        file_iter = find_all_files(path)
-        for file in file_iter:
-            if Path(file).is_symlink():
-                continue  # TODO ignore simlinks...?
-            if file.suffix in self._extensions:
-                yield file
-            elif file.suffix in FileExtractor.ARCHIVE_EXTENSIONS:
-                out = extract_archive(
-                    file, f"./tmp/{file.name.split('.')[0]}-{time.time()}"
+    def find_all(
+        self,
+        path: str | Path,
+        depth: int = 1,
+        scheduler: ExtractionScheduler | None = None,
+    ) -> Iterator[Path]:
+        """Find all image, video and font files in `path`, extracting archives to disk.
+
+        Archives are extracted by an `ExtractionScheduler` (in a process pool, while
+        the files found before them are consumed), nested archives up to `depth` levels
+        deep. Each extracted tree is deleted once its files have been yielded, so files
+        inside archives must be used (or copied) before the next archive is reached.
+        Prefer `stream_all`, which reads zip and tar archives without extracting them.
+
+        Args:
+            path (str | Path): directory to search.
+            depth (int, optional): how many levels of (nested) archives to open, 0 ignores archives. Defaults to 1.
+            scheduler (ExtractionScheduler | None, optional): scheduler to extract archives with (to set its workers and scratch quota). Defaults to a new one that is closed when the search is done.
+
+        Yields:
+            Path: path of each matching file.
+        """
+        if scheduler is None:
+            with ExtractionScheduler() as scheduler:
+                yield from self.find_all(path, depth, scheduler)
+            return
+        metrics = get_metrics()
+        archives = _Queue() if self._extract_archives and depth > 0 else None
+        extracted = None if archives is None else scheduler.extract(archives)
+        try:
+            # one walk, each file is classified once
+            for file, ext in self._classify(path):
+                category = CATEGORIES.get(ext)
+                if category in self.CATEGORIES:
+                    if self._is_new(file, file.as_posix())[0]:
+                        metrics.add("discover")
+                        yield file
+                elif archives is not None and category == "archive":
+                    # extracted right away, while the files after it are consumed
+                    archives.append(file)
+                    extracted.submit()
+            if extracted is not None:
+                for _, tree in extracted:
+                    yield from self.find_all(tree, depth - 1, scheduler)
+        finally:
+            if extracted is not None:
+                extracted.close()
+
+    def stream_all(self, path: str | Path, depth: int = 1) -> Iterator[StreamedFile]:
+        """Find all image, video and font files in `path` without extracting archives to disk.
+
+        Zip and tar (including compressed tar and plain gzip) archives are traversed in
+        memory with `zipfile`/`tarfile`, nested archives are opened up to `depth` levels
+        deep. Other archive formats (e.g. rar) fall back to patool and are extracted to a
+        temporary directory that is removed once its files have been yielded.
+
+        Args:
+            path (str | Path): directory to search.
+            depth (int, optional): how many levels of (nested) archives to open. Defaults to 1.
+
+        Yields:
+            StreamedFile: handle to each matching file.
+        """
+        for file, ext in self._classify(path):
+            category = CATEGORIES.get(ext)
+            if category in self.CATEGORIES:
+                new, digest = self._is_new(file, file.as_posix())
+                if not new:
+                    continue
+                size = file.stat().st_size
+                get_metrics().add("discover", nbytes=size)
+                yield StreamedFile(
+                    file.as_posix(), size, partial(open, file, "rb"), ext, digest
+                )
+            elif self._extract_archives and category == "archive" and depth > 0:
+                yield from self._stream_archive(file.as_posix(), file, depth, ext)
+
+    def _classify(self, path: str | Path) -> Iterator[tuple[Path, str | None]]:
+        # symlinks are skipped: their targets are either found in the tree anyway or
+        # outside of it, and a link to a file in an archive must not escape its tree
+        return self._classifier.classify_all(scan_files(path, symlinks=False))
+
+    def _is_new(self, source: Path | bytes, key: str) -> tuple[bool, bytes | None]:
+        # whether the file was not seen before, and its digest (None without an index)
+        if self._dedup is None:
+            return True, None
+        from ._dedup import file_digest  # already imported with the index
+
+        digest = file_digest(source)
+        if self._record_files:
+            return self._dedup.add_digest(digest, key), digest
+        return not self._dedup.has_digest(digest), digest
+
+    def _stream_archive(
+        self, name: str, source: Path | BinaryIO, depth: int, ext: str
+    ) -> Iterator[StreamedFile]:
+        # `source` is either a path on disk or a seekable binary file object
+        if ext not in self.STREAMABLE_ARCHIVE_EXTENSIONS:
+            yield from self._stream_with_patool(name, source, depth, ext)
+        elif ext == ".zip":
+            with zipfile.ZipFile(source) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        yield from self._stream_member(
+                            f"{name}/{info.filename}",
+                            info.file_size,
+                            partial(archive.open, info),
+                            depth,
+                        )
+        else:
+            try:
+                archive = _open_tar(source)
+            except tarfile.ReadError:
+                archive = None
+            if archive is None:
+                # a single compressed file (e.g. icon.png.gz)
+                decompress = _DECOMPRESS.get("." + ext.rsplit(".", 1)[-1])
+                if decompress is not None:
+                    yield from self._stream_member(
+                        f"{name}/{PurePosixPath(name).stem}",
+                        -1,
+                        partial(_open_compressed, decompress, source),
+                        depth,
+                    )
+                return
+            with archive:
+                for info in archive:
+                    if info.isfile():
+                        yield from self._stream_member(
+                            f"{name}/{info.name}",
+                            info.size,
+                            partial(archive.extractfile, info),
+                            depth,
+                        )
+
+    def _stream_member(
+        self, name: str, size: int, opener: Callable[[], BinaryIO], depth: int
+    ) -> Iterator[StreamedFile]:
+        ext = suffix_of(name)
+        category = CATEGORIES.get(ext)
+        nested = self._extract_archives and depth > 1
+        data = None
+        if category is None or (
+            category in self.CATEGORIES and self._dedup is not None
+        ):
+            # read the member only once, the members of compressed tars can only be
+            # reopened by decompressing the archive from its start again
+            with opener() as f:
+                data = f.read(SNIFF_SIZE)
+                if category is None:  # the name does not tell, the first bytes do
+                    ext = sniff_file(name, data)
+                    category = CATEGORIES.get(ext)
+                if not (
+                    category in self.CATEGORIES or (category == "archive" and nested)
+                ):
+                    return
+                data += f.read()
+            opener, size = partial(io.BytesIO, data), len(data)
+        metrics = get_metrics()
+        if category in self.CATEGORIES:
+            new, digest = self._is_new(data, name)
+            if not new:
+                return
+            metrics.add("discover", nbytes=max(size, 0))
+            yield StreamedFile(name, size, opener, ext, digest)
+        elif category == "archive" and nested:
+            if data is not None:
+                yield from self._stream_archive(name, io.BytesIO(data), depth - 1, ext)
+                return
+            # nested archives need random access, copy them out of the parent archive
+            with tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE) as buffer:
+                with (
+                    metrics.time("extract_archive", nbytes=max(size, 0)),
+                    opener() as src,
+                ):
+                    while chunk := src.read(1 << 20):
+                        buffer.write(chunk)
+                buffer.seek(0)
+                yield from self._stream_archive(name, buffer, depth - 1, ext)
+
+    def _stream_with_patool(
+        self, name: str, source: Path | BinaryIO, depth: int, ext: str
+    ) -> Iterator[StreamedFile]:
+        with tempfile.TemporaryDirectory(prefix="greybox-") as tmp:
+            if not isinstance(source, Path):
+                # patool guesses the format from the name, so it has to tell
+                archive_name = PurePosixPath(name).name
+                if suffix_of(archive_name) != ext:
+                    archive_name += ext
+                archive_path = Path(tmp, archive_name)
+                with open(archive_path, "wb") as f:
+                    while chunk := source.read(1 << 20):
+                        f.write(chunk)
+                source = archive_path
+            out = Path(tmp, "extracted")
+            metrics = get_metrics()
+            nbytes = source.stat().st_size if metrics.enabled else 0
+            with metrics.time("extract_archive", nbytes=nbytes):
+                extract_archive(source, out)
+            for file in scan_files(out, symlinks=False):
+                yield from self._stream_member(
+                    f"{name}/{file.relative_to(out).as_posix()}",
+                    file.stat().st_size,
+                    partial(open, file, "rb"),
+                    depth,
                 )
-                yield from self.find_all(out, depth=depth - 1)
-            else:
-                pass  # tqdm.write(f"Unknown file extention: {file.name}, skipping...")
+
+
+def _open_tar(source: Path | BinaryIO) -> tarfile.TarFile:
+    if isinstance(source, Path):
+        return tarfile.open(source, mode="r:*")
+    source.seek(0)
+    return tarfile.open(fileobj=source, mode="r:*")
+
+
+_DECOMPRESS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def _open_compressed(decompress: Callable, source: Path | BinaryIO) -> BinaryIO:
+    if not isinstance(source, Path):
+        source.seek(0)
+    return decompress(source, "rb")
@@ -0,0 +1,244 @@
+"""Rasterize the glyphs of (icon) fonts into atlases."""
+
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from ._concurrency import bounded_map
+
+# PIL and fontTools are imported where they are used, fontTools is only needed to list
+# the codepoints of a font
+
+__all__ = ("FontRenderer", "GlyphAtlas", "font_codepoints", "render_fonts")
+
+OUTPUTS = ("atlas", "batch")
+
+
+class GlyphAtlas(NamedTuple):
+    """The glyphs of a font at one size, packed into one RGBA image."""
+
+    image: np.ndarray  # (H, W, 4) uint8, glyph coverage in the alpha channel
+    boxes: np.ndarray  # (N, 4) int32 (x, y, w, h) of each glyph in `image`
+    codepoints: np.ndarray  # (N,) int32 codepoint of each glyph
+    size: int  # font size in pixels
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+def font_codepoints(font: str | Path | bytes, index: int = 0) -> np.ndarray:
+    """List the codepoints a font has a glyph for (the keys of its best cmap).
+
+    Args:
+        font (str | Path | bytes): font file (.ttf, .otf, .ttc, .woff, .woff2) or its bytes.
+        index (int, optional): index of the font in a collection (.ttc). Defaults to 0.
+
+    Returns:
+        np.ndarray: (N,) int32 sorted codepoints.
+    """
+    try:
+        from fontTools.ttLib import TTFont
+    except ImportError as e:
+        raise ImportError(
+            "Listing the glyphs of a font requires fontTools, install it with `pip install greybox[fonts]`."
+        ) from e
+
+    if isinstance(font, (bytes, bytearray, memoryview)):
+        font = BytesIO(font)
+    # lazy, only the cmap table is parsed
+    with TTFont(font, fontNumber=index, lazy=True) as tt:
+        cmap = tt.getBestCmap() or {}
+    return np.array(sorted(cmap), dtype=np.int32)
+
+
+class FontRenderer:
+    """Renders every glyph of a font, at any number of sizes, into `GlyphAtlas`es.
+
+    The font file is read and its cmap parsed once, and the face of each size is
+    cached, so rendering the same size again does not reopen the font. PIL ties a
+    FreeType face to one size (`font_variant` also opens a new one), so each new size
+    still loads a face from the bytes in memory and FreeType parses its tables again.
+
+    Example:
+        ```python
+        renderer = FontRenderer("fontawesome.otf")
+        atlases = [renderer.atlas(size) for size in (16, 32, 64)]
+        batch = renderer.batch(32)  # IconBatch, like `pack_icons`
+        ```
+    """
+
+    def __init__(
+        self,
+        font: str | Path | bytes,
+        index: int = 0,
+        codepoints: Iterable[int] | None = None,
+    ):
+        """Constructor.
+
+        Args:
+            font (str | Path | bytes): font file or its bytes.
+            index (int, optional): index of the font in a collection (.ttc). Defaults to 0.
+            codepoints (Iterable[int] | None, optional): codepoints to render, e.g. a private use range of an icon font. Defaults to all the codepoints in the font (see `font_codepoints`).
+        """
+        if isinstance(font, (str, Path)):
+            font = Path(font).read_bytes()
+        self.data = bytes(font)
+        self.index = index
+        if codepoints is None:
+            self.codepoints = font_codepoints(self.data, index)
+        else:
+            self.codepoints = np.array(sorted(set(codepoints)), dtype=np.int32)
+        self._faces = {}
+
+    def face(self, size: int):
+        """The (cached) PIL font of this font at `size` pixels."""
+        face = self._faces.get(size)
+        if face is None:
+            from PIL import ImageFont
+
+            # a new face, from memory rather than the file
+            face = ImageFont.truetype(
+                BytesIO(self.data),
+                size,
+                index=self.index,
+                layout_engine=ImageFont.Layout.BASIC,  # single glyphs, no shaping
+            )
+            self._faces[size] = face
+        return face
+
+    def atlas(
+        self,
+        size: int,
+        color: tuple[int, int, int] = (255, 255, 255),
+        padding: int = 1,
+    ) -> GlyphAtlas:
+        """Render every glyph at `size` pixels into one atlas.
+
+        Glyphs are cropped to their ink and packed in rows (tallest first), `boxes` and
+        `codepoints` are in codepoint order. Glyphs without ink (e.g. spaces) are
+        skipped.
+
+        Args:
+            size (int): font size in pixels.
+            color (tuple[int, int, int], optional): RGB colour of the glyphs. Defaults to (255, 255, 255).
+            padding (int, optional): transparent pixels between glyphs. Defaults to 1.
+
+        Returns:
+            GlyphAtlas: the atlas, the box and the codepoint of each glyph.
+        """
+        face = self.face(size)
+        masks, codepoints = [], []
+        for codepoint in self.codepoints.tolist():
+            mask = face.getmask(chr(codepoint), mode="L")
+            w, h = mask.size
+            if w == 0 or h == 0:
+                continue
+            mask = np.asarray(mask).reshape(h, w)
+            # the mask spans the advance of the glyph, crop it to the ink
+            rows, columns = mask.any(axis=1), mask.any(axis=0)
+            if not rows.any():
+                continue
+            y0, y1 = rows.argmax(), h - rows[::-1].argmax()
+            x0, x1 = columns.argmax(), w - columns[::-1].argmax()
+            masks.append(mask[y0:y1, x0:x1])
+            codepoints.append(codepoint)
+
+        # shelf packing: the tallest glyphs first, in rows of about the width that
+        # makes the atlas square
+        n = len(masks)
+        sizes = np.array([m.shape[::-1] for m in masks], dtype=np.int64).reshape(-1, 2)
+        sizes += padding
+        width = max(
+            int(np.sqrt((sizes[:, 0] * sizes[:, 1]).sum())), sizes[:, 0].max(initial=0)
+        )
+        boxes = np.empty((n, 4), dtype=np.int32)
+        x = y = shelf = padding
+        for i in np.argsort(-sizes[:, 1], kind="stable"):
+            w, h = sizes[i]
+            if x + w > width + padding:
+                x, y = padding, y + shelf
+            if x == padding:
+                shelf = h
+            boxes[i] = x, y, w - padding, h - padding
+            x += w
+        image = np.zeros(
+            (y + shelf if n else padding, width + padding, 4), dtype=np.uint8
+        )
+        # every pixel has the glyph colour, so resizing does not darken the edges
+        image[..., :3] = color
+        for (x, y, w, h), mask in zip(boxes, masks):
+            image[y : y + h, x : x + w, 3] = mask
+        return GlyphAtlas(image, boxes, np.array(codepoints, dtype=np.int32), size)
+
+    def batch(self, size: int, **kwargs):
+        """Render every glyph at `size` pixels into an `IconBatch` (see `pack_icons`).
+
+        Requires OpenCV. `kwargs` are passed to `atlas`.
+        """
+        from ._extract_icons import pack_icons
+
+        atlas = self.atlas(size, **kwargs)
+        return pack_icons(atlas.image, atlas.boxes)
+
+
+def _render_font(
+    font: str | Path, sizes: tuple[int, ...], output: str, kwargs: dict
+) -> list:
+    # module level so that it can be pickled and sent to worker processes, all sizes of
+    # a font are rendered by the same worker so that they share its `FontRenderer`
+    renderer = FontRenderer(font)
+    render = renderer.atlas if output == "atlas" else renderer.batch
+    return [(size, render(size, **kwargs)) for size in sizes]
+
+
+def render_fonts(
+    fonts: Iterable[str | Path],
+    sizes: int | Iterable[int],
+    output: str = "atlas",
+    workers: int | None = None,
+    **kwargs,
+) -> Iterator[tuple]:
+    """Render the glyphs of many fonts at one or more sizes, in parallel across fonts.
+
+    Example:
+        ```python
+        classifier = FileClassifier()
+        fonts = [
+            path
+            for path, ext in classifier.classify_all(scan_files("assets/"))
+            if classifier.category(ext) == "font"  # by content, not by suffix
+        ]
+        for font, size, atlas in render_fonts(fonts, (16, 32)):
+            Image.fromarray(atlas.image).save(f"{font.stem}-{size}.png")
+        ```
+
+    Args:
+        fonts (Iterable[str | Path]): font files.
+        sizes (int | Iterable[int]): font size(s) in pixels.
+        output (str, optional): "atlas" yields a `GlyphAtlas`, "batch" yields an `IconBatch` (requires OpenCV). Defaults to "atlas".
+        workers (int | None, optional): number of processes, 0 renders in this process. Defaults to the number of CPUs.
+        kwargs: passed to `FontRenderer.atlas` (e.g. `color`, `padding`).
+
+    Yields:
+        tuple: (font, size, atlas or batch), fonts in order, then sizes in order.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output: {output}, expected one of {OUTPUTS}")
+    sizes = (sizes,) if isinstance(sizes, int) else tuple(sizes)
+    fonts = list(fonts)
+    render = partial(_render_font, sizes=sizes, output=output, kwargs=kwargs)
+    executor = None
+    if workers != 0 and len(fonts) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for font, results in zip(fonts, bounded_map(render, fonts, executor=executor)):
+            for size, result in results:
+                yield font, size, result
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
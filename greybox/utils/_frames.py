@@ -0,0 +1,181 @@
+"""Lazy frame sources for animated images (GIF, WebP, APNG) and videos."""
+
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+import numpy as np
+
+from ._dedup import _resize_gray
+from ._sniff import CATEGORIES, SNIFF_SIZE, sniff_file
+
+# PIL and OpenCV are imported where they are used, OpenCV is only needed for videos
+
+__all__ = ("Frame", "iter_frames")
+
+# frames are compared as grayscale thumbnails of this size
+_THUMBNAIL = 32
+
+
+class Frame(NamedTuple):
+    """A frame of an animation or video."""
+
+    index: int  # position of the frame in the source
+    time: float  # seconds from the start of the source
+    image: np.ndarray  # (H, W, 3) RGB or (H, W, 4) RGBA uint8
+
+
+def iter_frames(
+    source: str | Path | bytes | BinaryIO,
+    stride: int = 1,
+    interval: float | None = None,
+    min_difference: float = 1.0,
+    max_frames: int | None = None,
+) -> Iterator[Frame]:
+    """Lazily decode the frames of an animated image or a video.
+
+    Only one frame is held in memory at a time. Animated images (GIF, WebP, APNG, or
+    any other format PIL reads) are read with `ImageSequence`, their frames are RGBA if
+    they have transparency. Videos are read with `cv2.VideoCapture`, frames that are
+    skipped are only grabbed, not converted, and are returned as RGB. Still images are
+    a single frame.
+
+    Frames are sampled with `stride` and `interval` (both must pass), then a frame is
+    dropped if its grayscale 32x32 thumbnail differs from the one of the last frame
+    that was kept by less than `min_difference` on average, which drops held frames
+    and near identical consecutive ones cheaply.
+
+    Example:
+        ```python
+        for frame in iter_frames("idle.gif", min_difference=2.0):
+            icons = list(extract_icons(frame.image, output="array"))
+        ```
+
+    Args:
+        source (str | Path | bytes | BinaryIO): path, bytes or seekable binary file of the animation or video. Videos that are not on disk are copied to a temporary file first.
+        stride (int, optional): keep every `stride`-th frame. Defaults to 1.
+        interval (float | None, optional): keep at most one frame per `interval` seconds. Defaults to None.
+        min_difference (float, optional): minimum mean absolute difference (in gray levels, 0-255) to the last kept frame, 0 keeps all sampled frames. Defaults to 1.0.
+        max_frames (int | None, optional): stop after this many frames were yielded. Defaults to None.
+
+    Yields:
+        Frame: the kept frames, in order.
+    """
+    if stride < 1:
+        raise ValueError(f"stride must be at least 1, got {stride}")
+    if isinstance(source, (str, Path)):
+        ext = sniff_file(source)
+    else:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            header = bytes(source[:SNIFF_SIZE])
+        else:
+            header = source.read(SNIFF_SIZE)
+            source.seek(0)
+        ext = sniff_file("", header)
+    if CATEGORIES.get(ext) == "video":
+        frames = _video_frames(source, ext, stride)
+    else:
+        frames = _image_frames(source, stride)
+
+    next_time = 0.0
+    previous = None
+    kept = 0
+    if max_frames is not None and max_frames <= 0:
+        return
+    try:
+        # frames are only decoded (to an array) once they pass the sampling
+        for i, time, decode in frames:
+            if interval is not None:
+                if time < next_time:
+                    continue
+                next_time = time + interval
+            image = decode()
+            thumbnail = _resize_gray(image, _THUMBNAIL, _THUMBNAIL)[0]
+            if (
+                previous is not None
+                and np.abs(thumbnail - previous).mean() < min_difference
+            ):
+                continue
+            previous = thumbnail
+            kept += 1
+            yield Frame(i, time, image)
+            if max_frames is not None and kept >= max_frames:
+                return
+    finally:
+        frames.close()
+
+
+# the frame sources yield (index, time, decode), `decode()` returns the image and is
+# only valid until the next frame is requested
+
+
+def _image_frames(source, stride: int) -> Iterator[tuple]:
+    from io import BytesIO
+
+    from PIL import Image, ImageSequence
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    with Image.open(source) as img:
+        alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        time = 0.0
+        # frames are composited onto the previous ones, so all of them are decoded
+        for i, frame in enumerate(ImageSequence.Iterator(img)):
+            if i % stride == 0:
+                yield i, time, _converter(frame, alpha)
+            time += frame.info.get("duration", 0) / 1000
+
+
+def _converter(frame, alpha: bool):
+    def convert() -> np.ndarray:
+        return np.asarray(frame.convert("RGBA" if alpha else "RGB"))
+
+    return convert
+
+
+def _video_frames(source, ext: str, stride: int) -> Iterator[tuple]:
+    try:
+        import cv2
+    except ImportError as e:
+        raise ImportError(
+            "Reading videos requires OpenCV, install it with `pip install greybox[opencv]`."
+        ) from e
+
+    with tempfile.TemporaryDirectory(prefix="greybox-") as tmp:
+        if not isinstance(source, (str, Path)):
+            # VideoCapture only reads files
+            path = Path(tmp, f"video{ext}")
+            with open(path, "wb") as f:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    f.write(source)
+                else:
+                    while chunk := source.read(1 << 20):
+                        f.write(chunk)
+            source = path
+        capture = cv2.VideoCapture(Path(source).as_posix())
+        try:
+            if not capture.isOpened():
+                raise ValueError(f"Could not open video: {source}")
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            i = 0
+            while capture.grab():
+                if i % stride == 0:
+                    if fps > 0:
+                        time = i / fps
+                    else:
+                        time = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                    yield i, time, _retriever(capture, cv2)
+                i += 1
+        finally:
+            capture.release()
+
+
+def _retriever(capture, cv2):
+    def retrieve() -> np.ndarray:
+        ok, image = capture.retrieve()
+        if not ok:
+            raise ValueError("Could not decode video frame.")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    return retrieve
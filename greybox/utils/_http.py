@@ -0,0 +1,199 @@
+"""Shared HTTP session and an on-disk cache of downloaded files."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ._metrics import get_metrics
+
+__all__ = ("HttpCache", "get_session", "fetch")
+
+DEFAULT_TIMEOUT = 30.0  # seconds, for both connecting and reading
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = 32, retries: int = 3) -> requests.Session:
+    """Get the shared `requests.Session`, created on first use.
+
+    Connections are kept alive and reused across calls (and threads), and failed
+    connections or 429/5xx responses are retried with exponential backoff.
+
+    Args:
+        pool_size (int, optional): maximum number of connections kept open per host. Only used when the session is created. Defaults to 32.
+        retries (int, optional): number of retries. Only used when the session is created. Defaults to 3.
+
+    Returns:
+        requests.Session: the shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session(pool_size=pool_size, retries=retries)
+        return _session
+
+
+def make_session(pool_size: int = 32, retries: int = 3) -> requests.Session:
+    """Create a new session with a connection pool of `pool_size`, see `get_session`."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # hand back the last response once retries run out
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _atomic_write(path: Path, data: bytes):
+    # write next to the target and rename, readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class HttpCache:
+    """On-disk cache of HTTP responses, keyed by the sha256 of the URL.
+
+    The body of each response is stored in `{directory}/{key[:2]}/{key}` with a `.json`
+    sidecar holding its `ETag`/`Last-Modified` validators. Cached entries are
+    revalidated with a conditional request, so unchanged files are not downloaded again
+    (the server answers `304 Not Modified`). Writes are atomic and the cache can be
+    shared by many threads.
+
+    Example:
+        ```python
+        cache = HttpCache("~/.cache/greybox")
+        path = cache.get("https://example.com/icon.png")
+        ```
+    """
+
+    def __init__(self, directory: str | Path, revalidate: bool = True):
+        """Create (or open) a cache.
+
+        Args:
+            directory (str | Path): directory to store the cached files in.
+            revalidate (bool, optional): whether to revalidate cached entries with the server. If False, cached entries are always used as is (e.g. to work offline). Defaults to True.
+        """
+        self.directory = Path(directory).expanduser().resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.revalidate = revalidate
+
+    def path_for(self, url: str) -> Path:
+        """Path where the body of `url` is (or would be) cached."""
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / key[:2] / key
+
+    def __contains__(self, url: str):
+        return self.path_for(url).exists()
+
+    def get(
+        self,
+        url: str,
+        session: requests.Session | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> Path:
+        """Get the path of the cached body of `url`, downloading it if needed.
+
+        Args:
+            url (str): url to get.
+            session (requests.Session | None, optional): session to use. Defaults to the shared session (see `get_session`).
+            timeout (float, optional): request timeout in seconds. Defaults to 30.
+
+        Raises:
+            requests.HTTPError: if the server responds with an error.
+
+        Returns:
+            Path: path of the cached file.
+        """
+        path = self.path_for(url)
+        meta_path = path.with_suffix(".json")
+        headers = {}
+        if path.exists():
+            if not self.revalidate:
+                return path
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, json.JSONDecodeError):
+                meta = {}
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        session = session or get_session()
+        metrics = get_metrics()
+        start = time.perf_counter()
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and path.exists():
+            metrics.add("download_cached", time.perf_counter() - start)
+            return path
+        if not response.ok:
+            metrics.add("download_failed", time.perf_counter() - start)
+            response.raise_for_status()
+        metrics.add(
+            "download", time.perf_counter() - start, nbytes=len(response.content)
+        )
+        path.parent.mkdir(exist_ok=True)
+        _atomic_write(path, response.content)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type"),
+        }
+        _atomic_write(meta_path, json.dumps(meta).encode())
+        return path
+
+
+def fetch(
+    url: str,
+    session: requests.Session | None = None,
+    cache: HttpCache | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> bytes:
+    """Download the body of `url`, through `cache` if one is given.
+
+    Args:
+        url (str): url to download.
+        session (requests.Session | None, optional): session to use. Defaults to the shared session (see `get_session`).
+        cache (HttpCache | None, optional): cache to use. Defaults to None.
+        timeout (float, optional): request timeout in seconds. Defaults to 30.
+
+    Raises:
+        requests.HTTPError: if the server responds with an error.
+
+    Returns:
+        bytes: the response body.
+    """
+    if cache is not None:
+        return cache.get(url, session=session, timeout=timeout).read_bytes()
+    metrics = get_metrics()
+    start = time.perf_counter()
+    response = (session or get_session()).get(url, timeout=timeout)
+    if not response.ok:
+        metrics.add("download_failed", time.perf_counter() - start)
+        response.raise_for_status()
+    metrics.add("download", time.perf_counter() - start, nbytes=len(response.content))
+    return response.content
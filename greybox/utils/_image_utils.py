@@ -1,17 +1,34 @@
 import numpy as np
-import requests
 import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PIL import Image
 from io import BytesIO
 from urllib.parse import urlparse
 
+from ._concurrency import bounded_map
+from ._http import DEFAULT_TIMEOUT, HttpCache, fetch, get_session, make_session
+from ._encode import EncodeProfile, get_profile, open_image, save_image
+from ._manifest import ConversionManifest
+from ._metrics import get_metrics
 
-def open(uri: str) -> Image:
+
+def _is_url(uri: str) -> bool:
+    return urlparse(str(uri)).scheme in ("http", "https")
+
+
+def open(
+    uri: str,
+    cache: HttpCache | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> Image:
     """Open an image from a file or url.
 
     Args:
         uri (str): file path or url
+        cache (HttpCache | None, optional): cache to download urls through. Defaults to None.
+        timeout (float, optional): request timeout in seconds. Defaults to 30.
 
     Raises:
         FileNotFoundError: if the file could not be found
@@ -21,30 +38,158 @@ def open(uri: str) -> Image:
     """
     if os.path.isfile(uri):
         return Image.open(uri)
-    elif urlparse(uri).scheme in ("http", "https", "ftp"):
-        response = requests.get(uri)
-        if response.status_code == 200:
-            return Image.open(BytesIO(response.content))
-        else:
-            response.raise_for_status()
+    elif _is_url(uri):
+        return Image.open(BytesIO(fetch(uri, cache=cache, timeout=timeout)))
     else:
         raise FileNotFoundError(uri)
 
 
-def convert_to_png(input_path: str | Path, output_path: str | Path | None = None):
+class LazyImage:
+    """An image that is only decoded when it is accessed.
+
+    Holds the path (or the downloaded bytes) of an image, `image` decodes it on first
+    access and `array` converts it to a NumPy array.
+    """
+
+    __slots__ = ("uri", "path", "data", "_image")
+
+    def __init__(self, uri: str, path: Path | None = None, data: bytes | None = None):
+        self.uri = uri
+        self.path = path
+        self.data = data
+        self._image = None
+
+    def __repr__(self):
+        return f"LazyImage({self.uri!r})"
+
+    def read(self) -> bytes:
+        """The encoded bytes of the image."""
+        return self.data if self.data is not None else Path(self.path).read_bytes()
+
+    @property
+    def image(self) -> Image.Image:
+        """The decoded PIL image."""
+        if self._image is None:
+            if self.data is not None:
+                self._image = Image.open(BytesIO(self.data))
+            else:
+                self._image = Image.open(self.path)
+            self._image.load()
+        return self._image
+
+    @property
+    def array(self) -> np.ndarray:
+        """The decoded image as a NumPy array."""
+        return np.asarray(self.image)
+
+
+def _load_lazy(uri, session, cache: HttpCache | None, timeout: float) -> LazyImage:
+    if not _is_url(uri):
+        if not os.path.isfile(uri):
+            raise FileNotFoundError(uri)
+        return LazyImage(str(uri), path=Path(uri))
+    if cache is not None:
+        return LazyImage(uri, path=cache.get(uri, session=session, timeout=timeout))
+    return LazyImage(uri, data=fetch(uri, session=session, timeout=timeout))
+
+
+def open_many(
+    uris: Iterable[str],
+    concurrency: int = 16,
+    cache_dir: str | Path | HttpCache | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    lazy: bool = True,
+    return_exceptions: bool = False,
+) -> Iterator[LazyImage | Image.Image | Exception]:
+    """Open many images from files or urls, downloading them concurrently.
+
+    Urls are fetched by a pool of `concurrency` threads that share one connection pool,
+    `uris` is consumed lazily and results are yielded in input order.
+
+    Example:
+        ```python
+        for icon in open_many(urls, concurrency=32, cache_dir="~/.cache/greybox"):
+            x = icon.array
+        ```
+
+    Args:
+        uris (Iterable[str]): file paths or urls.
+        concurrency (int, optional): number of concurrent downloads. Defaults to 16.
+        cache_dir (str | Path | HttpCache | None, optional): directory (or cache) to keep downloads in, see `HttpCache`. Cached files are revalidated with the server and only downloaded again if they changed. Defaults to None.
+        timeout (float, optional): request timeout in seconds. Defaults to 30.
+        lazy (bool, optional): whether to yield `LazyImage`s (decoded on access) rather than PIL images. Defaults to True.
+        return_exceptions (bool, optional): whether to yield the exception of a failed download (or decode) in place of its image, rather than raising it. Defaults to False.
+
+    Yields:
+        LazyImage | Image.Image | Exception: the image of each uri.
+    """
+    cache = cache_dir
+    if cache is not None and not isinstance(cache, HttpCache):
+        cache = HttpCache(cache)
+    concurrency = max(1, concurrency)
+    # the shared session's pool is too small for more threads, use a dedicated one
+    owned = concurrency > 32
+    session = make_session(concurrency) if owned else get_session()
+
+    def _load(uri):
+        try:
+            image = _load_lazy(uri, session, cache, timeout)
+            return image if lazy else image.image
+        except Exception as e:
+            if return_exceptions:
+                return e
+            raise
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            yield from bounded_map(_load, uris, executor=executor)
+    finally:
+        if owned:
+            session.close()
+
+
+def convert_to_png(
+    input_path: str | Path,
+    output_path: str | Path | None = None,
+    manifest: ConversionManifest | None = None,
+    profile: str | EncodeProfile = "default",
+    max_size: int | tuple[int, int] | None = None,
+):
     input_path = Path(input_path).expanduser().resolve()
-    if input_path.suffix == ".png":
-        return input_path  # the file is already a png
+    profile = get_profile(profile)
+    previous = None
+    if input_path.suffix == profile.suffix and max_size is None:
+        return input_path  # the file is already a png, there is nothing to re-encode
+
+    if manifest is not None:
+        if manifest.is_current(input_path):
+            return manifest.output_for(input_path)  # unchanged since the last run
+        previous = manifest.output_for(input_path)
+        if previous is not None:
+            output_path = previous.with_suffix(profile.suffix)
 
     if output_path is None:
-        output_path = input_path.with_suffix(".png")
+        output_path = input_path.with_suffix(profile.suffix)
+        if output_path == input_path:
+            # a downscaled png, the original is never overwritten
+            output_path = output_path.with_stem(f"{input_path.stem}-1")
     else:
         output_path = Path(output_path).expanduser().resolve()
 
+    metrics = get_metrics()
     try:
-        with Image.open(input_path) as img:
-            img.save(output_path, "PNG")
-            return output_path
+        with metrics.time("decode"):
+            img = open_image(input_path, max_size)
+        with img, metrics.time("encode"):
+            save_image(img, output_path, profile)
+        if metrics.enabled:
+            metrics.add("decode", count=0, nbytes=input_path.stat().st_size)
+            metrics.add("encode", count=0, nbytes=output_path.stat().st_size)
+        if previous is not None and previous != output_path:
+            previous.unlink(missing_ok=True)  # written with another profile
+        if manifest is not None:
+            manifest.record(input_path, output_path)
+        return output_path
 
     except Exception as e:
         return None
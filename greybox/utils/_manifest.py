@@ -0,0 +1,212 @@
+"""Persistent manifest that maps converted input files to their outputs."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+__all__ = ("ConversionManifest",)
+
+
+def _file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ConversionManifest:
+    """JSON-lines index of `input -> output` conversions, stored in the output directory.
+
+    Each record stores the input path, its size, mtime and (optionally) a content
+    hash, together with the output path (relative to the manifest directory). The
+    file is append-only, the last record for an input wins and is kept in a dict so
+    that lookups are O(1). Use `compact` to rewrite the file without stale records.
+
+    Example:
+        ```python
+        manifest = ConversionManifest("out/.greybox-manifest.jsonl")
+        if not manifest.is_current(path):
+            output = convert(path, manifest.output_for(path) or "out/new.png")
+            manifest.record(path, output)
+        ```
+    """
+
+    FILENAME = ".greybox-manifest.jsonl"
+
+    def __init__(
+        self, path: str | Path, use_hash: bool = False, settings: dict | None = None
+    ):
+        """Load (or create) a manifest.
+
+        Args:
+            path (str | Path): path of the manifest file, or a directory in which case `FILENAME` is used.
+            use_hash (bool, optional): whether to store a content hash of each input. When the size or mtime of an input changed but its hash did not, the input is considered unchanged. Defaults to False.
+            settings (dict | None, optional): JSON-serializable conversion settings (e.g. the encode profile), stored with each record. Inputs that were converted with other settings are not current. Defaults to None.
+        """
+        path = Path(path).expanduser().resolve()
+        if path.is_dir():
+            path = path / ConversionManifest.FILENAME
+        self.path = path
+        self.root = path.parent
+        self.use_hash = use_hash
+        self.settings = settings
+        self._entries: dict[str, dict] = {}
+        self._file = None
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partially written line from an interrupted run
+                    if entry.get("deleted"):
+                        self._entries.pop(entry["input"], None)
+                    else:
+                        self._entries[entry["input"]] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, input_path: str | Path):
+        return self._key(input_path) in self._entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @staticmethod
+    def _key(input_path: str | Path) -> str:
+        return Path(input_path).expanduser().resolve().as_posix()
+
+    def inputs(self) -> list[str]:
+        """All input paths that have a record in this manifest."""
+        return list(self._entries.keys())
+
+    def outputs(self) -> set[Path]:
+        """All output paths that are currently claimed by this manifest."""
+        return {self.root / e["output"] for e in self._entries.values()}
+
+    def output_for(self, input_path: str | Path) -> Path | None:
+        """Output path previously recorded for `input_path` (or None)."""
+        entry = self._entries.get(self._key(input_path))
+        return None if entry is None else self.root / entry["output"]
+
+    def is_current(self, input_path: str | Path) -> bool:
+        """Whether `input_path` was already converted and has not changed since.
+
+        Args:
+            input_path (str | Path): input file.
+
+        Returns:
+            bool: True if the recorded output exists and the input is unchanged.
+        """
+        key = self._key(input_path)
+        entry = self._entries.get(key)
+        if entry is None or not (self.root / entry["output"]).exists():
+            return False
+        if entry.get("settings") != self.settings:
+            return False
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return False
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        if self.use_hash and entry.get("hash") and stat.st_size == entry["size"]:
+            # touched but not modified, refresh the stat so the next check is cheap
+            if _file_hash(Path(key)) == entry["hash"]:
+                self.record(key, self.root / entry["output"], _hash=entry["hash"])
+                return True
+        return False
+
+    def record(self, input_path: str | Path, output_path: str | Path, _hash=None):
+        """Record that `input_path` was converted to `output_path`.
+
+        Args:
+            input_path (str | Path): input file.
+            output_path (str | Path): output file.
+        """
+        key = self._key(input_path)
+        stat = os.stat(key)
+        output_path = Path(output_path).expanduser().resolve()
+        try:
+            output = output_path.relative_to(self.root).as_posix()
+        except ValueError:
+            output = output_path.as_posix()
+        entry = {
+            "input": key,
+            "output": output,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if self.use_hash:
+            entry["hash"] = _hash or _file_hash(Path(key))
+        if self.settings is not None:
+            entry["settings"] = self.settings
+        self._entries[key] = entry
+        self._append(entry)
+
+    def remove(self, input_path: str | Path, delete_output: bool = True):
+        """Remove the record for `input_path`.
+
+        Args:
+            input_path (str | Path): input file.
+            delete_output (bool, optional): whether to also delete the recorded output file. Defaults to True.
+        """
+        entry = self._entries.pop(self._key(input_path), None)
+        if entry is None:
+            return
+        if delete_output:
+            (self.root / entry["output"]).unlink(missing_ok=True)
+        self._append({"input": entry["input"], "deleted": True})
+
+    def prune(self, existing_inputs=None, delete_outputs: bool = True) -> list[str]:
+        """Remove records of inputs that no longer exist.
+
+        Args:
+            existing_inputs (Iterable[str | Path] | None, optional): the inputs seen by the current run, records for any other input are removed. If None, each recorded input is checked on disk. Defaults to None.
+            delete_outputs (bool, optional): whether to delete the outputs of pruned inputs. Defaults to True.
+
+        Returns:
+            list[str]: the inputs that were pruned.
+        """
+        if existing_inputs is None:
+            stale = [k for k in self._entries if not os.path.exists(k)]
+        else:
+            existing = {self._key(p) for p in existing_inputs}
+            stale = [k for k in self._entries if k not in existing]
+        for key in stale:
+            self.remove(key, delete_output=delete_outputs)
+        return stale
+
+    def compact(self):
+        """Rewrite the manifest file so that it only contains the live records."""
+        self.close()
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp, self.path)
+
+    def flush(self):
+        """Flush pending records to disk."""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """Close the underlying manifest file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _append(self, entry: dict):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # line buffered, every record is on disk as soon as it is written so that
+            # an interrupted run can be resumed
+            self._file = open(self.path, "a", buffering=1)
+        self._file.write(json.dumps(entry) + "\n")
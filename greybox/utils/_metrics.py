@@ -0,0 +1,233 @@
+"""Per-stage timers, counters and byte totals of the processing pipeline.
+
+Metrics are disabled by default, in which case `get_metrics` returns a no-op recorder
+whose `time` is a shared `nullcontext`, so instrumented code pays a function call per
+event and nothing else. Enable them with `enable_metrics`:
+
+```python
+from greybox.utils import JsonLinesSink, PrometheusSink, enable_metrics
+
+metrics = enable_metrics(JsonLinesSink("metrics.jsonl"), PrometheusSink("greybox.prom"))
+convert_images_to_png("raw", "png")
+metrics.flush()  # {"decode": {"count": ..., "seconds": ..., "bytes": ...}, ...}
+```
+
+Stages used by greybox: "discover" (files found), "extract_archive", "decode",
+"encode", "extract_icons", "download", "download_cached" (not modified since it was
+cached) and "download_failed".
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+__all__ = (
+    "Metrics",
+    "JsonLinesSink",
+    "PrometheusSink",
+    "enable_metrics",
+    "disable_metrics",
+    "get_metrics",
+    "make_sink",
+    "capture_metrics",
+)
+
+
+class Metrics:
+    """Thread-safe record of the number of items, seconds and bytes of each stage.
+
+    Worker processes record into their own `Metrics` and send `snapshot()` back to the
+    parent, which combines them with `merge`.
+    """
+
+    enabled = True
+
+    def __init__(self, *sinks, flush_interval: float | None = None):
+        """Constructor.
+
+        Args:
+            sinks: objects with a `write(snapshot: dict)` method (e.g. `JsonLinesSink`, `PrometheusSink`) that `flush` writes to.
+            flush_interval (float | None, optional): if given, `flush` is also called when this many seconds have passed since the last flush (checked whenever something is recorded). Defaults to None.
+        """
+        self.sinks = list(sinks)
+        self.flush_interval = flush_interval
+        self._stages: dict[str, list] = {}  # stage -> [count, seconds, bytes]
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, stage: str, seconds: float = 0.0, count: int = 1, nbytes: int = 0):
+        """Record `count` items that took `seconds` and processed `nbytes` in `stage`."""
+        with self._lock:
+            totals = self._stages.get(stage)
+            if totals is None:
+                totals = self._stages[stage] = [0, 0.0, 0]
+            totals[0] += count
+            totals[1] += seconds
+            totals[2] += nbytes
+            # checked and updated together, so that only one thread flushes
+            due = self.flush_interval is not None and self._due()
+        if due:
+            self._write()
+
+    @contextmanager
+    def time(self, stage: str, count: int = 1, nbytes: int = 0):
+        """Context manager that records the time spent in its body to `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, count, nbytes)
+
+    def snapshot(self) -> dict[str, dict]:
+        """Totals so far, as `{stage: {"count": ..., "seconds": ..., "bytes": ...}}`."""
+        with self._lock:
+            return {
+                stage: {"count": c, "seconds": s, "bytes": b}
+                for stage, (c, s, b) in self._stages.items()
+            }
+
+    def merge(self, snapshot: dict[str, dict] | None):
+        """Add the totals of a `snapshot` (e.g. from a worker process)."""
+        for stage, totals in (snapshot or {}).items():
+            self.add(stage, totals["seconds"], totals["count"], totals["bytes"])
+
+    def reset(self):
+        """Clear all totals."""
+        with self._lock:
+            self._stages.clear()
+
+    def flush(self):
+        """Write the current totals to every sink."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+        self._write()
+
+    def _due(self) -> bool:
+        # whether `flush_interval` has passed, it then counts from now (holding the lock)
+        now = time.monotonic()
+        if now - self._last_flush <= self.flush_interval:
+            return False
+        self._last_flush = now
+        return True
+
+    def _write(self):
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.write(snapshot)
+
+
+class _NullMetrics(Metrics):
+    # records nothing, used while metrics are disabled
+
+    enabled = False
+
+    def add(self, stage, seconds=0.0, count=1, nbytes=0):
+        pass
+
+    def time(self, stage, count=1, nbytes=0):
+        return _NULL_CONTEXT
+
+    def flush(self):
+        pass
+
+
+_NULL_CONTEXT = nullcontext()
+_NULL = _NullMetrics()
+_metrics: Metrics = _NULL
+
+
+class JsonLinesSink:
+    """Append each flushed snapshot as one JSON line, with a timestamp and the pid."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, snapshot: dict[str, dict]):
+        line = {"time": time.time(), "pid": os.getpid(), "stages": snapshot}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+
+class PrometheusSink:
+    """Write the totals in the Prometheus text format, e.g. for node_exporter's textfile collector.
+
+    The file is replaced atomically on every flush, so a scrape never sees half of it.
+    """
+
+    METRICS = (
+        ("items", "count", "Number of items processed by each stage."),
+        ("seconds", "seconds", "Time spent in each stage."),
+        ("bytes", "bytes", "Bytes processed by each stage."),
+    )
+
+    def __init__(self, path: str | Path, prefix: str = "greybox_stage"):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+
+    def write(self, snapshot: dict[str, dict]):
+        lines = []
+        for name, key, text in PrometheusSink.METRICS:
+            metric = f"{self.prefix}_{name}_total"
+            lines += [f"# HELP {metric} {text}", f"# TYPE {metric} counter"]
+            for stage, totals in sorted(snapshot.items()):
+                lines.append(f'{metric}{{stage="{stage}"}} {totals[key]}')
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def make_sink(path: str | Path) -> JsonLinesSink | PrometheusSink:
+    """A `PrometheusSink` for `.prom` files, a `JsonLinesSink` otherwise."""
+    if Path(path).suffix == ".prom":
+        return PrometheusSink(path)
+    return JsonLinesSink(path)
+
+
+def get_metrics() -> Metrics:
+    """The current recorder, a no-op one unless `enable_metrics` was called."""
+    return _metrics
+
+
+def enable_metrics(*sinks, flush_interval: float | None = None) -> Metrics:
+    """Start recording metrics, see `Metrics`.
+
+    Returns:
+        Metrics: the new recorder (also returned by `get_metrics`).
+    """
+    global _metrics
+    _metrics = Metrics(*sinks, flush_interval=flush_interval)
+    return _metrics
+
+
+def disable_metrics() -> Metrics:
+    """Stop recording metrics, the previous recorder is flushed and returned."""
+    global _metrics
+    metrics, _metrics = _metrics, _NULL
+    metrics.flush()
+    return metrics
+
+
+@contextmanager
+def capture_metrics():
+    """Record into a fresh `Metrics` inside the block and yield it.
+
+    Meant for pool workers (processes), whose snapshot is sent back and merged by the
+    parent. The recorder is swapped globally, so do not use it from several threads.
+    """
+    global _metrics
+    previous, _metrics = _metrics, Metrics()
+    try:
+        yield _metrics
+    finally:
+        _metrics = previous
@@ -0,0 +1,145 @@
+"""Streaming multi-stage pipelines with bounded work in flight between stages."""
+
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, NamedTuple
+
+from ._concurrency import bounded_map
+from ._metrics import capture_metrics, get_metrics
+
+__all__ = ("Pipeline", "Stage")
+
+EXECUTORS = ("thread", "process", "inline")
+
+
+class Stage(NamedTuple):
+    """One step of a `Pipeline`.
+
+    Attributes:
+        fn (Callable): function applied to each item, must be picklable (defined at module level, or a `functools.partial` of one) for process stages.
+        name (str | None): name of the stage in `Pipeline.stats` and the metrics (see `greybox.utils.get_metrics`). Defaults to the name of `fn`.
+        workers (int): number of threads/processes, 0 runs the stage inline. Defaults to 1.
+        executor (str): "thread" for I/O (or GIL releasing) work, "process" for CPU heavy work or "inline" to run in the consuming thread. Defaults to "thread".
+        flatten (bool): whether `fn` returns an iterable of items for the next stage (e.g. the icons of an image), an empty one drops the item. Defaults to False.
+        max_in_flight (int | None): maximum number of items submitted to the stage but not yet consumed by the next one. Defaults to 4 * workers.
+    """
+
+    fn: Callable[[Any], Any]
+    name: str | None = None
+    workers: int = 1
+    executor: str = "thread"
+    flatten: bool = False
+    max_in_flight: int | None = None
+
+
+def _call(fn, item):
+    start = time.perf_counter()
+    value = fn(item)
+    return time.perf_counter() - start, value, None
+
+
+def _call_recorded(fn, item):
+    # runs in a worker process, its metrics are sent back to the parent
+    start = time.perf_counter()
+    with capture_metrics() as metrics:
+        value = fn(item)
+    return time.perf_counter() - start, value, metrics.snapshot()
+
+
+class Pipeline:
+    """Connects stages (e.g. discover → decode → extract → write) into one stream.
+
+    Each stage maps its function over the output of the previous one with
+    `bounded_map`, on its own thread or process pool. Every stage holds at most
+    `max_in_flight` items, so a slow stage applies backpressure to the ones before it
+    and memory stays flat however large the input is. The source is consumed lazily.
+
+    Example:
+        ```python
+        pipeline = Pipeline(
+            Stage(decode, workers=4),
+            Stage(extract, workers=os.cpu_count(), executor="process", flatten=True),
+            Stage(save, workers=4),
+        )
+        for path in pipeline.run(files):
+            ...
+        ```
+    """
+
+    def __init__(self, *stages: Stage, ordered: bool = True):
+        """Constructor.
+
+        Args:
+            stages (Stage): the stages, in order.
+            ordered (bool, optional): whether items leave each stage in the order they entered it, otherwise in order of completion (which keeps workers busy when item costs vary). Defaults to True.
+        """
+        for stage in stages:
+            if stage.executor not in EXECUTORS:
+                raise ValueError(
+                    f"Unknown executor: {stage.executor}, expected one of {EXECUTORS}"
+                )
+        self.stages = [
+            stage._replace(name=stage.name or getattr(stage.fn, "__name__", "stage"))
+            for stage in stages
+        ]
+        self.ordered = ordered
+        self.stats = Counter({stage.name: 0 for stage in self.stages})
+
+    @staticmethod
+    def _executor(stage: Stage) -> Executor | None:
+        if stage.executor == "inline" or stage.workers <= 0:
+            return None
+        if stage.executor == "process":
+            return ProcessPoolExecutor(max_workers=stage.workers)
+        return ThreadPoolExecutor(max_workers=stage.workers)
+
+    def _run_stage(
+        self, stage: Stage, items: Iterable, executor: Executor | None
+    ) -> Iterator:
+        metrics = get_metrics()
+        record = metrics.enabled and isinstance(executor, ProcessPoolExecutor)
+        call = partial(_call_recorded if record else _call, stage.fn)
+        results = bounded_map(
+            call,
+            items,
+            executor=executor,
+            max_in_flight=stage.max_in_flight,
+            ordered=self.ordered,
+        )
+        for seconds, value, snapshot in results:
+            self.stats[stage.name] += 1
+            metrics.add(stage.name, seconds)
+            metrics.merge(snapshot)
+            if stage.flatten:
+                yield from value
+            else:
+                yield value
+
+    def run(self, source: Iterable) -> Iterator:
+        """Stream the items of `source` through all stages.
+
+        Args:
+            source (Iterable): input items of the first stage.
+
+        Yields:
+            Any: the output items of the last stage. Exceptions raised by a stage are re-raised here, after which the pools are shut down.
+        """
+        executors, generators = [], []
+        try:
+            items = source
+            for stage in self.stages:
+                executor = self._executor(stage)
+                if executor is not None:
+                    executors.append(executor)
+                items = self._run_stage(stage, items, executor)
+                generators.append(items)
+            yield from items
+        finally:
+            # last stage first, so that no stage pulls from one that was closed
+            for generator in reversed(generators):
+                generator.close()
+            for executor in executors:
+                executor.shutdown(cancel_futures=True)
@@ -0,0 +1,327 @@
+"""Pack many small images into a few large shard files that can be read back at random."""
+
+import io
+import json
+import os
+import tarfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+__all__ = ("ShardReader", "ShardWriter")
+
+# one record per item in the `.idx.npy` file that sits next to each shard
+INDEX_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),  # byte offset of the item data in the shard file
+        ("nbytes", "<u8"),  # size of the item data
+        ("height", "<u4"),
+        ("width", "<u4"),
+        ("channels", "<u4"),
+    ]
+)
+FORMATS = {"tar": ".tar", "array": ".bin"}
+# image formats of tar shards that keep the pixels and channels of every image, with the
+# save params they need for that
+IMAGE_FORMATS = {"png": {}, "webp": {"lossless": True}}
+# PIL mode of the images of each channel count, decoded images are converted back to it
+# (e.g. WebP stores fully opaque RGBA images as RGB)
+MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+
+def _as_array(image: Image.Image | np.ndarray) -> np.ndarray:
+    image = np.asarray(image)
+    if image.dtype != np.uint8:
+        raise ValueError(f"Images must be uint8, got dtype: {image.dtype}")
+    if image.ndim == 2:
+        image = image[..., None]
+    if image.ndim != 3:
+        raise ValueError(f"Images must be HW or HWC, got shape: {image.shape}")
+    return image
+
+
+class ShardWriter:
+    """Stream images into fixed-size shards instead of writing one file per image.
+
+    Each shard is either a WebDataset-style tar file (`{key}.png` + `{key}.json` members)
+    or a raw `.bin` file of concatenated uint8 HWC pixels (which can be memory mapped).
+    Next to each shard, an `.idx.npy` file holds the byte offset, size and shape of every
+    item (see `INDEX_DTYPE`) and a `.jsonl` file holds its metadata, so that any item can
+    be fetched with a single seek (see `ShardReader`). Shards are written to a temporary
+    file and only renamed into place once complete, so a crash never leaves a partial
+    shard behind. Writing to a directory that already has shards appends new shards.
+
+    Example:
+        ```python
+        with ShardWriter("dataset/icons", max_items=10000) as writer:
+            for path in files:
+                image = Image.open(path)
+                for box in find_icon_boxes(image).boxes:
+                    x, y, w, h = box
+                    writer.write(image[y : y + h, x : x + w], source=path, bbox=box)
+        ```
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        format: str = "tar",
+        max_items: int = 10000,
+        max_bytes: int = 1 << 30,
+        prefix: str = "shard",
+        image_format: str = "png",
+        image_params: dict | None = None,
+    ):
+        """Create a shard writer.
+
+        Args:
+            directory (str | Path): directory to write the shards to.
+            format (str, optional): "tar" to store encoded images in tar files or "array" to store raw pixels in `.bin` files. Defaults to "tar".
+            max_items (int, optional): maximum number of items per shard. Defaults to 10000.
+            max_bytes (int, optional): maximum (approximate) size of a shard in bytes. Defaults to 1 GiB.
+            prefix (str, optional): shards are named `{prefix}-{number:06d}`. Defaults to "shard".
+            image_format (str, optional): format used to encode images in tar shards, "png" or "webp" (always lossless). Defaults to "png".
+            image_params (dict | None, optional): params passed to `Image.save` when encoding images, e.g. `EncodeProfile.params`. Defaults to None.
+        """
+        if format not in FORMATS:
+            raise ValueError(
+                f"Unknown format: {format}, expected one of {list(FORMATS)}"
+            )
+        if image_format.lower() not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unsupported image format: {image_format}, expected one of "
+                f"{list(IMAGE_FORMATS)} (lossy formats do not round-trip)"
+            )
+        self.directory = Path(directory).expanduser().resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.image_format = image_format.lower()
+        self.image_params = {
+            **(image_params or {}),
+            **IMAGE_FORMATS[self.image_format],
+        }
+        # continue after the shards (and keys) of a previous run
+        existing = sorted(self.directory.glob(f"{prefix}-*.idx.npy"))
+        self._shard = len(existing)
+        self._key = sum(len(np.load(p, mmap_mode="r")) for p in existing)
+        self._file = None
+        self._tar = None
+        self._index: list[tuple] = []
+        self._meta: list[str] = []
+        self._nbytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _shard_path(self, suffix: str) -> Path:
+        return self.directory / f"{self.prefix}-{self._shard:06d}{suffix}"
+
+    def _open(self):
+        path = self._shard_path(FORMATS[self.format] + ".tmp")
+        self._file = open(path, "wb")
+        if self.format == "tar":
+            self._tar = tarfile.open(
+                fileobj=self._file, mode="w", format=tarfile.USTAR_FORMAT
+            )
+
+    def write(
+        self,
+        image: Image.Image | np.ndarray,
+        source: str | Path | None = None,
+        bbox=None,
+        **meta,
+    ) -> str:
+        """Add an image to the current shard, starting a new shard if it is full.
+
+        Args:
+            image (Image.Image | np.ndarray): uint8 HW or HWC image.
+            source (str | Path | None, optional): file the image came from. Defaults to None.
+            bbox (Iterable[int] | None, optional): (x, y, w, h) box of the image in `source`. Defaults to None.
+            meta: any other JSON serialisable metadata to store with the image.
+
+        Returns:
+            str: the key of the image, unique across all shards in the directory.
+        """
+        if self._file is None:
+            self._open()
+        image = _as_array(image)
+        key = f"{self._key:09d}"
+        meta = {"key": key, **meta}
+        if source is not None:
+            meta["source"] = Path(source).as_posix()
+        if bbox is not None:
+            meta["bbox"] = [int(v) for v in bbox]
+        meta = json.dumps(meta)
+
+        if self.format == "tar":
+            if image.shape[-1] not in MODES:
+                raise ValueError(
+                    f"Images of tar shards must have 1 to 4 channels, got shape: {image.shape}"
+                )
+            buffer = io.BytesIO()
+            Image.fromarray(image[..., 0] if image.shape[-1] == 1 else image).save(
+                buffer, self.image_format, **self.image_params
+            )
+            data = buffer.getbuffer()
+            self._add_member(f"{key}.{self.image_format}", data)
+            # tar pads members to 512 byte blocks, the data ends where the padding starts
+            offset = self._tar.offset - -(-len(data) // 512) * 512
+            self._add_member(f"{key}.json", meta.encode())
+        else:
+            data = image.tobytes()
+            offset = self._file.tell()
+            self._file.write(data)
+        h, w, c = image.shape
+        self._index.append((offset, len(data), h, w, c))
+        self._meta.append(meta)
+        self._nbytes += len(data)
+        self._key += 1
+
+        if len(self._index) >= self.max_items or self._nbytes >= self.max_bytes:
+            self._finish()
+        return key
+
+    def _add_member(self, name: str, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def _finish(self):
+        # close the current shard and move it (and its index) into place
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        self._file.close()
+        self._file = None
+        index_tmp = self._shard_path(".idx.tmp.npy")
+        meta_tmp = self._shard_path(".jsonl.tmp")
+        np.save(index_tmp, np.array(self._index, dtype=INDEX_DTYPE))
+        with open(meta_tmp, "w") as f:
+            f.writelines(m + "\n" for m in self._meta)
+        # the index is renamed last, a shard without an index is ignored by the reader
+        suffix = FORMATS[self.format]
+        os.replace(self._shard_path(suffix + ".tmp"), self._shard_path(suffix))
+        os.replace(meta_tmp, self._shard_path(".jsonl"))
+        os.replace(index_tmp, self._shard_path(".idx.npy"))
+        self._shard += 1
+        self._index, self._meta, self._nbytes = [], [], 0
+
+    def close(self):
+        """Finish the current shard."""
+        if self._file is not None:
+            self._finish()
+
+
+class ShardReader:
+    """Random access to the images written by `ShardWriter`.
+
+    Only the (small) `.idx.npy` index files are read when the reader is created, each
+    item is then fetched with a single seek into its shard: tar members are decoded from
+    their byte range and `.bin` shards are memory mapped, so `reader[i]` is a zero-copy
+    view. Metadata is loaded lazily on the first call to `meta`.
+
+    Example:
+        ```python
+        reader = ShardReader("dataset/icons")
+        icon = reader[12345]  # (H, W, C) uint8
+        reader.meta(12345)  # {"key": "000012345", "source": ..., "bbox": [x, y, w, h]}
+        ```
+    """
+
+    def __init__(self, path: str | Path, prefix: str = "shard"):
+        """Open a single shard or all shards in a directory.
+
+        Args:
+            path (str | Path): path of a shard (or its index), or a directory of shards.
+            prefix (str, optional): prefix of the shards to open when `path` is a directory. Defaults to "shard".
+        """
+        path = Path(path).expanduser().resolve()
+        if path.is_dir():
+            indices = sorted(path.glob(f"{prefix}-*.idx.npy"))
+        else:
+            stem = path.name.removesuffix(".idx.npy")
+            for suffix in FORMATS.values():
+                stem = stem.removesuffix(suffix)
+            indices = [path.parent / (stem + ".idx.npy")]
+        self.shards: list[Path] = []
+        self._indices = []
+        for index_path in indices:
+            stem = index_path.name[: -len(".idx.npy")]
+            shard = next(
+                (
+                    index_path.parent / (stem + s)
+                    for s in FORMATS.values()
+                    if (index_path.parent / (stem + s)).exists()
+                ),
+                None,
+            )
+            if shard is None:
+                raise FileNotFoundError(f"Missing shard for index: {index_path}")
+            self.shards.append(shard)
+            self._indices.append(np.load(index_path))
+        # global item i lives in shard `searchsorted(ends, i, "right")`
+        self._ends = np.cumsum([len(i) for i in self._indices], dtype=np.int64)
+        self._files: dict[int, object] = {}
+        self._meta: list[list[str] | None] = [None] * len(self.shards)
+
+    def __len__(self):
+        return int(self._ends[-1]) if len(self._ends) else 0
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _locate(self, i: int) -> tuple[int, int]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} out of range for {len(self)} items")
+        shard = int(np.searchsorted(self._ends, i, side="right"))
+        start = int(self._ends[shard - 1]) if shard else 0
+        return shard, i - start
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        shard, j = self._locate(i)
+        offset, nbytes, h, w, c = self._indices[shard][j].tolist()
+        if self.shards[shard].suffix == FORMATS["array"]:
+            if shard not in self._files:
+                self._files[shard] = np.memmap(
+                    self.shards[shard], dtype=np.uint8, mode="r"
+                )
+            return self._files[shard][offset : offset + nbytes].reshape(h, w, c)
+        if shard not in self._files:
+            self._files[shard] = open(self.shards[shard], "rb")
+        f = self._files[shard]
+        f.seek(offset)
+        with Image.open(io.BytesIO(f.read(nbytes))) as image:
+            if image.mode != MODES[c]:
+                image = image.convert(MODES[c])
+            return np.asarray(image).reshape(h, w, c)
+
+    def meta(self, i: int) -> dict:
+        """Metadata stored with item `i` (its key and, if given, source and bbox)."""
+        shard, j = self._locate(i)
+        if self._meta[shard] is None:
+            with open(self.shards[shard].with_suffix(".jsonl")) as f:
+                self._meta[shard] = f.read().splitlines()
+        return json.loads(self._meta[shard][j])
+
+    def close(self):
+        """Close any open shard files."""
+        for f in self._files.values():
+            if hasattr(f, "close"):
+                f.close()
+        self._files.clear()
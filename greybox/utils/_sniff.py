@@ -0,0 +1,312 @@
+"""Detect the type of a file from its first bytes rather than its name or headers."""
+
+import itertools
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePath
+
+from ._concurrency import bounded_map
+
+__all__ = (
+    "sniff",
+    "sniff_file",
+    "suffix_of",
+    "FileClassifier",
+    "CATEGORIES",
+    "SNIFF_SIZE",
+)
+
+SNIFF_SIZE = 512  # number of leading bytes `sniff` needs to see (a tar header)
+
+# (offset, magic bytes, extension), checked in order
+MAGIC = (
+    (0, b"\x89PNG\r\n\x1a\n", ".png"),
+    (0, b"\xff\xd8\xff", ".jpeg"),
+    (0, b"GIF87a", ".gif"),
+    (0, b"GIF89a", ".gif"),
+    (8, b"WEBP", ".webp"),  # after b"RIFF" + size
+    (0, b"BM", ".bmp"),
+    (0, b"\x00\x00\x01\x00", ".ico"),
+    (0, b"II*\x00", ".tiff"),
+    (0, b"MM\x00*", ".tiff"),
+    (4, b"ftypavif", ".avif"),
+    (4, b"ftypheic", ".heic"),
+    (4, b"ftypmif1", ".heic"),
+    (0, b"8BPS", ".psd"),
+    # video, any other ISO media file (after the images above) is taken as mp4
+    (4, b"ftypqt", ".mov"),
+    (4, b"ftyp", ".mp4"),
+    (8, b"AVI ", ".avi"),
+    (0, b"\x1a\x45\xdf\xa3", ".webm"),  # also mkv
+    # fonts
+    (0, b"OTTO", ".otf"),
+    (0, b"\x00\x01\x00\x00", ".ttf"),
+    (0, b"true", ".ttf"),
+    (0, b"ttcf", ".ttc"),
+    (0, b"wOFF", ".woff"),
+    (0, b"wOF2", ".woff2"),
+    # archives (compressed tars are recognised by their compression)
+    (0, b"PK\x03\x04", ".zip"),
+    (0, b"PK\x05\x06", ".zip"),  # empty
+    (0, b"Rar!\x1a\x07", ".rar"),
+    (0, b"7z\xbc\xaf\x27\x1c", ".7z"),
+    (0, b"\x1f\x8b", ".gz"),
+    (0, b"BZh", ".bz2"),
+    (0, b"\xfd7zXZ\x00", ".xz"),
+    (257, b"ustar", ".tar"),
+)
+
+# extension -> category, for the extensions `sniff_file` returns
+CATEGORIES = {
+    ext: category
+    for category, exts in {
+        "image": (
+            ".png",
+            ".jpeg",
+            ".gif",
+            ".webp",
+            ".bmp",
+            ".ico",
+            ".tiff",
+            ".avif",
+            ".heic",
+            ".svg",
+            ".psd",
+        ),
+        "video": (".mp4", ".mov", ".avi", ".webm", ".mkv"),
+        "font": (".otf", ".ttf", ".ttc", ".woff", ".woff2"),
+        "archive": (
+            ".zip",
+            ".rar",
+            ".7z",
+            ".tar",
+            ".gz",
+            ".bz2",
+            ".xz",
+            ".tar.gz",
+            ".tar.bz2",
+            ".tar.xz",
+        ),
+    }.items()
+    for ext in exts
+}
+
+# names that are used for the same type, e.g. "a.JPG" -> ".jpeg"
+ALIASES = {
+    ".jpg": ".jpeg",
+    ".jpe": ".jpeg",
+    ".tif": ".tiff",
+    ".tgz": ".tar.gz",
+    ".tbz2": ".tar.bz2",
+    ".txz": ".tar.xz",
+    ".m4v": ".mp4",
+    ".qt": ".mov",
+}
+
+# content types that are trusted when the bytes are not recognised
+CONTENT_TYPES = {
+    "image/png": ".png",
+    "image/jpeg": ".jpeg",
+    "image/jpg": ".jpeg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/bmp": ".bmp",
+    "image/x-icon": ".ico",
+    "image/vnd.microsoft.icon": ".ico",
+    "image/tiff": ".tiff",
+    "image/avif": ".avif",
+    "image/heic": ".heic",
+    "image/svg+xml": ".svg",
+}
+
+
+def sniff(header: bytes, content_type: str | None = None) -> str | None:
+    """Guess the file extension of some data from its magic bytes.
+
+    Args:
+        header (bytes): the first bytes of the data (at least `SNIFF_SIZE` if available).
+        content_type (str | None, optional): the declared content type (e.g. the `Content-Type` header of a response), used only if the bytes are not recognised. Defaults to None.
+
+    Returns:
+        str | None: extension including the dot (e.g. ".png"), or None if the type is unknown.
+    """
+    for offset, magic, ext in MAGIC:
+        if header[offset : offset + len(magic)] == magic:
+            return ext
+    text = header[:SNIFF_SIZE].lstrip().lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in header):
+        return ".svg"
+    if content_type:
+        return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+    return None
+
+
+def suffix_of(name: str | PurePath) -> str:
+    """Lower-cased suffix of a file name, including ".tar.*" double suffixes and aliases.
+
+    Example:
+        ```python
+        suffix_of("Pack.TAR.GZ")  # ".tar.gz"
+        suffix_of("icon.JPG")  # ".jpeg"
+        ```
+    """
+    name = os.path.basename(name).lower()
+    stem, suffix = os.path.splitext(name)
+    if stem.endswith(".tar") and suffix in (".gz", ".bz2", ".xz"):
+        suffix = ".tar" + suffix
+    return ALIASES.get(suffix, suffix)
+
+
+def sniff_file(path: str | Path, header: bytes | None = None) -> str | None:
+    """Guess the extension of a file from its first bytes, or else its name.
+
+    Args:
+        path (str | Path): the file.
+        header (bytes | None, optional): its first `SNIFF_SIZE` bytes, if they were already read. Defaults to None.
+
+    Returns:
+        str | None: extension including the dot (e.g. ".png"), the suffix of the name if the bytes are not recognised (and it has a known category) or None. Empty files are None.
+    """
+    if header is None:
+        try:
+            with open(path, "rb") as f:
+                header = f.read(SNIFF_SIZE)
+        except OSError:
+            return None
+    if not header:
+        return None
+    ext = sniff(header)
+    if ext in (".gz", ".bz2", ".xz"):
+        # compressed tars are named for what they are, the bytes only tell the compression
+        suffix = suffix_of(path)
+        return suffix if suffix == ".tar" + ext else ext
+    if ext is None:
+        suffix = suffix_of(path)
+        return suffix if suffix in CATEGORIES else None
+    return ext
+
+
+class FileClassifier:
+    """Classifies files as "image", "video", "font" or "archive" from their first bytes.
+
+    Only `SNIFF_SIZE` bytes of each file are read, so files are found whatever their
+    name (e.g. "ICON.PNG", "pack.tar.gz" or extensionless downloads). With `workers`
+    the reads of a batch of files run in a thread pool, which hides the latency of
+    network-mounted file systems. With `cache`, the results are stored in SQLite by
+    device, inode, size and mtime, so files that did not change are not read again by
+    later scans.
+
+    Example:
+        ```python
+        classifier = FileClassifier(workers=8, cache="~/.cache/greybox/sniff.sqlite")
+        for path, ext in classifier.classify_all(scan_files("downloads")):
+            if classifier.category(ext) == "image":
+                ...
+        ```
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        cache: str | Path | None = None,
+        batch_size: int = 64,
+    ):
+        """Constructor.
+
+        Args:
+            workers (int, optional): number of threads reading files, 0 or 1 reads serially. Defaults to 0.
+            cache (str | Path | None, optional): path of the SQLite cache (":memory:" for this process only). Defaults to None (no cache).
+            batch_size (int, optional): number of files read by each task of `classify_all`. Defaults to 64.
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self._conn = None
+        self._lock = threading.Lock()
+        if cache is not None:
+            if cache != ":memory:":
+                cache = Path(cache).expanduser().resolve()
+                cache.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(cache, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sniffed (dev INTEGER, ino INTEGER, "
+                    "size INTEGER, mtime INTEGER, ext TEXT, PRIMARY KEY (dev, ino))"
+                )
+
+    @staticmethod
+    def category(ext: str | None) -> str | None:
+        """Category ("image", "video", "font" or "archive") of an extension, or None."""
+        return CATEGORIES.get(ext)
+
+    def classify(self, path: str | Path) -> str | None:
+        """Sniffed extension of a file (see `sniff_file`), from the cache if it is unchanged."""
+        return self._classify_batch([path])[0][1]
+
+    def classify_all(self, paths: Iterable[str | Path]) -> Iterator[tuple]:
+        """Lazily classify files, reading them in batches (concurrently with `workers`).
+
+        Args:
+            paths (Iterable[str | Path]): the files, e.g. from `scan_files`.
+
+        Yields:
+            tuple[str | Path, str | None]: each path (in order) and its sniffed extension.
+        """
+        batches = _batched(paths, self.batch_size)
+        if self.workers <= 1:
+            for batch in batches:
+                yield from self._classify_batch(batch)
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = bounded_map(self._classify_batch, batches, executor=executor)
+            try:
+                for batch in results:
+                    yield from batch
+            finally:
+                results.close()
+                executor.shutdown(cancel_futures=True)
+
+    def _classify_batch(self, paths: list) -> list[tuple]:
+        if self._conn is None:
+            return [(path, sniff_file(path)) for path in paths]
+        out, new = [], []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                out.append((path, None))
+                continue
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT size, mtime, ext FROM sniffed WHERE dev = ? AND ino = ?",
+                    (st.st_dev, st.st_ino),
+                ).fetchone()
+            if row is not None and row[:2] == (st.st_size, st.st_mtime_ns):
+                out.append((path, row[2]))
+                continue
+            ext = sniff_file(path)
+            new.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, ext))
+            out.append((path, ext))
+        if new:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sniffed VALUES (?, ?, ?, ?, ?)", new
+                )
+        return out
+
+    def close(self):
+        """Close the cache."""
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+
+def _batched(iterable: Iterable, n: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, n)):
+        yield batch
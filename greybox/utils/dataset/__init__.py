@@ -1,3 +1,12 @@
-"""Dataset utilities. """
+"""Dataset utilities."""
 
-from . import kaggle
+import importlib
+
+__all__ = ("kaggle",)
+
+
+def __getattr__(name: str):
+    # the kaggle api is slow to import (and needs credentials), load it on first use
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
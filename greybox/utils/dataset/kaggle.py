@@ -1,5 +1,4 @@
 from pathlib import Path
-from kaggle.api.kaggle_api_extended import KaggleApi
 import os
 
 
@@ -30,6 +29,16 @@ def download_dataset(
     if token:
         os.environ["KAGGLE_KEY"] = token
 
+    try:
+        # imported here (after the credentials are set), the kaggle package
+        # authenticates as soon as it is imported
+        from kaggle.api.kaggle_api_extended import KaggleApi
+    except ImportError as e:
+        raise ImportError(
+            "Downloading kaggle datasets requires the kaggle package, install it with "
+            "`pip install greybox[kaggle]`."
+        ) from e
+
     api = KaggleApi()
     api.authenticate()
 
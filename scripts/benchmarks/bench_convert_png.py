@@ -0,0 +1,51 @@
+"""Throughput comparison of serial vs. process-pool PNG conversion.
+
+Generates a synthetic directory of JPEG/BMP/WEBP images and converts it with
+`greybox.cli.aspng.convert_images_to_png` for each requested worker count.
+
+Usage:
+    python scripts/benchmarks/bench_convert_png.py --files 400 --workers 0 2 4 8
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# so that greybox can be imported without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fixtures import mixed_format_folder  # noqa: E402
+from greybox.cli.aspng import convert_images_to_png  # noqa: E402
+
+FORMATS = ("jpeg", "bmp", "webp")
+
+
+def main():
+    """Convert the synthetic corpus once per worker count and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        mixed_format_folder(tmp / "input", args.files, args.size, FORMATS)
+        baseline = None
+        print(f"{'workers':>8} {'seconds':>8} {'files/s':>8} {'speedup':>8}")
+        for workers in args.workers:
+            out = tmp / f"output-{workers}"
+            start = time.perf_counter()
+            convert_images_to_png(tmp / "input", out, workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"{workers:>8} {elapsed:>8.2f} {args.files / elapsed:>8.1f} "
+                f"{baseline / elapsed:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
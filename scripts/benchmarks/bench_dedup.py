@@ -0,0 +1,99 @@
+"""Near-duplicate lookups in a `DedupIndex` vs. a linear scan, as the index grows.
+
+Fills an index with `--sizes` random 64 bit hashes (in steps, so each size reuses the
+previous one) and times `--queries` lookups within `--max-distance` bits, half of them
+near duplicates of stored hashes. The linear scan is a vectorized hamming distance to
+every stored hash, i.e. what a lookup costs without an index.
+
+Usage:
+    python scripts/benchmarks/bench_dedup.py --sizes 10000 100000 1000000
+    python scripts/benchmarks/bench_dedup.py --chunks 2 3 4 5 --sizes 1000000
+    python scripts/benchmarks/bench_dedup.py --max-distance 8 --path /tmp/index.sqlite
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# so that greybox can be imported without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from greybox.utils import DedupIndex, hamming  # noqa: E402
+
+
+def random_hashes(rng: np.random.Generator, n: int) -> np.ndarray:
+    """`n` uniformly random 64 bit hashes."""
+    return rng.integers(0, 2**64, size=n, dtype=np.uint64)
+
+
+def flip_bits(rng: np.random.Generator, hashes: np.ndarray, bits: int) -> np.ndarray:
+    """Copy of `hashes` with `bits` random bits of each hash flipped."""
+    out = hashes.copy()
+    for i in range(len(out)):
+        for b in rng.choice(64, size=bits, replace=False):
+            out[i] ^= np.uint64(1) << np.uint64(b)
+    return out
+
+
+def main():
+    """Run the benchmark for each `--chunks` and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-distance", type=int, default=4)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[3])
+    parser.add_argument(
+        "--path", type=str, default=":memory:", help="Removed before each run."
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'chunks':>6} {'size':>10} {'insert/s':>10} {'index ms/query':>15} "
+        f"{'scan ms/query':>14} {'speedup':>8} {'matches':>8}"
+    )
+    for chunks in args.chunks:
+        run(args, chunks)
+
+
+def run(args, chunks: int):
+    """Grow an index with `chunks` hash chunks through `--sizes`, timing each size."""
+    rng = np.random.default_rng(0)
+    stored = np.empty(0, np.uint64)
+    if args.path != ":memory:":
+        for suffix in ("", "-wal", "-shm"):
+            Path(args.path + suffix).unlink(missing_ok=True)
+    with DedupIndex(args.path, args.max_distance, chunks=chunks) as index:
+        for size in sorted(args.sizes):
+            new = random_hashes(rng, size - len(stored))
+            start = time.perf_counter()
+            index.add(new)
+            inserted = len(new) / (time.perf_counter() - start)
+            stored = np.concatenate([stored, new])
+
+            half = args.queries // 2
+            near = flip_bits(rng, rng.choice(stored, half), min(args.max_distance, 64))
+            queries = np.concatenate([near, random_hashes(rng, args.queries - half)])
+
+            start = time.perf_counter()
+            found = sum(len(index.query(h)) for h in queries)
+            indexed = (time.perf_counter() - start) / len(queries)
+
+            start = time.perf_counter()
+            scanned = sum(
+                int((hamming(stored, h) <= args.max_distance).sum()) for h in queries
+            )
+            scan = (time.perf_counter() - start) / len(queries)
+            assert found == scanned, (found, scanned)
+            print(
+                f"{chunks:>6} {size:>10} {inserted:>10.0f} {indexed * 1e3:>15.3f} "
+                f"{scan * 1e3:>14.3f} {scan / indexed:>7.1f}x {found:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Throughput and output size of the encode profiles, and of JPEG draft-mode decoding.
+
+Converts a corpus with every profile in `greybox.utils.ENCODE_PROFILES` (serially, so
+the numbers are per core) and reports files/s, input MB/s and the total output size
+relative to the default profile. Then compares decoding + downscaling JPEGs with and
+without draft mode.
+
+The synthetic corpus mixes noisy photos (JPEG/BMP) with sprite sheets (flat colours
+and transparency, PNG), pass `--input` to use a real one instead.
+
+Usage:
+    python scripts/benchmarks/bench_encode.py --files 60
+    python scripts/benchmarks/bench_encode.py --input ~/data/raw --max-size 256
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+# so that greybox can be imported without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fixtures import mixed_format_folder, sprite_sheet  # noqa: E402
+from greybox.utils._encode import ENCODE_PROFILES, open_image, save_image  # noqa: E402
+
+
+def make_corpus(path: Path, files: int, size: int) -> list[Path]:
+    """Write `files` photos and sprite sheets to `path`."""
+    paths = mixed_format_folder(path, files - files // 3, size, ("jpeg", "bmp"))
+    for i in range(files // 3):
+        sheet = path / f"sheet-{i}.png"
+        Image.fromarray(sprite_sheet(size // 8, seed=i)).save(sheet)
+        paths.append(sheet)
+    return paths
+
+
+def convert(files: list[Path], out: Path, profile: str) -> tuple[float, int]:
+    """Convert `files` into `out` with `profile`, returns the seconds and output bytes."""
+    out.mkdir()
+    suffix = ENCODE_PROFILES[profile].suffix
+    start = time.perf_counter()
+    for i, file in enumerate(files):
+        with open_image(file) as img:
+            save_image(img, out / f"{i}{suffix}", profile)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(f.stat().st_size for f in out.iterdir())
+
+
+def downscale(files: list[Path], max_size: int, draft: bool) -> float:
+    """Seconds to decode and downscale `files`, with or without draft mode."""
+    start = time.perf_counter()
+    for file in files:
+        if draft:
+            open_image(file, max_size).close()
+        else:
+            with Image.open(file) as img:
+                # reducing_gap=None also stops thumbnail from using draft itself
+                img.thumbnail((max_size, max_size), reducing_gap=None)
+    return time.perf_counter() - start
+
+
+def main():
+    """Time every encode profile and draft decoding, and print tables."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", type=Path, default=None, help="Corpus directory.")
+    parser.add_argument("--files", type=int, default=60)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--max-size", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.input is None:
+            files = make_corpus(tmp / "input", args.files, args.size)
+        else:
+            files = sorted(
+                p for p in args.input.expanduser().rglob("*.*") if p.is_file()
+            )
+        nbytes = sum(f.stat().st_size for f in files)
+        print(f"{len(files)} files, {nbytes / 2**20:.1f} MB")
+        print(
+            f"{'profile':<10} {'seconds':>8} {'files/s':>8} {'MB/s':>7} "
+            f"{'output MB':>10} {'vs. default':>12}"
+        )
+        baseline = None
+        for profile in ENCODE_PROFILES:
+            elapsed, size = convert(files, tmp / profile, profile)
+            baseline = baseline or size
+            print(
+                f"{profile:<10} {elapsed:>8.2f} {len(files) / elapsed:>8.1f} "
+                f"{nbytes / 2**20 / elapsed:>7.1f} {size / 2**20:>10.1f} "
+                f"{size / baseline:>11.2f}x"
+            )
+
+        jpegs = [f for f in files if f.suffix.lower() in (".jpg", ".jpeg")]
+        if jpegs:
+            print(f"\ndecode + downscale {len(jpegs)} JPEGs to {args.max_size}px")
+            full = downscale(jpegs, args.max_size, draft=False)
+            draft = downscale(jpegs, args.max_size, draft=True)
+            print(f"{'full decode':<12} {len(jpegs) / full:>8.1f} files/s")
+            print(
+                f"{'draft mode':<12} {len(jpegs) / draft:>8.1f} files/s "
+                f"({full / draft:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark of `combine_close_bounding_rects` from 100 to 100k rectangles.
+
+Compares the sort-and-sweep/union-find merge engine against the original greedy
+O(n^2) implementation (only run up to `--reference-max` rectangles).
+
+Usage:
+    python scripts/benchmarks/bench_merge_rects.py --sizes 100 1000 10000 100000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# so that greybox can be imported without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fixtures import rects as make_rects  # noqa: E402
+from greybox.utils import combine_close_bounding_rects  # noqa: E402
+
+
+def reference_combine_close_bounding_rects(bounding_rects, threshold):
+    """The original greedy merge, consumes `bounding_rects`."""
+    # the original implementation
+    combined = []
+
+    def are_close(rect1, rect2, threshold):
+        x1, y1, w1, h1 = rect1
+        x2, y2, w2, h2 = rect2
+        return abs(x1 - x2) <= threshold and abs(y1 - y2) <= threshold
+
+    while bounding_rects:
+        rect = bounding_rects.pop(0)
+        combined_rects = [rect]
+        for other_rect in bounding_rects[:]:
+            if any(are_close(rect, other_rect, threshold) for rect in combined_rects):
+                combined_rects.append(other_rect)
+                bounding_rects.remove(other_rect)
+        x_min = min(r[0] for r in combined_rects)
+        y_min = min(r[1] for r in combined_rects)
+        x_max = max(r[0] + r[2] for r in combined_rects)
+        y_max = max(r[1] + r[3] for r in combined_rects)
+        combined.append((x_min, y_min, x_max - x_min, y_max - y_min))
+    return combined
+
+
+def timeit(fn, repeat: int = 3):
+    """Best of `repeat` runs of `fn` in seconds, and its result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    """Time both metrics (and the reference) for each size and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000]
+    )
+    parser.add_argument("--threshold", type=int, default=10)
+    parser.add_argument("--reference-max", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(
+        f"{'rects':>8} {'corner (s)':>11} {'gap (s)':>9} {'reference (s)':>14} "
+        f"{'merged':>8}"
+    )
+    for n in args.sizes:
+        rects = make_rects(n)
+        t = args.threshold
+        corner, merged = timeit(lambda: combine_close_bounding_rects(rects, t))
+        gap, _ = timeit(lambda: combine_close_bounding_rects(rects, t, metric="gap"))
+        reference = "-"
+        if n <= args.reference_max:
+            reference, _ = timeit(
+                lambda: reference_combine_close_bounding_rects(rects.tolist(), t),
+                repeat=1,
+            )
+            reference = f"{reference:.4f}"
+        print(f"{n:>8} {corner:>11.4f} {gap:>9.4f} {reference:>14} {len(merged):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark of resuming a scrape: rereading metadata csv files vs. `MetadataStore`.
+
+Writes `--records` synthetic app records (with long descriptions) both as csv chunks of
+100 rows (as the scraper used to) and to a `MetadataStore`, then times how long it takes
+to recover the set of already scraped app ids, and to read only the media columns.
+
+Usage:
+    python scripts/benchmarks/bench_metadata_store.py --records 100000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# so that greybox can be imported without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from greybox.scrape import MetadataStore  # noqa: E402
+
+
+def make_records(n: int, description: int):
+    """Yield `n` synthetic app records with descriptions of about `description` chars."""
+    text = "lorem ipsum " * (description // 12)
+    for i in range(n):
+        yield {
+            "appid": f"com.example.game{i}",
+            "title": f"Game {i}",
+            "icon": f"https://play-lh.example.com/icon/{i}",
+            "headerimage": f"https://play-lh.example.com/header/{i}",
+            "description": text,
+        }
+
+
+def timeit(fn):
+    """Seconds to run `fn`, and its result."""
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    """Write the records both ways, time reading them back and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--description", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        records = list(make_records(args.records, args.description))
+        for i in range(0, len(records), 100):
+            pd.DataFrame(records[i : i + 100]).to_csv(tmp / f"game-data-{i}.csv")
+        store = MetadataStore(tmp / "metadata.sqlite")
+        for i in range(0, len(records), 10000):
+            store.write(records[i : i + 10000])
+
+        def csv_ids():
+            ids = []
+            for path in tmp.glob("*.csv"):
+                ids.extend(pd.read_csv(open(path))["appid"].tolist())
+            return set(ids)
+
+        cases = {
+            "csv rescan (existing ids)": csv_ids,
+            "store.existing_ids()": store.existing_ids,
+            "csv rescan (media columns)": lambda: pd.concat(
+                pd.read_csv(p, usecols=["appid", "icon"]) for p in tmp.glob("*.csv")
+            ),
+            "store.read(media columns)": lambda: store.read(["appid", "icon"]),
+        }
+        print(f"{'case':<30} {'seconds':>8} {'rows':>8}")
+        for name, fn in cases.items():
+            elapsed, result = timeit(fn)
+            print(f"{name:<30} {elapsed:>8.3f} {len(result):>8}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
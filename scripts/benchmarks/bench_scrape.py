@@ -0,0 +1,121 @@
+"""Benchmark of the scrape scheduler against a fake play store backend.
+
+The fake `app()` sleeps for `--latency` seconds per call, raises `NotFound` for a
+fraction of the ids and raises `Throttled` (standing in for `ExtraHTTPError`) whenever
+more than `--capacity` calls are in flight. The original serial chunk loop of
+`scripts/scrape_google_play_store.py` is timed against `Scheduler` with a fixed and
+an adaptive concurrency. No network access or Ray is needed.
+
+Usage:
+    python scripts/benchmarks/bench_scrape.py --items 500 --latency 0.02 --capacity 16
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+# so that greybox can be imported without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from greybox.scrape import Scheduler  # noqa: E402
+
+
+class NotFound(Exception):
+    """The app id does not exist, stands in for `NotFoundError`."""
+
+
+class Throttled(Exception):
+    """The store is overloaded, stands in for `ExtraHTTPError`."""
+
+
+class FakePlayStore:
+    """A play store whose `app` is slow, sometimes missing and throttles when overloaded."""
+
+    def __init__(self, latency: float, capacity: int, missing: float = 0.1):
+        """Create a store, `missing` is the fraction of ids that do not exist."""
+        self.latency = latency
+        self.capacity = capacity
+        self.missing = missing
+        self.in_flight = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def app(self, appid: int) -> dict:
+        """Fake `google_play_scraper.app`, see `FakePlayStore`."""
+        with self._lock:
+            self.in_flight += 1
+            overloaded = self.in_flight > self.capacity
+            if overloaded:
+                self.throttled += 1
+        try:
+            time.sleep(self.latency)
+            if overloaded:
+                raise Throttled(appid)
+            if (appid * 2654435761) % 1000 < self.missing * 1000:
+                raise NotFound(appid)
+            return {"appId": appid, "title": f"app {appid}"}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def serial(store: FakePlayStore, appids: list[int]) -> int:
+    """Scrape `appids` one by one, returns the number scraped."""
+    # the original fallback loop, one call at a time
+    results = []
+    for id_ in appids:
+        try:
+            results.append(store.app(id_))
+        except NotFound:
+            pass
+        except Throttled:
+            pass
+    return len(results)
+
+
+def scheduled(store: FakePlayStore, appids: list[int], **kwargs) -> int:
+    """Scrape `appids` with a `Scheduler`, returns the number scraped."""
+    scheduler = Scheduler(
+        store.app,
+        throttle_on=(Throttled,),
+        skip_on=(NotFound,),
+        backoff=0.05,
+        **kwargs,
+    )
+    ok = sum(r.status == "ok" for r in scheduler.run(appids))
+    scheduled.limit = scheduler.limit.limit
+    return ok
+
+
+def main():
+    """Time each case against a fresh fake store and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--capacity", type=int, default=16)
+    args = parser.parse_args()
+
+    appids = list(range(args.items))
+    cases = {
+        "serial loop": lambda s: serial(s, appids),
+        "scheduler concurrency=8": lambda s: scheduled(s, appids, concurrency=8),
+        "scheduler concurrency=64": lambda s: scheduled(s, appids, concurrency=64),
+        "scheduler adaptive 4..64": lambda s: scheduled(
+            s, appids, concurrency=4, max_concurrency=64
+        ),
+    }
+    print(f"{'case':<28} {'seconds':>8} {'ok':>6} {'apps/s':>8} {'throttled':>10}")
+    for name, fn in cases.items():
+        store = FakePlayStore(args.latency, args.capacity)
+        start = time.perf_counter()
+        ok = fn(store)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:<28} {elapsed:>8.3f} {ok:>6} {ok / elapsed:>8.1f} {store.throttled:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Deterministic synthetic inputs for the benchmarks.
+
+Every generator takes a `seed`, so the same arguments always produce the same data and
+timings are comparable across commits.
+"""
+
+import gzip
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+IMAGE_FORMATS = ("jpeg", "bmp", "webp", "png", "gif")
+NAMES = ["icon", "sprite", "background", "tile", "ui", "button", "texture", "noise"]
+SUFFIXES = [".png", ".jpg", ".txt", ".json", ".PNG"]
+
+
+def _icon(rng: np.random.Generator, h: int, w: int) -> np.ndarray:
+    # an opaque blob (ellipse) with a random colour and some texture
+    y, x = np.ogrid[:h, :w]
+    inside = ((y - (h - 1) / 2) / (h / 2)) ** 2 + (
+        (x - (w - 1) / 2) / (w / 2)
+    ) ** 2 <= 1
+    icon = np.zeros((h, w, 4), dtype=np.uint8)
+    color = rng.integers(0, 256, 3)
+    icon[..., :3] = np.clip(color + rng.integers(-16, 17, (h, w, 3)), 0, 255)
+    icon[..., 3] = np.where(inside, 255, 0)
+    return icon
+
+
+def sprite_sheet(
+    n_icons: int,
+    icon_size: tuple[int, int] = (16, 48),
+    spacing: int = 8,
+    grid: bool = False,
+    seed: int = 0,
+) -> np.ndarray:
+    """RGBA sheet with `n_icons` icons on a transparent background.
+
+    Args:
+        n_icons (int): number of icons.
+        icon_size (tuple[int, int], optional): (min, max) side of the icons. Defaults to (16, 48).
+        spacing (int, optional): minimum transparent gap between icons. Defaults to 8.
+        grid (bool, optional): whether every icon has the maximum size, laid out on a regular grid (a tile sheet). Defaults to False.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        np.ndarray: (H, W, 4) uint8 sheet.
+    """
+    rng = np.random.default_rng(seed)
+    lo, hi = icon_size
+    cell = hi + spacing
+    columns = int(np.ceil(np.sqrt(n_icons)))
+    rows = int(np.ceil(n_icons / columns))
+    sheet = np.zeros((rows * cell + spacing, columns * cell + spacing, 4), np.uint8)
+    for i in range(n_icons):
+        r, c = divmod(i, columns)
+        h, w = (hi, hi) if grid else rng.integers(lo, hi + 1, 2)
+        y = spacing + r * cell + (0 if grid else rng.integers(0, hi - h + 1))
+        x = spacing + c * cell + (0 if grid else rng.integers(0, hi - w + 1))
+        sheet[y : y + h, x : x + w] = _icon(rng, h, w)
+    return sheet
+
+
+def color_background_sheet(
+    n_icons: int,
+    background: tuple[int, int, int] = (255, 0, 255),
+    icon_size: tuple[int, int] = (16, 48),
+    seed: int = 0,
+) -> np.ndarray:
+    """RGB sheet with `n_icons` icons on a solid `background` colour.
+
+    Args:
+        n_icons (int): number of icons.
+        background (tuple[int, int, int], optional): background colour. Defaults to magenta.
+        icon_size (tuple[int, int], optional): (min, max) side of the icons. Defaults to (16, 48).
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        np.ndarray: (H, W, 3) uint8 sheet.
+    """
+    rgba = sprite_sheet(n_icons, icon_size=icon_size, seed=seed)
+    sheet = np.empty(rgba.shape[:2] + (3,), np.uint8)
+    sheet[:] = background
+    opaque = rgba[..., 3] > 0
+    sheet[opaque] = rgba[..., :3][opaque]
+    # make sure no icon pixel accidentally has the background colour
+    sheet[opaque & np.all(sheet == background, axis=-1)] = 0
+    return sheet
+
+
+def rects(n: int, seed: int = 0) -> np.ndarray:
+    """Noisy sprite sheet fragments: clusters of small (x, y, w, h) rectangles."""
+    rng = np.random.default_rng(seed)
+    side = int(64 * np.sqrt(n))  # keeps the density constant as n grows
+    centers = rng.integers(0, side, (max(n // 8, 1), 2))
+    xy = centers[rng.integers(0, len(centers), n)] + rng.integers(-12, 13, (n, 2))
+    wh = rng.integers(1, 24, (n, 2))
+    return np.concatenate([np.clip(xy, 0, None), wh], axis=1)
+
+
+def _image_bytes(rng: np.random.Generator, size: int, fmt: str) -> bytes:
+    # smooth gradients + noise, so the encoders do some realistic work
+    y, x = np.mgrid[0:size, 0:size]
+    base = ((x + y * rng.integers(1, 4)) % 256).astype(np.uint8)
+    noise = rng.integers(0, 32, (size, size, 3), dtype=np.uint8)
+    array = (base[..., None] + noise).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, fmt.upper())
+    return buffer.getvalue()
+
+
+def mixed_format_folder(
+    path: str | Path,
+    files: int,
+    size: int = 256,
+    formats: tuple[str, ...] = IMAGE_FORMATS,
+    seed: int = 0,
+) -> list[Path]:
+    """Folder (of 10 sub folders) with `files` images cycling through `formats`.
+
+    Returns:
+        list[Path]: the image files.
+    """
+    rng = np.random.default_rng(seed)
+    path = Path(path)
+    paths = []
+    for i in range(files):
+        fmt = formats[i % len(formats)]
+        folder = path / f"dir-{i % 10}"
+        folder.mkdir(parents=True, exist_ok=True)
+        file = folder / f"image-{i}.{fmt}"
+        file.write_bytes(_image_bytes(rng, size, fmt))
+        paths.append(file)
+    return paths
+
+
+def animation(
+    path: str | Path, frames: int, hold: int = 4, n_icons: int = 16, seed: int = 0
+) -> Path:
+    """Looping GIF of a sprite sheet whose icons move every `hold` frames.
+
+    Consecutive frames of a pose differ only by a little noise, as the held frames of
+    real animations (and re-encoded ones) do.
+
+    Returns:
+        Path: the GIF.
+    """
+    rng = np.random.default_rng(seed)
+    sheet = sprite_sheet(n_icons, seed=seed)
+    images = []
+    for i in range(frames):
+        frame = np.roll(sheet, 4 * (i // hold), axis=1)
+        if i % hold:
+            # a few dithered pixels, so the frames are not merged by the encoder
+            y, x = rng.integers(0, frame.shape[0]), rng.integers(0, frame.shape[1])
+            frame = frame.copy()
+            frame[y, x] = (255, 255, 255, 255)
+        images.append(Image.fromarray(frame))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    images[0].save(
+        path, save_all=True, append_images=images[1:], duration=50, loop=0, disposal=2
+    )
+    return path
+
+
+def icon_font(path: str | Path, glyphs: int, seed: int = 0) -> Path:
+    """TrueType icon font with `glyphs` glyphs of random boxes, from U+E000 (private use).
+
+    Returns:
+        Path: the font file.
+    """
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    rng = np.random.default_rng(seed)
+    names = [".notdef"] + [f"icon{i}" for i in range(glyphs)]
+    outlines = {}
+    for name in names:
+        pen = TTGlyphPen(None)
+        if name != ".notdef":
+            for _ in range(rng.integers(1, 4)):
+                x0, y0 = rng.integers(0, 600, 2)
+                x1, y1 = x0 + rng.integers(100, 400), y0 + rng.integers(100, 400)
+                pen.moveTo((x0, y0))
+                pen.lineTo((x0, y1))
+                pen.lineTo((x1, y1))
+                pen.lineTo((x1, y0))
+                pen.closePath()
+        outlines[name] = pen.glyph()
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(names)
+    builder.setupCharacterMap({0xE000 + i: f"icon{i}" for i in range(glyphs)})
+    builder.setupGlyf(outlines)
+    builder.setupHorizontalMetrics({name: (1000, 0) for name in names})
+    builder.setupHorizontalHeader(ascent=1000, descent=0)
+    builder.setupNameTable({"familyName": "Icons", "styleName": "Regular"})
+    builder.setupOS2()
+    builder.setupPost()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    builder.save(path)
+    return path
+
+
+def directory_tree(
+    path: str | Path, dirs: int, files: int, fanout: int = 8, data: bytes = b""
+):
+    """Tree of `dirs` directories with `files` files each (containing `data`), with mixed names."""
+    path = Path(path)
+    folders = [path]
+    for i in range(1, dirs):
+        folder = folders[(i - 1) // fanout] / f"d{i}"
+        folder.mkdir(parents=True)
+        folders.append(folder)
+    for i, folder in enumerate(folders):
+        for j in range(files):
+            name = NAMES[(i + j) % len(NAMES)]
+            suffix = SUFFIXES[(i * j) % len(SUFFIXES)]
+            (folder / f"{name}-{j}{suffix}").write_bytes(data)
+
+
+def _archive(members: dict[str, bytes], kind: str) -> bytes:
+    buffer = io.BytesIO()
+    if kind == "zip":
+        with zipfile.ZipFile(buffer, "w") as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+    elif kind == "tar":
+        with tarfile.open(fileobj=buffer, mode="w") as tf:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+    else:
+        raise ValueError(kind)
+    return buffer.getvalue()
+
+
+def archive_tree(
+    path: str | Path,
+    archives: int,
+    files: int,
+    depth: int = 2,
+    size: int = 64,
+    seed: int = 0,
+) -> int:
+    """Folder with loose images and `archives` zip/tar archives that nest `depth` deep.
+
+    Each archive holds `files` images and (until `depth` is reached) one nested archive
+    of the other kind. Every 3rd top level archive is also gzipped (`.tar.gz` / `.gz`).
+
+    Returns:
+        int: the total number of images (loose and in archives).
+    """
+    rng = np.random.default_rng(seed)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    total = 0
+
+    def _images(prefix: str) -> dict[str, bytes]:
+        nonlocal total
+        total += files
+        return {
+            f"{prefix}/image-{j}.png": _image_bytes(rng, size, "png")
+            for j in range(files)
+        }
+
+    for j in range(files):
+        (path / f"loose-{j}.png").write_bytes(_image_bytes(rng, size, "png"))
+    total += files
+    for i in range(archives):
+        kind = ("zip", "tar")[i % 2]
+        data = _archive(_images(f"a{i}-d{depth}"), kind)
+        for d in range(depth - 1, 0, -1):
+            members = _images(f"a{i}-d{d}")
+            members[f"a{i}-d{d}/nested.{kind}"] = data
+            kind = "tar" if kind == "zip" else "zip"
+            data = _archive(members, kind)
+        if i % 3 == 2 and kind == "tar":
+            (path / f"archive-{i}.tar.gz").write_bytes(gzip.compress(data))
+        else:
+            (path / f"archive-{i}.{kind}").write_bytes(data)
+    return total
@@ -0,0 +1,335 @@
+"""Benchmark suite for the extraction, conversion and discovery hot paths.
+
+Each benchmark builds its (deterministic, see `fixtures.py`) input once, then is timed
+over `--repeat` runs (the best run is kept) and run once more under `tracemalloc` to
+measure its peak Python/NumPy memory (native OpenCV buffers are not traced).
+Results can be saved as a baseline and later runs compared against it, e.g. before and
+after a change:
+
+Usage:
+    python scripts/benchmarks/run.py --save baseline.json
+    python scripts/benchmarks/run.py --compare baseline.json
+    python scripts/benchmarks/run.py --filter extract --scale 0.2
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+# so that greybox can be imported without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import fixtures  # noqa: E402
+
+os.environ.setdefault("TQDM_DISABLE", "1")  # keep progress bars out of the table
+
+# name -> (setup, unit), `setup(tmp, scale)` returns (function to time, items per call)
+BENCHMARKS: dict[str, tuple[Callable, str]] = {}
+
+
+def benchmark(name: str, unit: str):
+    """Register a benchmark, see `BENCHMARKS`."""
+
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, unit)
+        return setup
+
+    return decorator
+
+
+def _n(n: int, scale: float) -> int:
+    return max(1, int(n * scale))
+
+
+@benchmark("extract_icons[contour]", "icons")
+def _(tmp, scale):
+    from greybox.utils import extract_icons
+
+    sheet = fixtures.sprite_sheet(_n(1000, scale))
+    return lambda: sum(1 for _ in extract_icons(sheet, output="array")), _n(1000, scale)
+
+
+@benchmark("extract_icons[grid]", "icons")
+def _(tmp, scale):
+    from greybox.utils import extract_icons
+
+    sheet = fixtures.sprite_sheet(_n(1024, scale), grid=True)
+    return (
+        lambda: sum(1 for _ in extract_icons(sheet, mode="grid", output="array")),
+        _n(1024, scale),
+    )
+
+
+@benchmark("find_icon_boxes_tiled", "icons")
+def _(tmp, scale):
+    from greybox.utils import find_icon_boxes_tiled
+
+    sheet = fixtures.sprite_sheet(_n(1000, scale))
+    return lambda: len(find_icon_boxes_tiled(sheet, memory_budget=1 << 20)), _n(
+        1000, scale
+    )
+
+
+@benchmark("pack_icons[32x32]", "icons")
+def _(tmp, scale):
+    from greybox.utils import find_icon_boxes, pack_icons
+
+    sheet = fixtures.sprite_sheet(_n(1000, scale))
+    boxes = find_icon_boxes(sheet)
+    return lambda: len(pack_icons(sheet, boxes, size=(32, 32))), len(boxes)
+
+
+@benchmark("phash[32x32]", "icons")
+def _(tmp, scale):
+    from greybox.utils import find_icon_boxes, pack_icons, phash
+
+    sheet = fixtures.sprite_sheet(_n(1000, scale))
+    batch = pack_icons(sheet, find_icon_boxes(sheet), size=(32, 32))
+    return lambda: len(phash(batch.images)), len(batch)
+
+
+@benchmark("DedupIndex.add_images", "icons")
+def _(tmp, scale):
+    from greybox.utils import DedupIndex, extract_icons
+
+    sheet = fixtures.sprite_sheet(_n(1000, scale))
+    icons = list(extract_icons(sheet, output="array"))
+
+    def _run():
+        with DedupIndex() as index:
+            return int(index.add_images(icons).sum())
+
+    return _run, len(icons)
+
+
+@benchmark("extract_icons_from_color_background", "icons")
+def _(tmp, scale):
+    from greybox.utils import extract_icons_from_color_background
+
+    sheet = fixtures.color_background_sheet(_n(1000, scale))
+    return (
+        lambda: sum(
+            1
+            for _ in extract_icons_from_color_background(
+                sheet, (255, 0, 255), output="array"
+            )
+        ),
+        _n(1000, scale),
+    )
+
+
+@benchmark("combine_close_bounding_rects", "rects")
+def _(tmp, scale):
+    from greybox.utils import combine_close_bounding_rects
+
+    rects = fixtures.rects(_n(10000, scale))
+    return lambda: len(combine_close_bounding_rects(rects, 10)), len(rects)
+
+
+@benchmark("most_common_color", "pixels")
+def _(tmp, scale):
+    from greybox.utils import most_common_color
+
+    sheet = fixtures.color_background_sheet(_n(1000, scale))
+    return lambda: most_common_color(sheet), sheet.shape[0] * sheet.shape[1]
+
+
+@benchmark("convert_images_to_png", "files")
+def _(tmp, scale):
+    from greybox.cli.aspng import convert_images_to_png
+
+    files = _n(100, scale)
+    fixtures.mixed_format_folder(tmp / "input", files, formats=("jpeg", "bmp", "webp"))
+    runs = itertools.count()
+    return (
+        lambda: convert_images_to_png(
+            tmp / "input", tmp / f"output-{next(runs)}", incremental=False
+        ),
+        files,
+    )
+
+
+@benchmark("convert_to_png", "files")
+def _(tmp, scale):
+    from greybox.cli.aspng import convert_to_png
+
+    files = fixtures.mixed_format_folder(
+        tmp / "input", _n(100, scale), formats=("jpeg", "bmp", "webp")
+    )
+    runs = itertools.count()
+
+    def _run():
+        out = tmp / f"output-{next(runs)}"
+        out.mkdir()
+        return [convert_to_png(f, out / f"{f.stem}.png") for f in files]
+
+    return _run, len(files)
+
+
+@benchmark("iter_frames[gif]", "frames")
+def _(tmp, scale):
+    from greybox.utils import iter_frames
+
+    frames = _n(200, scale)
+    path = fixtures.animation(tmp / "animation.gif", frames)
+    return lambda: sum(1 for _ in iter_frames(path)), frames
+
+
+@benchmark("FontRenderer.atlas", "glyphs")
+def _(tmp, scale):
+    from greybox.utils import FontRenderer
+
+    glyphs = _n(2000, scale)
+    renderer = FontRenderer(fixtures.icon_font(tmp / "icons.ttf", glyphs))
+    return lambda: len(renderer.atlas(32)), glyphs
+
+
+@benchmark("FileExtractor.find_all", "files")
+def _(tmp, scale):
+    from greybox.utils import FileExtractor
+
+    total = fixtures.archive_tree(tmp / "input", _n(20, scale), files=5)
+    return lambda: sum(
+        1 for _ in FileExtractor().find_all(tmp / "input", depth=3)
+    ), total
+
+
+@benchmark("FileExtractor.stream_all", "files")
+def _(tmp, scale):
+    from greybox.utils import FileExtractor
+
+    total = fixtures.archive_tree(tmp / "input", _n(20, scale), files=5)
+    extractor = FileExtractor()
+    return lambda: sum(1 for _ in extractor.stream_all(tmp / "input", depth=3)), total
+
+
+@benchmark("scan_files", "files")
+def _(tmp, scale):
+    from greybox.utils import scan_files
+
+    dirs, files = _n(500, scale), 20
+    fixtures.directory_tree(tmp / "input", dirs, files)
+    return lambda: sum(1 for _ in scan_files(tmp / "input")), dirs * files
+
+
+def run_benchmark(name: str, scale: float, repeat: int) -> dict:
+    """Time one benchmark, see the module docstring."""
+    setup, unit = BENCHMARKS[name]
+    with tempfile.TemporaryDirectory(prefix="greybox-bench-") as tmp:
+        fn, items = setup(Path(tmp), scale)
+        fn()  # warm up (imports, caches)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {
+        "seconds": best,
+        "items": items,
+        "unit": unit,
+        "throughput": items / best,
+        "peak_mib": peak / 2**20,
+    }
+
+
+def _commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        )
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    """Run the selected benchmarks, print a table and save or compare the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", type=str, nargs="*", help="Substrings of names.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Input size factor.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", type=Path, help="Write the results to this file.")
+    parser.add_argument("--compare", type=Path, help="Baseline results to compare to.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative slow down (or memory growth) that counts as a regression.",
+    )
+    parser.add_argument("--list", action="store_true", help="List the benchmarks.")
+    args = parser.parse_args()
+
+    names = [
+        name
+        for name in BENCHMARKS
+        if not args.filter or any(f in name for f in args.filter)
+    ]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    baseline = {}
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("scale") != args.scale:
+            print(f"warning: baseline was run with --scale {baseline.get('scale')}")
+        baseline = baseline["results"]
+
+    header = f"{'benchmark':<38} {'seconds':>8} {'throughput':>16} {'peak MiB':>9}"
+    print(header + ("  vs. baseline" if baseline else ""))
+    results, regressions = {}, []
+    for name in names:
+        result = results[name] = run_benchmark(name, args.scale, args.repeat)
+        throughput = f"{result['throughput']:.0f} {result['unit']}/s"
+        line = (
+            f"{name:<38} {result['seconds']:>8.4f} {throughput:>16} "
+            f"{result['peak_mib']:>9.1f}"
+        )
+        if name in baseline:
+            time_ratio = result["seconds"] / baseline[name]["seconds"]
+            memory_ratio = (result["peak_mib"] + 1) / (baseline[name]["peak_mib"] + 1)
+            line += f"  time {time_ratio:.2f}x, memory {memory_ratio:.2f}x"
+            if time_ratio > 1 + args.threshold or memory_ratio > 1 + args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line, flush=True)
+
+    if args.save is not None:
+        args.save.write_text(
+            json.dumps(
+                {
+                    "commit": _commit(),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "scale": args.scale,
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
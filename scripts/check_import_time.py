@@ -0,0 +1,96 @@
+"""Check that the package and its entry points import quickly and without heavy dependencies.
+
+Runs each entry point in a fresh interpreter with `python -X importtime`, sums the
+cumulative import time of the top-level imports and fails (exit code 1) if a heavy
+optional dependency (cv2, kaggle, patoolib, pandas, ...) was imported. Timings depend on
+the machine, so they are only checked against a budget if one is given. Intended to be
+run in CI to catch import time regressions, the heavy imports are also checked by
+`tests/test_import_time.py`.
+
+Usage:
+    python scripts/check_import_time.py --budget 50 --repeat 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# name -> arguments to the interpreter
+ENTRY_POINTS = {
+    "import greybox": ["-c", "import greybox"],
+    "import greybox.utils": ["-c", "import greybox.utils"],
+    "import greybox.scrape": ["-c", "import greybox.scrape"],
+    "convert_png --help": ["-m", "greybox.cli.aspng", "--help"],
+    "extract_icons --help": ["-m", "greybox.cli.extract_icons", "--help"],
+}
+# none of these may be imported by any of the entry points
+HEAVY = ("cv2", "kaggle", "patoolib", "pandas", "requests", "PIL", "tqdm", "numpy")
+
+
+def import_time(
+    args: list[str], startup: frozenset[str] = frozenset()
+) -> tuple[float, set[str]]:
+    """Cumulative import time (in ms) and imported modules of a fresh interpreter.
+
+    Modules in `startup` (those imported by the interpreter itself, e.g. `site`) are
+    not counted.
+    """
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=ROOT,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr}")
+    total, modules = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.add(name.strip())
+        # top-level imports only, the rest is nested
+        if not name.startswith("  ") and name.strip() not in startup:
+            total += int(cumulative)
+    return total / 1000, modules
+
+
+def main():
+    """Time each entry point and exit with 1 if any of them fails its checks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=None,
+        help="Budget per entry point in ms, not checked if not given.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs per entry point, the best is kept."
+    )
+    args = parser.parse_args()
+
+    startup = frozenset(import_time(["-c", "pass"])[1])
+    failed = False
+    budget = "-" if args.budget is None else f"{args.budget:.0f}"
+    print(f"{'entry point':<24} {'ms':>8} {'budget':>8}  heavy imports")
+    for name, entry in ENTRY_POINTS.items():
+        runs = [import_time(entry, startup) for _ in range(args.repeat)]
+        elapsed = min(ms for ms, _ in runs)
+        heavy = sorted(m for m in HEAVY if m in runs[0][1])
+        ok = not heavy and (args.budget is None or elapsed <= args.budget)
+        failed |= not ok
+        status = "" if ok else "  FAIL"
+        print(
+            f"{name:<24} {elapsed:>8.1f} {budget:>8}  {', '.join(heavy) or '-'}{status}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,31 @@
 Requires the `google-play-scraper` package to be installed.
 
 1. Download dataset from kaggle: "tapive/google-play-apps-and-games" this dataset contains the unique play store app ids for many mobile games.
+2. Scrape the meta-data of each game with `greybox.scrape.Scheduler`, results are appended to `game_metadata/metadata.sqlite` (see `greybox.scrape.MetadataStore`).
 
 """
 
-import ray
-import time
 import pandas as pd
 from tqdm import tqdm
-from pathlib import Path
-
 
+from greybox.scrape import MetadataStore, Scheduler
 from greybox.utils.dataset.kaggle import download_dataset
 from google_play_scraper import app, exceptions
 
+COLUMNS = [
+    "appId",
+    "genre",
+    "categories",
+    "icon",
+    "headerImage",
+    "video",
+    "videoImage",
+    "price",
+    "title",
+    "summary",
+    "description",
+]
+
 kaggle_dataset_path = download_dataset(
     "tapive/google-play-apps-and-games",
     path="~/.dataset/google-play-apps-and-games",
@@ -39,106 +51,60 @@ if not appid_dataset_path.exists():
             f.write("\n")
 
 
-# Main function to handle chunking and task management
-def scrape_all(
-    appids: list[str], path: str | Path, chunk_size: int = 100, num_tasks: int = 5
-):
-    total = 0
-    path = Path(path).expanduser().resolve()
-    path.mkdir(exist_ok=True, parents=True)
-
-    def _chunk():
-        for i in range(0, len(appids), chunk_size):
-            yield appids[i : i + chunk_size], path / f"game-data-{time.time_ns()}.csv"
-
-    pbar = tqdm(total=len(appids) / chunk_size)
-    chunks = _chunk()
-
-    active_tasks = []
-
-    for _ in range(num_tasks):
-        try:
-            chunk, chunk_path = next(chunks)
-            task = scrape.remote(chunk, chunk_path)
-            active_tasks.append(task)
-        except StopIteration:
-            break
-
-    # As tasks complete, submit new ones until all chunks are processed
-    while active_tasks:
-        # Wait for the first task to complete
-        done, active_tasks = ray.wait(active_tasks, num_returns=1)
-        for task in done:
-            try:
-                total += ray.get(task)
-                pbar.update(1)
-                pbar.set_description(f"Total: {total}")
-            except Exception as e:
-                print(f"Task failed with exception: {e}")
-
-        try:
-            chunk, chunk_path = next(chunks)
-            task = scrape.remote(chunk, chunk_path)
-            active_tasks.append(task)
-        except StopIteration:
-            pass  # No more chunks to process
-
-
-def scrape(appids: list[str], path: str | Path, pbar: tqdm):
-    columns = [
-        "appId",
-        "genre",
-        "categories",
-        "icon",
-        "headerImage",
-        "video",
-        "videoImage",
-        "price",
-        "title",
-        "summary",
-        "description",
-    ]
-    results = []
-    pbar.reset()
-    for id_ in appids:
-        pbar.update(1)
-        try:
-            result = app(id_, lang="en", country="us")
-            result["categories"] = [x["name"] for x in result["categories"]]
-            results.append(result)
-        except exceptions.NotFoundError as e:
-            pass  # this app was not found, this happens often
-        except exceptions.ExtraHTTPError as e:
-            pass  # app was not found? internal server error?
-    total = len(results)
-    df = pd.DataFrame(data=results, columns=columns)
-    df = df.rename(columns={c: c.lower() for c in columns})
-    df.to_csv(path.as_posix(), index=False)
-    return total
+def scrape_app(appid: str) -> dict:
+    """Scrape the play store page of `appid`, keeping only the category names."""
+    result = app(appid, lang="en", country="us")
+    result["categories"] = [x["name"] for x in result["categories"]]
+    return result
+
+
+def write_chunk(results: list[dict], store: MetadataStore):
+    """Write the `COLUMNS` of scraped apps to the store."""
+    store.write([{c.lower(): r.get(c) for c in COLUMNS} for r in results])
 
 
 appids = set(pd.read_csv(open(appid_dataset_path.as_posix()), header=None)[0].tolist())
 game_metadata_path = kaggle_dataset_path / "game_metadata"
+game_metadata_path.mkdir(exist_ok=True, parents=True)
+
+store = MetadataStore(game_metadata_path / "metadata.sqlite")
+# move the csv files written by earlier versions of this script into the store
+for meta_file in sorted(game_metadata_path.glob("game-data-*.csv")):
+    store.import_csv([meta_file])
+    meta_file.rename(meta_file.with_suffix(".csv.imported"))
 
 # get any existing meta data from previous runs
 print("Checking appids from previous session...")
-existing_appids = []
-for meta_file in game_metadata_path.glob("*.csv"):
-    existing_appids.extend(pd.read_csv(open(meta_file.as_posix()))["appid"].tolist())
+existing_appids = store.existing_ids()
 print(f"Found {len(existing_appids)} existing appids")
 
-appids -= set(existing_appids)
+appids -= existing_appids
 appids = list(appids)
 print(f"Scraping {len(appids)} games from play store...")
 
+scheduler = Scheduler(
+    scrape_app,
+    concurrency=4,
+    max_concurrency=32,
+    rate=20,
+    retries=3,
+    # internal server error / too many requests, back off and retry
+    throttle_on=(exceptions.ExtraHTTPError,),
+    # this app was not found, this happens often
+    skip_on=(exceptions.NotFoundError,),
+)
+
 chunk_size = 100
-pbar = tqdm(range(0, len(appids), chunk_size))
-pbar_inner = tqdm()
-total = 0
-for i in pbar:
-    pbar.set_description(f"Total: {total}")
-    total += scrape(
-        appids[i : i + chunk_size],
-        game_metadata_path / f"game-data-{time.time_ns()}.csv",
-        pbar_inner,
-    )
+results = []
+pbar = tqdm(total=len(appids), unit="app")
+for result in scheduler.run(appids):
+    pbar.update(1)
+    if result.status == "ok":
+        results.append(result.value)
+    if len(results) >= chunk_size:
+        write_chunk(results, store)
+        results = []
+    pbar.set_postfix(dict(scheduler.stats), concurrency=scheduler.limit.limit)
+if results:
+    write_chunk(results, store)
+store.close()
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from greybox.utils import (  # noqa: E402
+    combine_close_bounding_rects,
+    extract_icons_from_color_background,
+    most_common_color,
+)
+
+
+def _reference(rects: np.ndarray, threshold: int, metric: str) -> np.ndarray:
+    # quadratic union of close rectangles, groups ordered by their first rectangle
+    n = len(rects)
+    x0, y0, w, h = rects.T
+    x1, y1 = x0 + w, y0 + h
+    if metric == "corner":
+        close = (np.abs(x0[:, None] - x0) <= threshold) & (
+            np.abs(y0[:, None] - y0) <= threshold
+        )
+    else:
+        gap_x = np.maximum(x0[:, None] - x1, x0 - x1[:, None])
+        gap_y = np.maximum(y0[:, None] - y1, y0 - y1[:, None])
+        close = (gap_x <= threshold) & (gap_y <= threshold)
+    group = np.full(n, -1)
+    merged = []
+    for i in range(n):
+        if group[i] >= 0:
+            continue
+        group[i], stack = len(merged), [i]
+        members = []
+        while stack:
+            j = stack.pop()
+            members.append(j)
+            for k in np.flatnonzero(close[j] & (group < 0)):
+                group[k] = group[i]
+                stack.append(k)
+        members = np.array(members)
+        left, top = x0[members].min(), y0[members].min()
+        merged.append([left, top, x1[members].max() - left, y1[members].max() - top])
+    return np.array(merged).reshape(-1, 4)
+
+
+@pytest.mark.parametrize("metric", ["corner", "gap"])
+@pytest.mark.parametrize("chunk", [1 << 22, 7])
+def test_combine_close_bounding_rects_matches_pairwise_merge(metric, chunk):
+    rng = np.random.default_rng(0)
+    rects = np.concatenate(
+        [rng.integers(0, 500, (300, 2)), rng.integers(1, 20, (300, 2))], axis=1
+    )
+    merged = combine_close_bounding_rects(
+        rects, 6, metric=metric, max_pairs_per_chunk=chunk
+    )
+    np.testing.assert_array_equal(merged, _reference(rects, 6, metric))
+
+
+def test_combine_close_bounding_rects_edge_cases():
+    assert combine_close_bounding_rects(np.zeros((0, 4)), 5).shape == (0, 4)
+    # corner distance ignores the size, gap distance does not
+    rects = [(0, 0, 100, 10), (50, 0, 10, 10)]
+    assert len(combine_close_bounding_rects(rects, 5, metric="corner")) == 2
+    np.testing.assert_array_equal(
+        combine_close_bounding_rects(rects, 5, metric="gap"), [[0, 0, 100, 10]]
+    )
+    with pytest.raises(ValueError):
+        combine_close_bounding_rects(rects, 5, metric="euclidean")
+
+
+def test_most_common_color_modes():
+    image = np.zeros((10, 10, 3), np.uint8)
+    image[1:-1, 1:-1] = (255, 0, 0)  # more red, but only black on the border
+    assert most_common_color(image) == (255, 0, 0)
+    assert most_common_color(image, mode="border") == (0, 0, 0)
+    assert most_common_color(image, mode="sample", stride=9) == (0, 0, 0)
+    assert most_common_color(image, k=2) == [((255, 0, 0), 64), ((0, 0, 0), 36)]
+    assert most_common_color(image[..., 0]) == 255
+    assert most_common_color([image, image[::-1]], mode="border") == [(0, 0, 0)] * 2
+
+
+def test_most_common_color_breaks_ties_by_first_occurrence():
+    image = np.array([[[1, 2, 3, 4], [5, 6, 7, 8], [5, 6, 7, 8], [1, 2, 3, 4]]])
+    assert most_common_color(image.astype(np.uint8)) == (1, 2, 3, 4)
+
+
+def test_most_common_color_rejects_invalid_arguments():
+    image = np.zeros((4, 4, 3), np.uint8)
+    with pytest.raises(ValueError, match="k must be at least 1"):
+        most_common_color(image, k=0)
+    with pytest.raises(ValueError):
+        most_common_color(image, mode="middle")
+    with pytest.raises(ValueError):
+        most_common_color(image.astype(np.float32))
+
+
+@pytest.mark.parametrize("memory_budget", [None, 100])
+def test_extract_icons_from_color_background_with_boxes(memory_budget):
+    image = np.full((30, 40, 3), (255, 0, 255), np.uint8)
+    image[2:8, 3:9] = 0
+    image[20:25, 20:35] = (1, 2, 3)
+    pairs = list(
+        extract_icons_from_color_background(
+            image,
+            (255, 0, 255),
+            memory_budget=memory_budget,
+            output="array",
+            with_boxes=True,
+        )
+    )
+    assert sorted(box for _, box in pairs) == [(3, 2, 6, 6), (20, 20, 15, 5)]
+    for icon, (x, y, w, h) in pairs:
+        np.testing.assert_array_equal(icon, image[y : y + h, x : x + w])
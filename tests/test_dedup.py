@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from greybox.utils import DedupIndex, file_digest, hamming
+
+
+def _flip(rng, h: int, bits: int) -> int:
+    for b in rng.choice(64, size=bits, replace=False):
+        h ^= 1 << int(b)
+    return h
+
+
+@pytest.mark.parametrize("chunks", [2, 3, 5])
+def test_query_finds_every_hash_within_max_distance(chunks):
+    rng = np.random.default_rng(0)
+    stored = rng.integers(0, 2**64, size=2000, dtype=np.uint64)
+    with DedupIndex(max_distance=6, chunks=chunks) as index:
+        index.add(stored, [str(i) for i in range(len(stored))])
+        for i in range(200):
+            target = int(stored[i % 50])
+            query = _flip(rng, target, i % 9)  # 0 to 8 bits away
+            distances = hamming(stored, query)
+            expected = {str(j) for j in np.flatnonzero(distances <= 6)}
+            matches = index.query(query)
+            assert {key for key, _ in matches} == expected
+            assert [d for _, d in matches] == sorted(d for _, d in matches)
+
+
+def test_add_images_skips_near_duplicates(tmp_path):
+    rng = np.random.default_rng(1)
+    y, x = np.mgrid[:64, :64]
+    image = np.repeat((127 + 120 * np.sin(x / 6 + y / 9))[..., None], 3, axis=2)
+    image = image.astype(np.uint8)
+    noisy = np.clip(image + rng.integers(-3, 4, image.shape), 0, 255).astype(np.uint8)
+    other = image.transpose(1, 0, 2)[::-1]
+    with DedupIndex(tmp_path / "index.sqlite") as index:
+        new = index.add_images([image, noisy, other], ["a", "b", "c"])
+        assert new.tolist() == [True, False, True]
+        assert list(index.filter([image[::2, ::2], other])) == []
+    # kept across runs
+    with DedupIndex(tmp_path / "index.sqlite", method="phash") as index:
+        assert len(index) == 2
+        assert index.query(int(index.HASHES["dhash"]([noisy])[0]))[0][0] == "a"
+
+
+def test_file_digests(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"data")
+    digest = file_digest(path)
+    assert digest == file_digest(b"data") == file_digest(open(path, "rb"))
+    with DedupIndex() as index:
+        assert not index.has_digest(digest)
+        assert index.add_file(path, "a") and not index.add_file(b"data")
+        assert index.has_digest(digest) and not index.add_digest(digest)
+        assert index.add_digest(file_digest(b"other"), "b")
@@ -0,0 +1,227 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("cv2")
+
+from greybox.utils import (  # noqa: E402
+    DedupIndex,
+    TileGrid,
+    detect_grid,
+    extract_icons,
+    find_icon_boxes,
+    find_icon_boxes_tiled,
+    is_tilesheet,
+    pack_icons,
+    slice_grid,
+)
+
+
+def _sheet() -> np.ndarray:
+    sheet = np.zeros((40, 60, 4), np.uint8)
+    sheet[2:12, 3:8] = 255  # 5x10
+    sheet[20:30, 20:40] = 255  # 20x10 ring with a transparent hole
+    sheet[23:27, 25:35, 3] = 0
+    sheet[24:26, 28:30] = 255  # inside the hole
+    sheet[35, 50] = 255  # a single pixel
+    return sheet
+
+
+def test_find_icon_boxes_returns_arrays():
+    icons = find_icon_boxes(_sheet())
+    assert len(icons) == 3
+    np.testing.assert_array_equal(
+        icons.boxes, [[3, 2, 5, 10], [20, 20, 20, 10], [50, 35, 1, 1]]
+    )
+    np.testing.assert_array_equal(icons.areas, [50, 200, 1])  # the hole is filled
+    np.testing.assert_allclose(icons.centroids[0], [5, 6.5])
+
+
+def test_find_icon_boxes_filters():
+    sheet = _sheet()
+    assert len(find_icon_boxes(sheet, fill_holes=False)) == 4
+    assert len(find_icon_boxes(sheet, min_area=2)) == 2
+    assert len(find_icon_boxes(sheet, max_area=60)) == 2
+    np.testing.assert_array_equal(
+        find_icon_boxes(sheet, min_aspect=1.5).boxes, [[20, 20, 20, 10]]
+    )
+    np.testing.assert_array_equal(
+        find_icon_boxes(sheet, max_aspect=0.9).boxes, [[3, 2, 5, 10]]
+    )
+    with pytest.raises(ValueError):
+        find_icon_boxes(sheet[..., :3])
+
+
+def test_extract_icons_crops_each_icon():
+    sheet = _sheet()
+    icons = list(extract_icons(sheet))
+    assert [icon.size for icon in icons] == [(5, 10), (20, 10), (1, 1)]
+    assert all(isinstance(icon, Image.Image) for icon in icons)
+    np.testing.assert_array_equal(np.asarray(icons[0]), sheet[2:12, 3:8])
+
+
+def _random_sheet(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    sheet = np.zeros((300, 200, 4), np.uint8)
+    for _ in range(60):
+        x, y = rng.integers(0, 190), rng.integers(0, 290)
+        w, h = rng.integers(1, 30, 2)
+        sheet[y : y + h, x : x + w] = rng.integers(1, 256, 4)
+    # rings whose holes cross many strip borders
+    sheet[100:200, 50:150] = 255
+    sheet[110:190, 60:140, 3] = 0
+    sheet[140:160, 90:110] = 255
+    return sheet
+
+
+def _sorted(icons) -> np.ndarray:
+    # the order of icons that start on neighbouring rows differs between the engines
+    rows = np.column_stack([icons.boxes, icons.areas, icons.centroids])
+    return rows[np.lexsort(rows.T[::-1])]
+
+
+@pytest.mark.parametrize("fill_holes", [True, False])
+@pytest.mark.parametrize("budget", [1, 5000, 2**30])
+def test_find_icon_boxes_tiled_matches_whole_image(fill_holes, budget):
+    sheet = _random_sheet()
+    expected = find_icon_boxes(sheet, fill_holes=fill_holes)
+    tiled = find_icon_boxes_tiled(sheet, memory_budget=budget, fill_holes=fill_holes)
+    np.testing.assert_allclose(_sorted(tiled), _sorted(expected))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"output": "array"}, {"memory_budget": 100}, {"mode": "grid"}],
+)
+def test_extract_icons_with_boxes(kwargs):
+    sheet = _grid_sheet() if kwargs.get("mode") else _sheet()
+    pairs = list(extract_icons(sheet, with_boxes=True, **kwargs))
+    assert pairs
+    for icon, (x, y, w, h) in pairs:
+        np.testing.assert_array_equal(np.asarray(icon), sheet[y : y + h, x : x + w])
+    if "mode" not in kwargs:
+        assert [box for _, box in pairs] == [
+            (3, 2, 5, 10),
+            (20, 20, 20, 10),
+            (50, 35, 1, 1),
+        ]
+
+
+def test_extract_icons_with_boxes_and_dedup():
+    sheet = np.zeros((20, 40, 4), np.uint8)
+    sheet[2:12, 2:12] = 255
+    sheet[2:12, 2:12, 0] = np.arange(10) * 25
+    sheet[2:12, 20:30] = sheet[2:12, 2:12]  # a copy
+    index = DedupIndex()
+    pairs = list(extract_icons(sheet, dedup=index, with_boxes=True, output="array"))
+    assert [box for _, box in pairs] == [(2, 2, 10, 10)]
+
+
+def test_find_icon_boxes_tiled_reads_npy_and_image_files(tmp_path):
+    sheet = _random_sheet(1)
+    expected = _sorted(find_icon_boxes(sheet))
+    np.save(tmp_path / "sheet.npy", sheet)
+    Image.fromarray(sheet).save(tmp_path / "sheet.png")
+    for path in (tmp_path / "sheet.npy", tmp_path / "sheet.png"):
+        icons = find_icon_boxes_tiled(path, memory_budget=10000)
+        np.testing.assert_allclose(_sorted(icons), expected)
+    crops = list(extract_icons(tmp_path / "sheet.npy", memory_budget=10000))
+    assert sorted(icon.size for icon in crops) == sorted(
+        (w, h) for w, h in expected[:, 2:4].astype(int).tolist()
+    )
+
+
+def test_find_icon_boxes_tiled_on_a_color_background():
+    sheet = np.full((50, 40, 3), (255, 0, 255), np.uint8)
+    sheet[5:15, 5:10] = 0
+    sheet[30:45, 20:35] = (1, 2, 3)
+    boxes = find_icon_boxes_tiled(
+        sheet, background_color=(255, 0, 255), memory_budget=1
+    ).boxes
+    np.testing.assert_array_equal(boxes, [[5, 5, 5, 10], [20, 30, 15, 15]])
+    with pytest.raises(ValueError):
+        find_icon_boxes_tiled(sheet)
+
+
+def _grid_sheet(rows=3, columns=4, cell=10, spacing=2, offset=(1, 3)) -> np.ndarray:
+    sheet = np.zeros((rows * (cell + spacing) + 8, columns * (cell + spacing) + 8, 4))
+    for r in range(rows):
+        for c in range(columns):
+            if (r, c) == (1, 1):
+                continue  # an empty cell
+            y = offset[1] + r * (cell + spacing)
+            x = offset[0] + c * (cell + spacing)
+            sheet[y : y + cell, x : x + cell] = 255
+            sheet[y + 3 : y + 7, x + 3 : x + 7, 3] = 0  # not just solid blocks
+    return sheet.astype(np.uint8)
+
+
+def test_detect_grid_finds_cells_and_slices_without_copies():
+    sheet = _grid_sheet()
+    grid = detect_grid(sheet)
+    assert grid == TileGrid(10, 10, 1, 3, 2, 2, 4, 3)
+    assert is_tilesheet(sheet)
+    tiles = slice_grid(sheet, grid)
+    assert tiles.shape == (3, 4, 10, 10, 4)
+    assert np.shares_memory(tiles, sheet)
+    np.testing.assert_array_equal(tiles[2, 3], sheet[27:37, 37:47])
+    assert len(grid.boxes()) == 12
+    # the grid path skips the empty cell
+    assert len(list(extract_icons(sheet, mode="grid"))) == 11
+
+
+def test_detect_grid_on_a_long_sheet():
+    # only the periods around the autocorrelation peaks are checked
+    sheet = _grid_sheet(rows=2, columns=1000)
+    assert detect_grid(sheet) == TileGrid(10, 10, 1, 3, 2, 2, 1000, 2)
+    assert detect_grid(np.ascontiguousarray(sheet.transpose(1, 0, 2))) == TileGrid(
+        10, 10, 3, 1, 2, 2, 2, 1000
+    )
+
+
+def test_detect_grid_rejects_unrelated_icons():
+    sheet = np.zeros((100, 100, 4), np.uint8)
+    sheet[10:30, 10:50] = 255
+    sheet[60:90, 60:70] = 255
+    assert detect_grid(sheet) is None
+    icons = list(extract_icons(sheet, mode="auto", output="array"))
+    assert [icon.shape[:2] for icon in icons] == [(20, 40), (30, 10)]
+    with pytest.raises(ValueError):
+        list(extract_icons(sheet, mode="grid"))
+
+
+@pytest.mark.parametrize("mode", ["contour", "grid", "auto"])
+def test_extract_icons_requires_an_alpha_channel(mode):
+    with pytest.raises(ValueError, match="alpha channel"):
+        next(extract_icons(_grid_sheet()[..., :3], mode=mode))
+
+
+def test_extract_icons_array_output_is_views():
+    sheet = _sheet()
+    icons = list(extract_icons(sheet, output="array"))
+    assert [icon.shape for icon in icons] == [(10, 5, 4), (10, 20, 4), (1, 1, 4)]
+    assert all(np.shares_memory(icon, sheet) for icon in icons)
+    with pytest.raises(ValueError):
+        next(extract_icons(sheet, output="tensor"))
+
+
+def test_pack_icons_pads_or_resizes_into_one_batch():
+    sheet = _sheet()
+    icons = find_icon_boxes(sheet)
+    batch = pack_icons(sheet, icons)
+    assert batch.images.shape == (3, 10, 20, 4)
+    np.testing.assert_array_equal(batch.images[0, :10, :5], sheet[2:12, 3:8])
+    assert batch.mask[0].sum() == 50 and not batch.images[0, :, 5:].any()
+    np.testing.assert_array_equal(batch.boxes, icons.boxes)
+
+    resized = pack_icons(sheet, icons, size=(8, 8))
+    assert resized.images.shape == (3, 8, 8, 4)
+    # 5x10 keeps its aspect ratio, 4x8 at the top left of its slot
+    assert resized.mask[0].sum() == 32 and resized.mask[0, :8, :4].all()
+    stretched = pack_icons(sheet, icons, size=(8, 8), keep_aspect=False)
+    assert stretched.mask.all()
+
+    grid = detect_grid(_grid_sheet())
+    assert len(pack_icons(_grid_sheet(), grid)) == 12
+    with pytest.raises(ValueError):
+        pack_icons(sheet[..., 0], icons)
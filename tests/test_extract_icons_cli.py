@@ -0,0 +1,189 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("cv2")
+
+from greybox.cli.extract_icons import extract_icons_from_directory  # noqa: E402
+from greybox.utils import DedupIndex, ShardReader, file_digest  # noqa: E402
+
+
+def _sheet() -> np.ndarray:
+    # textured, solid icons would all have the same hash
+    sheet = np.zeros((40, 60, 4), np.uint8)
+    sheet[2:12, 3:8] = 255
+    sheet[2:12, 3:8, 0] = np.arange(5) * 50
+    sheet[20:30, 20:40] = 255
+    sheet[20:30, 20:40, 1] = np.arange(10)[:, None] * 25
+    return sheet
+
+
+def _inputs(root):
+    (root / "a").mkdir()
+    Image.fromarray(_sheet()).save(root / "a" / "foo.png")
+    # the same name with another suffix, on a white background
+    flat = np.full((30, 30, 3), 255, np.uint8)
+    flat[5:15, 10:25] = (0, 0, 255)
+    flat[5:15, 10:25:3] = (0, 0, 0)
+    Image.fromarray(flat).save(root / "a" / "foo.bmp")
+
+
+def _extract(src, out, **kwargs):
+    return extract_icons_from_directory(
+        src, out, extract_workers=0, decode_workers=1, write_workers=1, **kwargs
+    )
+
+
+def test_icons_of_files_with_the_same_stem_do_not_collide(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    _inputs(src)
+    assert _extract(src, out) == 3
+    written = sorted(
+        p.relative_to(out).as_posix() for p in out.rglob("*.png") if p.is_file()
+    )
+    assert written == ["a/foo.bmp/0000.png", "a/foo.png/0000.png", "a/foo.png/0001.png"]
+    np.testing.assert_array_equal(
+        np.asarray(Image.open(out / "a/foo.png/0001.png")), _sheet()[20:30, 20:40]
+    )
+
+
+@pytest.mark.parametrize("format", ["tar", "array"])
+def test_icons_are_streamed_into_shards(tmp_path, format):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    _inputs(src)
+    assert _extract(src, out, shards=format) == 3
+    assert not [p for p in out.rglob("*") if p.suffix == ".png"]
+    reader = ShardReader(out)
+    meta = sorted(
+        (reader.meta(i)["source"], reader.meta(i)["bbox"], i) for i in range(3)
+    )
+    assert [m[:2] for m in meta] == [
+        ("a/foo.bmp", [10, 5, 15, 10]),
+        ("a/foo.png", [3, 2, 5, 10]),
+        ("a/foo.png", [20, 20, 20, 10]),
+    ]
+    np.testing.assert_array_equal(reader[meta[2][2]], _sheet()[20:30, 20:40])
+
+
+@pytest.mark.parametrize("profile", ["default", "fast", "small", "webp"])
+def test_tar_shards_round_trip_every_profile(tmp_path, profile):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    _inputs(src)
+    opaque = _sheet()
+    opaque[..., 3] = 255  # RGBA without transparency, split on its background
+    Image.fromarray(opaque).save(src / "opaque.png")
+    sources = {
+        "a/foo.png": _sheet(),
+        "a/foo.bmp": np.asarray(Image.open(src / "a" / "foo.bmp")),
+        "opaque.png": opaque,
+    }
+    count = _extract(src, out, shards="tar", profile=profile)
+    reader = ShardReader(out)
+    assert len(reader) == count == 5
+    for i in range(count):
+        x, y, w, h = reader.meta(i)["bbox"]
+        expected = sources[reader.meta(i)["source"]][y : y + h, x : x + w]
+        np.testing.assert_array_equal(reader[i], expected)
+
+
+def test_dedup_records_files_and_icons_once_they_are_written(tmp_path):
+    src, out, index_path = tmp_path / "src", tmp_path / "out", tmp_path / "index.db"
+    src.mkdir()
+    _inputs(src)
+    png = (src / "a" / "foo.png").read_bytes()
+    (src / "copy.png").write_bytes(png)  # a duplicate file
+    (src / "broken.png").write_bytes(png[:100])  # fails to decode
+    assert _extract(src, out, dedup=index_path) == 3
+    # the copy is found first, the original is skipped
+    assert (out / "copy.png").is_dir() and not (out / "a" / "foo.png").exists()
+    with DedupIndex(index_path) as index:
+        assert len(index) == 3
+        assert index.has_digest(file_digest(png))
+        assert not index.has_digest(file_digest(png[:100]))  # tried again next time
+    assert _extract(src, tmp_path / "again", dedup=index_path) == 0
+
+
+def test_dedup_records_the_files_an_interrupted_run_finished(tmp_path, monkeypatch):
+    from greybox.utils import _encode
+
+    src, out, index_path = tmp_path / "src", tmp_path / "out", tmp_path / "index.db"
+    src.mkdir()
+    _inputs(src)
+    save_image, calls = _encode.save_image, []
+
+    def fail(*args):
+        # the disk is full by the last icon, whichever file it belongs to
+        calls.append(args)
+        if len(calls) == 3:
+            raise OSError("disk full")
+        save_image(*args)
+
+    monkeypatch.setattr(_encode, "save_image", fail)
+    with pytest.raises(OSError):
+        _extract(src, out, dedup=index_path)
+    with DedupIndex(index_path) as index:
+        assert len(index) == 2
+        recorded = [
+            name
+            for name in ("foo.bmp", "foo.png")
+            if index.has_digest(file_digest(src / "a" / name))
+        ]
+    # only the file whose icons were all written
+    assert len(recorded) == 1 and (out / "a" / recorded[0]).is_dir()
+    monkeypatch.undo()
+    assert _extract(src, out, dedup=index_path) == 1
+
+
+def _tile_sheet() -> np.ndarray:
+    # 3x4 cells of 10x10 pixels 4 apart, each with an icon made of two parts (a Γ
+    # and a square in its corner) without empty lines between them
+    sheet = np.zeros((42, 56, 4), np.uint8)
+    for r in range(3):
+        for c in range(4):
+            y, x = 2 + r * 14, 2 + c * 14
+            sheet[y : y + 10, x : x + 3] = 255
+            sheet[y : y + 3, x : x + 10] = 255
+            sheet[y + 4 : y + 10, x + 4 : x + 10] = 255
+    return sheet
+
+
+@pytest.mark.parametrize("mode, count", [("auto", 12), ("contour", 24)])
+def test_tile_sheets_are_cut_into_cells(tmp_path, mode, count):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    Image.fromarray(_tile_sheet()).save(src / "tiles.png")
+    assert _extract(src, out, shards="array", mode=mode) == count
+    reader = ShardReader(out)
+    if mode == "auto":
+        assert reader.meta(5)["bbox"] == [16, 16, 10, 10]
+        np.testing.assert_array_equal(reader[5], _tile_sheet()[16:26, 16:26])
+    with pytest.raises(ValueError):
+        _extract(src, out, mode="grid")
+
+
+def test_frames_of_animations_and_other_formats(tmp_path):
+    src, out, index_path = tmp_path / "src", tmp_path / "out", tmp_path / "index.db"
+    src.mkdir()
+    rng = np.random.default_rng(0)
+    frames = [np.full((30, 30, 3), 255, np.uint8) for _ in range(2)]
+    frames[0][5:15, 5:20] = rng.integers(0, 200, (10, 15, 3))
+    frames[1][10:25, 10:20] = rng.integers(0, 200, (15, 10, 3))
+    Image.fromarray(frames[0]).save(
+        src / "anim.GIF", save_all=True, append_images=[Image.fromarray(frames[1])]
+    )
+    Image.fromarray(_sheet()[:32, :32]).save(src / "icon.jpg.ico", sizes=[(32, 32)])
+    assert _extract(src, out, dedup=index_path) == 4
+    written = sorted(
+        p.relative_to(out).as_posix() for p in out.rglob("*.png") if p.is_file()
+    )
+    assert written == [
+        "anim.GIF/f000000/0000.png",
+        "anim.GIF/f000001/0000.png",
+        "icon.jpg.ico/0000.png",
+        "icon.jpg.ico/0001.png",
+    ]
+    with DedupIndex(index_path) as index:
+        assert index.has_digest(file_digest(src / "anim.GIF"))
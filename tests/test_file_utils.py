@@ -0,0 +1,179 @@
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from greybox.utils import (
+    ExtractionScheduler,
+    FileExtractor,
+    file_digest,
+    find_all_files_with_keyword,
+    scan_files,
+)
+
+
+def _png(value: int = 0) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((4, 4, 3), value, np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _tar(members: dict[str, bytes], mode: str = "w:gz") -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _streamed(root, depth=1, **kwargs) -> dict[str, bytes]:
+    files = FileExtractor(**kwargs).stream_all(root, depth=depth)
+    return {f.path.relative_to(root.as_posix()).as_posix(): f.read() for f in files}
+
+
+def test_stream_all_reads_archives_in_memory(tmp_path):
+    (tmp_path / "a.png").write_bytes(_png(1))
+    (tmp_path / "notes.txt").write_text("not an image")
+    (tmp_path / "pack.zip").write_bytes(
+        _zip({"b.png": _png(2), "readme.txt": b"text", "dir/c.png": _png(3)})
+    )
+    (tmp_path / "pack.tar.gz").write_bytes(_tar({"d.png": _png(4)}))
+    (tmp_path / "e.png.gz").write_bytes(gzip.compress(_png(5)))
+    before = set(tmp_path.rglob("*"))
+
+    assert _streamed(tmp_path) == {
+        "a.png": _png(1),
+        "pack.zip/b.png": _png(2),
+        "pack.zip/dir/c.png": _png(3),
+        "pack.tar.gz/d.png": _png(4),
+        "e.png.gz/e.png": _png(5),
+    }
+    assert set(tmp_path.rglob("*")) == before  # nothing was extracted
+
+
+def test_stream_all_opens_nested_archives_up_to_depth(tmp_path):
+    inner = _zip({"deep.png": _png(2)})
+    (tmp_path / "outer.zip").write_bytes(
+        _zip({"top.png": _png(1), "inner.tar": _tar({"inner.zip": inner}, "w")})
+    )
+
+    assert set(_streamed(tmp_path, depth=1)) == {"outer.zip/top.png"}
+    assert set(_streamed(tmp_path, depth=3)) == {
+        "outer.zip/top.png",
+        "outer.zip/inner.tar/inner.zip/deep.png",
+    }
+    assert _streamed(tmp_path, extract_archives=False) == {}
+
+
+def _tree(root):
+    for i, name in enumerate(["a.PNG", "b.txt", "x/c.png", "x/y/d.jpg", "z/e.png"]):
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_bytes(b"%d" % i)
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_scan_files_matches_os_walk(tmp_path, workers):
+    _tree(tmp_path)
+    expected = [
+        Path(root, file) for root, _, files in os.walk(tmp_path) for file in files
+    ]
+    assert list(scan_files(tmp_path, workers=workers)) == expected
+    unordered = scan_files(tmp_path, workers=workers, ordered=False)
+    assert sorted(unordered) == sorted(expected)
+
+
+def test_scan_files_filters_extensions_and_keywords(tmp_path):
+    _tree(tmp_path)
+
+    def names(**kwargs):
+        return sorted(p.name for p in scan_files(tmp_path, **kwargs))
+
+    assert names(extensions=[".png"]) == ["a.PNG", "c.png", "e.png"]
+    assert names(keywords=["C", "d"]) == ["c.png", "d.jpg"]
+    assert names(extensions=[".png"], keywords=["e"]) == ["e.png"]
+    assert names(keywords=[]) == []
+    assert sorted(p.name for p in find_all_files_with_keyword(tmp_path, ["A"])) == [
+        "a.PNG"
+    ]
+
+
+@pytest.mark.parametrize("record_files", [True, False])
+def test_stream_all_skips_duplicate_files(tmp_path, record_files):
+    from greybox.utils import DedupIndex
+
+    (tmp_path / "a.png").write_bytes(_png(1))
+    (tmp_path / "pack.zip").write_bytes(_zip({"b.png": _png(1), "c.png": _png(2)}))
+    with DedupIndex() as index:
+        kwargs = {"dedup": index, "record_files": record_files}
+        # whichever copy is found first is kept, unless the caller records them
+        streamed = set(_streamed(tmp_path, **kwargs))
+        assert len(streamed) == (2 if record_files else 3)
+        assert "pack.zip/c.png" in streamed
+        # recorded as they are found, or left to the caller
+        assert index.has_digest(file_digest(_png(2))) == record_files
+        files = list(FileExtractor(**kwargs).stream_all(tmp_path))
+        assert sorted(f.digest for f in files) == (
+            [] if record_files else sorted([file_digest(_png(i)) for i in (1, 1, 2)])
+        )
+
+
+def _archives(root, n: int, size: int = 4096) -> list[Path]:
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        data = rng.integers(0, 256, size, dtype=np.uint8).tobytes()  # incompressible
+        paths.append(root / f"{i}.zip")
+        paths[-1].write_bytes(_zip({f"{i}.png": _png(i), f"{i}.bin": data}))
+    return paths
+
+
+def test_extraction_scheduler_stays_within_its_quota(tmp_path):
+    pytest.importorskip("patoolib")
+    archives = _archives(tmp_path, 4)
+    size = archives[0].stat().st_size
+    # room for one archive, so each extraction waits for the previous tree to go
+    with ExtractionScheduler(workers=1, quota=size + 1, scratch_dir=tmp_path) as s:
+        extractions = s.extract(archives)
+        seen, trees = [], []
+        for archive, tree in extractions:
+            # one extraction always runs, the quota keeps any more from starting
+            assert len(extractions.pending) <= 1
+            assert s.used > 0  # the tree on disk
+            seen.append(archive)
+            trees.append(tree)
+            assert sorted(p.name for p in tree.iterdir()) == [
+                f"{archive.stem}.bin",
+                f"{archive.stem}.png",
+            ]
+        assert seen == archives
+        assert not any(t.exists() for t in trees)  # removed as the loop moved on
+        assert s.used == 0
+        scratch = s._scratch
+    assert not scratch.exists()
+
+
+def test_extraction_scheduler_runs_ahead_within_its_quota(tmp_path):
+    pytest.importorskip("patoolib")
+    archives = _archives(tmp_path, 6)
+    with ExtractionScheduler(workers=1, quota=2**30, max_in_flight=3) as s:
+        extractions = s.extract(archives)
+        assert len(extractions.pending) == 3  # started before anything is consumed
+        next(extractions)
+        extractions.close()  # stopped early, the running extractions are dropped
+        assert s.used == 0 and not extractions.pending
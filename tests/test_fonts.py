@@ -0,0 +1,99 @@
+import io
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fontTools")
+
+from fontTools.fontBuilder import FontBuilder  # noqa: E402
+from fontTools.pens.ttGlyphPen import TTGlyphPen  # noqa: E402
+
+from greybox.utils import FontRenderer, font_codepoints, render_fonts  # noqa: E402
+
+# codepoint -> (width, height) of a rectangle glyph, in font units of 1000 per em
+GLYPHS = {0xE000: (800, 800), 0xE001: (400, 800), 0xE002: (800, 200), 0x20: None}
+
+
+def _font(glyphs: dict = GLYPHS) -> bytes:
+    names = {codepoint: f"g{codepoint:04x}" for codepoint in glyphs}
+    outlines = {".notdef": TTGlyphPen(None).glyph()}
+    for codepoint, size in glyphs.items():
+        pen = TTGlyphPen(None)
+        if size is not None:  # a blank glyph, like a space
+            w, h = size
+            pen.moveTo((100, 0))
+            pen.lineTo((100, h))
+            pen.lineTo((100 + w, h))
+            pen.lineTo((100 + w, 0))
+            pen.closePath()
+        outlines[names[codepoint]] = pen.glyph()
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(list(outlines))
+    builder.setupCharacterMap(names)
+    builder.setupGlyf(outlines)
+    builder.setupHorizontalMetrics({name: (1000, 0) for name in outlines})
+    builder.setupHorizontalHeader(ascent=900, descent=-100)
+    builder.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+    builder.setupOS2(sTypoAscender=900, usWinAscent=900, usWinDescent=100)
+    builder.setupPost()
+    buffer = io.BytesIO()
+    builder.save(buffer)
+    return buffer.getvalue()
+
+
+def test_font_codepoints(tmp_path):
+    path = tmp_path / "icons.ttf"
+    path.write_bytes(_font())
+    np.testing.assert_array_equal(font_codepoints(path), [0x20, 0xE000, 0xE001, 0xE002])
+    assert font_codepoints(path.read_bytes()).dtype == np.int32
+
+
+def test_atlas_packs_every_inked_glyph():
+    renderer = FontRenderer(_font())
+    atlas = renderer.atlas(20, color=(255, 0, 0))
+    # the space has no ink
+    np.testing.assert_array_equal(atlas.codepoints, [0xE000, 0xE001, 0xE002])
+    np.testing.assert_array_equal(atlas.boxes[:, 2:], [[16, 16], [8, 16], [16, 4]])
+    assert len(atlas) == 3 and atlas.size == 20
+    assert (atlas.image[..., :3] == (255, 0, 0)).all()
+    for x, y, w, h in atlas.boxes:
+        assert (atlas.image[y : y + h, x : x + w, 3] == 255).all()
+    # glyphs do not overlap
+    assert (atlas.image[..., 3] > 0).sum() == (
+        atlas.boxes[:, 2] * atlas.boxes[:, 3]
+    ).sum()
+
+
+def test_renderer_caches_faces_per_size():
+    renderer = FontRenderer(_font(), codepoints=[0xE001, 0xE000, 0xE001])
+    np.testing.assert_array_equal(renderer.codepoints, [0xE000, 0xE001])
+    face = renderer.face(10)
+    assert renderer.face(10) is face and renderer.face(40) is not face
+    small, large = renderer.atlas(10), renderer.atlas(40)
+    np.testing.assert_array_equal(large.boxes[:, 2:], small.boxes[:, 2:] * 4)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_render_fonts_in_order(tmp_path, workers):
+    fonts = []
+    for i, glyphs in enumerate([GLYPHS, {0xF000: (500, 500)}]):
+        fonts.append(tmp_path / f"{i}.ttf")
+        fonts[-1].write_bytes(_font(glyphs))
+    results = list(render_fonts(fonts, (10, 20), workers=workers))
+    assert [(font, size, len(atlas)) for font, size, atlas in results] == [
+        (fonts[0], 10, 3),
+        (fonts[0], 20, 3),
+        (fonts[1], 10, 1),
+        (fonts[1], 20, 1),
+    ]
+    with pytest.raises(ValueError):
+        next(render_fonts(fonts, 10, output="svg"))
+
+
+def test_render_fonts_to_icon_batches(tmp_path):
+    pytest.importorskip("cv2")
+    path = tmp_path / "icons.ttf"
+    path.write_bytes(_font())
+    ((font, size, batch),) = render_fonts([path], 20, output="batch")
+    assert batch.images.shape == (3, 16, 16, 4)
+    assert batch.mask[1].sum() == 8 * 16
@@ -0,0 +1,88 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from greybox.utils import iter_frames
+
+
+def _gif(values: list[int], duration: int = 100) -> bytes:
+    # flat gray frames with a white square, held frames differ by a pixel so that PIL
+    # does not merge them
+    frames = []
+    for i, value in enumerate(values):
+        frame = np.full((32, 32, 3), value, np.uint8)
+        frame[:8, :8] = 255
+        frame[-1, -1] = i
+        frames.append(Image.fromarray(frame))
+    buffer = io.BytesIO()
+    frames[0].save(
+        buffer,
+        "GIF",
+        save_all=True,
+        append_images=frames[1:],
+        duration=duration,
+        disposal=1,
+        optimize=False,
+    )
+    return buffer.getvalue()
+
+
+GIF = _gif([0, 0, 40, 80, 80, 120, 160, 200])
+
+
+def test_iter_frames_drops_held_frames(tmp_path):
+    path = tmp_path / "anim.gif"
+    path.write_bytes(GIF)
+    frames = list(iter_frames(path))
+    assert [f.index for f in frames] == [0, 2, 3, 5, 6, 7]
+    assert frames[1].time == pytest.approx(0.2)
+    assert frames[0].image.shape == (32, 32, 3) and frames[1].image[20, 20, 0] == 40
+    assert len(list(iter_frames(path, min_difference=0))) == 8
+
+
+@pytest.mark.parametrize(
+    "kwargs, indices",
+    [
+        ({"stride": 3}, [0, 3, 6]),
+        ({"interval": 0.25}, [0, 3, 6]),  # the frames at 0, 0.3 and 0.6s
+        ({"stride": 2, "interval": 0.3}, [0, 4]),  # 0.2 and 0.6s are too early
+        ({"max_frames": 2}, [0, 1]),
+        ({"max_frames": 0}, []),
+    ],
+)
+def test_iter_frames_sampling(kwargs, indices):
+    frames = iter_frames(GIF, min_difference=0, **kwargs)
+    assert [f.index for f in frames] == indices
+
+
+def test_iter_frames_reads_files_and_still_images():
+    frames = list(iter_frames(io.BytesIO(GIF)))
+    assert len(frames) == 6
+    buffer = io.BytesIO()
+    Image.new("RGBA", (4, 2)).save(buffer, "PNG")
+    (frame,) = iter_frames(buffer.getvalue())
+    assert frame.index == 0 and frame.image.shape == (2, 4, 4)
+    with pytest.raises(ValueError):
+        next(iter_frames(GIF, stride=0))
+
+
+def test_iter_frames_reads_videos(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    path = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(
+        path.as_posix(), cv2.VideoWriter_fourcc(*"MJPG"), 10, (32, 32)
+    )
+    for value in [0, 0, 0, 100, 100, 200]:
+        writer.write(np.full((32, 32, 3), value, np.uint8))
+    writer.release()
+
+    frames = list(iter_frames(path))
+    assert [f.index for f in frames] == [0, 3, 5]
+    assert [f.time for f in frames] == pytest.approx([0, 0.3, 0.5])
+    assert frames[1].image.shape == (32, 32, 3)
+    assert abs(int(frames[1].image[16, 16, 0]) - 100) < 5
+    # from bytes, through a temporary file
+    frames = list(iter_frames(path.read_bytes(), stride=2, min_difference=0))
+    assert [f.index for f in frames] == [0, 2, 4]
@@ -0,0 +1,138 @@
+import io
+from http.server import BaseHTTPRequestHandler
+
+import numpy as np
+import pytest
+import requests
+from PIL import Image
+
+from greybox.utils import HttpCache
+from greybox.utils import _image_utils as image
+from greybox.utils._image_utils import LazyImage, open_many
+
+
+def _png(value: int = 0) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((4, 4, 3), value, np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+LAST_MODIFIED = "Wed, 21 Oct 2015 07:28:00 GMT"
+# path -> (body, response headers)
+FILES = {
+    "/etag.png": (_png(1), {"ETag": '"v1"'}),
+    "/modified.png": (_png(2), {"Last-Modified": LAST_MODIFIED}),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.log.append(
+            (
+                self.path,
+                self.headers.get("If-None-Match"),
+                self.headers.get("If-Modified-Since"),
+            )
+        )
+        if self.path not in FILES:
+            self.send_error(404)
+            return
+        body, headers = FILES[self.path]
+        validators = {
+            self.headers.get("If-None-Match"),
+            self.headers.get("If-Modified-Since"),
+        }
+        if validators & set(headers.values()):
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(serve):
+    return serve(_Handler)
+
+
+def test_open_many_downloads_in_order(server, tmp_path):
+    (tmp_path / "local.png").write_bytes(_png(3))
+    uris = [
+        server.url + "/modified.png",
+        str(tmp_path / "local.png"),
+        server.url + "/etag.png",
+    ]
+    images = list(open_many(uris, concurrency=4))
+    assert all(isinstance(image, LazyImage) for image in images)
+    assert [int(image.array[0, 0, 0]) for image in images] == [2, 3, 1]
+    pil = list(open_many(uris[:1], lazy=False))
+    assert isinstance(pil[0], Image.Image) and pil[0].size == (4, 4)
+
+
+def test_open_many_revalidates_cached_files(server, tmp_path):
+    uris = [server.url + "/etag.png", server.url + "/modified.png"]
+    cache = HttpCache(tmp_path / "cache")
+    first = [image.path for image in open_many(uris, cache_dir=cache)]
+    second = [image.path for image in open_many(uris, cache_dir=cache)]
+    assert first == second and [p.read_bytes() for p in second] == [
+        FILES[u][0] for u in ["/etag.png", "/modified.png"]
+    ]
+    # the second run sent the validators and got 304s
+    assert sorted(server.log[2:]) == [
+        ("/etag.png", '"v1"', None),
+        ("/modified.png", None, LAST_MODIFIED),
+    ]
+
+    offline = HttpCache(tmp_path / "cache", revalidate=False)
+    assert [image.path for image in open_many(uris, cache_dir=offline)] == first
+    assert len(server.log) == 4
+
+
+def test_open_many_returns_or_raises_errors(server, tmp_path):
+    uris = [
+        server.url + "/etag.png",
+        server.url + "/missing.png",
+        str(tmp_path / "no.png"),
+    ]
+    results = list(open_many(uris, return_exceptions=True))
+    assert isinstance(results[0], LazyImage)
+    assert isinstance(results[1], requests.HTTPError)
+    assert results[1].response.status_code == 404
+    assert isinstance(results[2], FileNotFoundError)
+    with pytest.raises(requests.HTTPError):
+        list(open_many(uris[:2]))
+
+
+def test_open_many_closes_its_own_session(server, monkeypatch):
+    sessions = []
+
+    def make_session(pool_size):
+        sessions.append(requests.Session())
+        sessions[-1].close = lambda: sessions.append("closed")
+        return sessions[0]
+
+    monkeypatch.setattr(image, "make_session", make_session)
+    images = open_many([server.url + "/etag.png"] * 3, concurrency=64)
+    next(images)
+    images.close()  # stopped early
+    assert sessions[1:] == ["closed"]
+
+
+def test_convert_to_png_downscales_pngs(tmp_path):
+    source = tmp_path / "a.png"
+    Image.fromarray(np.zeros((40, 20, 3), np.uint8)).save(source)
+    assert image.convert_to_png(source) == source  # nothing to do
+
+    output = image.convert_to_png(source, max_size=10)
+    assert output == tmp_path / "a-1.png"
+    assert Image.open(output).size == (5, 10) and Image.open(source).size == (20, 40)
+    output = image.convert_to_png(source, tmp_path / "small.png", max_size=(4, 4))
+    assert Image.open(output).size == (2, 4)
@@ -0,0 +1,45 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from scripts.check_import_time import ENTRY_POINTS, HEAVY, ROOT
+
+# runs an entry point of `ENTRY_POINTS` and prints the imported modules
+RUN = """
+import json, runpy, sys
+args = json.loads(sys.argv[1])
+if args[0] == "-c":
+    exec(args[1])
+else:
+    sys.argv = args[1:]
+    try:
+        runpy.run_module(args[1], run_name="__main__", alter_sys=True)
+    except SystemExit:
+        pass
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def _modules(args: list[str]) -> set[str]:
+    result = subprocess.run(
+        [sys.executable, "-c", RUN, json.dumps(args)],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        check=True,
+    )
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+@pytest.mark.parametrize("name", list(ENTRY_POINTS))
+def test_entry_points_do_not_import_heavy_modules(name):
+    modules = _modules(ENTRY_POINTS[name])
+    assert "greybox" in modules
+    assert not [m for m in modules if m.split(".")[0] in HEAVY]
+
+
+def test_heavy_modules_are_imported_on_first_use():
+    modules = _modules(["-c", "import greybox.utils; greybox.utils.find_icon_boxes"])
+    assert "cv2" in modules and "numpy" in modules
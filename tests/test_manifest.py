@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from greybox.cli.aspng import convert_images_to_png
+from greybox.utils import ConversionManifest
+
+
+def _image(path, value=0):
+    Image.fromarray(np.full((8, 8, 3), value, np.uint8)).save(path)
+    return path
+
+
+def test_records_are_on_disk_before_close(tmp_path):
+    source = _image(tmp_path / "a.bmp")
+    output = _image(tmp_path / "a.png")
+    manifest = ConversionManifest(tmp_path)
+    manifest.record(source, output)
+    # not closed, as after a crash
+    resumed = ConversionManifest(tmp_path)
+    assert resumed.is_current(source)
+    assert resumed.output_for(source) == output
+    manifest.close()
+
+
+def test_changed_input_or_settings_are_not_current(tmp_path):
+    source = _image(tmp_path / "a.bmp")
+    output = _image(tmp_path / "a.png")
+    with ConversionManifest(tmp_path, settings={"max_size": [4, 4]}) as manifest:
+        manifest.record(source, output)
+        assert manifest.is_current(source)
+    assert not ConversionManifest(tmp_path).is_current(source)
+
+    _image(source, value=255)
+    assert not ConversionManifest(tmp_path, settings={"max_size": [4, 4]}).is_current(
+        source
+    )
+
+
+def test_touched_input_is_current_with_hash(tmp_path):
+    source = _image(tmp_path / "a.bmp")
+    output = _image(tmp_path / "a.png")
+    with ConversionManifest(tmp_path, use_hash=True) as manifest:
+        manifest.record(source, output)
+    source.write_bytes(source.read_bytes())  # new mtime, same content
+    with ConversionManifest(tmp_path, use_hash=True) as manifest:
+        assert manifest.is_current(source)
+
+
+def test_prune_and_compact(tmp_path):
+    a, b = _image(tmp_path / "a.bmp"), _image(tmp_path / "b.bmp")
+    out = tmp_path / "out"
+    out.mkdir()
+    with ConversionManifest(out) as manifest:
+        manifest.record(a, _image(out / "a.png"))
+        manifest.record(b, _image(out / "b.png"))
+        assert manifest.prune([a]) == [b.resolve().as_posix()]
+        assert not (out / "b.png").exists()
+        manifest.compact()
+    lines = (out / ConversionManifest.FILENAME).read_text().splitlines()
+    assert len(lines) == 1
+    assert ConversionManifest(out).inputs() == [a.resolve().as_posix()]
+
+
+def test_incremental_conversion_skips_unchanged_inputs(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    for i in range(3):
+        _image(src / f"{i}.bmp", value=i)
+    assert convert_images_to_png(src, out) == 3
+    assert convert_images_to_png(src, out) == 0
+    _image(src / "1.bmp", value=100)
+    assert convert_images_to_png(src, out) == 1
+    assert sorted(p.name for p in out.glob("*.png")) == ["0.png", "1.png", "2.png"]
+
+
+def _colliding_inputs(src):
+    # three inputs named x0, which need the collision suffixes, and one more file
+    for i, sub in enumerate(["a", "b", "c"]):
+        (src / sub).mkdir(parents=True)
+        _image(src / sub / "x0.bmp", value=10 * i)
+    _image(src / "x1.bmp", value=99)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_parallel_conversion_matches_serial_names(tmp_path, workers):
+    src, out = tmp_path / "src", tmp_path / "out"
+    _colliding_inputs(src)
+    assert convert_images_to_png(src, out, workers=workers) == 4
+    assert sorted(p.name for p in out.glob("*.png")) == [
+        "x0-1.png",
+        "x0-2.png",
+        "x0.png",
+        "x1.png",
+    ]
+    # names follow the sorted input order, whichever worker finished first
+    manifest = ConversionManifest(out)
+    assert {
+        manifest.output_for(p.resolve()).name: int(np.asarray(Image.open(p))[0, 0, 0])
+        for p in src.rglob("*.bmp")
+    } == {"x0.png": 0, "x0-1.png": 10, "x0-2.png": 20, "x1.png": 99}
+
+    assert convert_images_to_png(src, out, workers=workers) == 0
+    _image(src / "b" / "x0.bmp", value=50)
+    assert convert_images_to_png(src, out, workers=workers) == 1
+    assert int(np.asarray(Image.open(out / "x0-1.png"))[0, 0, 0]) == 50
+    assert len(list(out.glob("*.png"))) == 4
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+
+import pytest
+
+from greybox.utils import (
+    JsonLinesSink,
+    Metrics,
+    PrometheusSink,
+    capture_metrics,
+    disable_metrics,
+    enable_metrics,
+    get_metrics,
+    make_sink,
+)
+
+
+class ListSink:
+    def __init__(self):
+        self.snapshots = []
+
+    def write(self, snapshot):
+        self.snapshots.append(snapshot)
+
+
+def test_add_merge_and_snapshot():
+    metrics = Metrics()
+    metrics.add("decode", 0.5, nbytes=100)
+    metrics.add("decode", 0.25, count=2, nbytes=50)
+    with metrics.time("encode", count=3):
+        time.sleep(0.01)
+    snapshot = metrics.snapshot()
+    assert snapshot["decode"] == {"count": 3, "seconds": 0.75, "bytes": 150}
+    assert snapshot["encode"]["count"] == 3 and snapshot["encode"]["seconds"] >= 0.01
+
+    other = Metrics()
+    other.merge(snapshot)
+    other.merge({"decode": {"count": 1, "seconds": 1.0, "bytes": 1}})
+    other.merge(None)
+    assert other.snapshot()["decode"] == {"count": 4, "seconds": 1.75, "bytes": 151}
+    other.reset()
+    assert other.snapshot() == {}
+
+
+def test_concurrent_adds_flush_once_per_interval(monkeypatch):
+    sink = ListSink()
+    metrics = Metrics(sink, flush_interval=60)
+    start = time.monotonic()
+    sleep = time.sleep
+
+    def slow_clock():
+        sleep(0.001)  # widens the window between checking and updating the last flush
+        return start + 61
+
+    monkeypatch.setattr(time, "monotonic", slow_clock)
+    threads = [
+        threading.Thread(target=lambda: [metrics.add("a") for _ in range(20)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(sink.snapshots) == 1
+    assert metrics.snapshot()["a"]["count"] == 160
+
+
+def test_json_lines_sink(tmp_path):
+    path = tmp_path / "logs" / "metrics.jsonl"
+    metrics = Metrics(make_sink(path))
+    assert isinstance(metrics.sinks[0], JsonLinesSink)
+    metrics.add("decode", 1.0, nbytes=10)
+    metrics.flush()
+    metrics.add("decode")
+    metrics.flush()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["stages"]["decode"]["count"] for line in lines] == [1, 2]
+    assert {"time", "pid"} <= lines[0].keys()
+
+
+def test_prometheus_sink(tmp_path):
+    path = tmp_path / "greybox.prom"
+    metrics = Metrics(make_sink(path))
+    assert isinstance(metrics.sinks[0], PrometheusSink)
+    metrics.add("encode", 0.5, count=2, nbytes=7)
+    metrics.add("decode", 1.5, nbytes=3)
+    metrics.flush()
+    lines = path.read_text().splitlines()
+    assert lines[:4] == [
+        "# HELP greybox_stage_items_total Number of items processed by each stage.",
+        "# TYPE greybox_stage_items_total counter",
+        'greybox_stage_items_total{stage="decode"} 1',
+        'greybox_stage_items_total{stage="encode"} 2',
+    ]
+    assert 'greybox_stage_seconds_total{stage="decode"} 1.5' in lines
+    assert 'greybox_stage_bytes_total{stage="encode"} 7' in lines
+    # replaced, not appended to
+    metrics.flush()
+    assert path.read_text().splitlines() == lines
+    assert [p.name for p in tmp_path.iterdir()] == ["greybox.prom"]
+
+
+def test_enable_disable_and_capture_metrics():
+    assert not get_metrics().enabled
+    with get_metrics().time("decode"):
+        pass
+    assert get_metrics().snapshot() == {}
+
+    sink = ListSink()
+    metrics = enable_metrics(sink)
+    try:
+        assert get_metrics() is metrics and metrics.enabled
+        get_metrics().add("decode")
+        with capture_metrics() as captured:
+            get_metrics().add("encode")
+        assert get_metrics() is metrics
+        assert list(captured.snapshot()) == ["encode"]
+        metrics.merge(captured.snapshot())
+    finally:
+        assert disable_metrics() is metrics
+    assert not get_metrics().enabled
+    # flushed when disabled
+    assert sink.snapshots == [
+        {
+            "decode": {"count": 1, "seconds": 0.0, "bytes": 0},
+            "encode": {"count": 1, "seconds": 0.0, "bytes": 0},
+        }
+    ]
+
+
+def test_capture_metrics_restores_on_error():
+    with pytest.raises(RuntimeError):
+        with capture_metrics():
+            raise RuntimeError
+    assert not get_metrics().enabled
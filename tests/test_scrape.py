@@ -0,0 +1,279 @@
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+from greybox.scrape import (
+    AdaptiveLimit,
+    HostRateLimiter,
+    Scheduler,
+    TokenBucket,
+    download_media,
+)
+from greybox.scrape._download import DownloadJournal
+from greybox.utils import _http
+
+
+class Throttled(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class FakeBackend:
+    """Fails each item as scripted (a list of exceptions, then succeeds)."""
+
+    def __init__(self, script: dict):
+        self.script = {item: list(errors) for item, errors in script.items()}
+        self.calls = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        with self._lock:
+            self.calls.append(item)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.001)
+            errors = self.script.get(item)
+            if errors:
+                raise errors.pop(0)
+            return item * 10
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_token_bucket_allows_bursts_then_limits_the_rate():
+    bucket = TokenBucket(rate=1000, burst=5)
+    assert all(bucket.acquire(block=False) for _ in range(5))
+    assert not bucket.acquire(block=False)
+    start = time.monotonic()
+    for _ in range(20):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.015
+
+    unlimited = TokenBucket(rate=0)
+    assert all(unlimited.acquire(block=False) for _ in range(1000))
+
+
+def test_adaptive_limit_grows_and_halves():
+    limit = AdaptiveLimit(4, maximum=8, cooldown=60)
+    for _ in range(4):
+        limit.on_success()
+    assert limit.limit == 5
+    limit.on_throttle()
+    assert limit.limit == 2
+    limit.on_throttle()  # within the cooldown, counted once
+    assert limit.limit == 2
+
+
+def test_scheduler_retries_skips_and_fails():
+    backend = FakeBackend(
+        {
+            1: [ValueError("flaky")],
+            2: [NotFound()],
+            3: [KeyError("bug")],
+            4: [ValueError("down")] * 5,
+        }
+    )
+    scheduler = Scheduler(
+        backend,
+        concurrency=2,
+        retries=2,
+        backoff=0,
+        skip_on=(NotFound,),
+        retry_on=(ValueError,),
+    )
+    results = {r.item: r for r in scheduler.run(range(6))}
+    assert {i: (r.status, r.attempts) for i, r in results.items()} == {
+        0: ("ok", 1),
+        1: ("ok", 2),
+        2: ("skipped", 1),
+        3: ("failed", 1),  # not in retry_on
+        4: ("failed", 3),
+        5: ("ok", 1),
+    }
+    assert results[1].value == 10 and results[4].value is None
+    assert isinstance(results[4].error, ValueError)
+    assert backend.calls.count(4) == 3 and backend.calls.count(2) == 1
+    assert scheduler.stats == {
+        "ok": 3,
+        "skipped": 1,
+        "failed": 2,
+        "retried": 3,
+        "throttled": 0,
+    }
+    assert backend.max_in_flight <= 2
+
+
+def test_scheduler_backs_off_when_throttled():
+    backend = FakeBackend({i: [Throttled()] for i in range(3)})
+    scheduler = Scheduler(
+        backend,
+        concurrency=8,
+        max_concurrency=16,
+        retries=1,
+        backoff=0,
+        throttle_on=(Throttled,),
+    )
+    results = list(scheduler.run(range(3), ordered=True))
+    assert [(r.item, r.status, r.attempts) for r in results] == [
+        (i, "ok", 2) for i in range(3)
+    ]
+    assert scheduler.stats["throttled"] == 3 and scheduler.stats["retried"] == 3
+    # halved once (the cooldown absorbs the other throttles), not grown back yet
+    assert scheduler.limit.limit == 4
+
+
+def test_scheduler_is_rate_limited():
+    scheduler = Scheduler(FakeBackend({}), concurrency=8, rate=200, burst=1)
+    start = time.monotonic()
+    assert len(list(scheduler.run(range(21)))) == 21
+    assert time.monotonic() - start >= 20 / 200
+
+
+def _png(value: int = 0) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((4, 4, 3), value, np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class _ScriptedHandler(BaseHTTPRequestHandler):
+    # answers each path with its scripted (status, headers, body) responses in turn,
+    # repeating the last one, and 404 for unknown paths
+    def do_GET(self):
+        self.server.log.append((self.path, time.monotonic()))
+        responses = self.server.script.get(self.path, [(404, {}, b"")])
+        status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def media_server(serve):
+    server = serve(_ScriptedHandler)
+    server.script = {}
+    return server
+
+
+def _table(server, paths: dict) -> pd.DataFrame:
+    # one app per path, e.g. {"com.a": "/a.png"}
+    return pd.DataFrame(
+        {"appId": list(paths), "icon": [server.url + p for p in paths.values()]}
+    )
+
+
+def _requests(server, path: str) -> list[float]:
+    return [t for p, t in server.log if p == path]
+
+
+def test_download_media_honours_retry_after(media_server, tmp_path):
+    media_server.script["/a.png"] = [
+        (429, {"Retry-After": "1"}, b""),
+        (200, {}, _png()),
+    ]
+    table = _table(media_server, {"com.a": "/a.png"})
+    counts = download_media(table, tmp_path, backoff=0.01, rate=0)
+    assert counts == {"downloaded": 1}
+    first, second = _requests(media_server, "/a.png")
+    assert second - first >= 0.9
+    assert (tmp_path / "com-a" / "icon.png").read_bytes() == _png()
+
+
+def test_download_media_retries_server_errors_but_not_missing_files(
+    media_server, tmp_path
+):
+    media_server.script["/a"] = [(503, {}, b""), (500, {}, b""), (200, {}, _png(1))]
+    media_server.script["/b"] = [(503, {}, b"")]
+    table = _table(media_server, {"com.a": "/a", "com.b": "/b", "com.c": "/c"})
+    counts = download_media(table, tmp_path, retries=2, backoff=0.01, rate=0)
+    assert counts == {"downloaded": 1, "failed": 2}
+    # the extension is sniffed from the bytes
+    assert (tmp_path / "com-a" / "icon.png").read_bytes() == _png(1)
+    assert len(_requests(media_server, "/a")) == 3
+    assert len(_requests(media_server, "/b")) == 3  # gave up after the retries
+    assert len(_requests(media_server, "/c")) == 1  # 404 is permanent
+    # no temporary files are left behind by the atomic writes
+    assert sorted(p.name for p in tmp_path.rglob("*") if p.is_file()) == [
+        DownloadJournal.FILENAME,
+        "icon.png",
+    ]
+
+    # the next run skips the download and the 404, and tries the 503 again
+    media_server.script["/b"] = [(200, {}, _png(2))]
+    counts = download_media(table, tmp_path, backoff=0.01, rate=0)
+    assert counts == {"skipped": 2, "downloaded": 1}
+    assert len(_requests(media_server, "/c")) == 1
+    assert download_media(table, tmp_path, retry_failed=True, rate=0) == {
+        "skipped": 2,
+        "failed": 1,
+    }
+
+
+def test_download_media_resumes_from_a_half_written_journal(media_server, tmp_path):
+    for name in "abc":
+        media_server.script[f"/{name}.png"] = [(200, {}, _png())]
+    table = _table(media_server, {"com.a": "/a.png", "com.b": "/b.png"})
+    assert download_media(table, tmp_path, rate=0) == {"downloaded": 2}
+    # as if the run was killed while writing the next line
+    journal = tmp_path / DownloadJournal.FILENAME
+    with open(journal, "a") as f:
+        f.write('{"key": "com.c/icon", "url": "htt')
+    media_server.log.clear()
+
+    table = _table(
+        media_server, {"com.a": "/a.png", "com.b": "/b.png", "com.c": "/c.png"}
+    )
+    assert download_media(table, tmp_path, rate=0) == {"skipped": 2, "downloaded": 1}
+    assert [p for p, _ in media_server.log] == ["/c.png"]
+    entries = [json.loads(line) for line in journal.read_text().splitlines()[-1:]]
+    assert entries == [
+        {
+            "key": "com.c/icon",
+            "url": media_server.url + "/c.png",
+            "file": "com-c/icon.png",
+            "bytes": len(_png()),
+        }
+    ]
+    assert download_media(table, tmp_path, rate=0) == {"skipped": 3}
+
+
+def test_atomic_write_leaves_nothing_on_failure(tmp_path, monkeypatch):
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(_http.os, "replace", fail)
+    with pytest.raises(OSError):
+        _http._atomic_write(tmp_path / "a.png", b"data")
+    assert not list(tmp_path.iterdir())
+
+
+def test_host_rate_limiter_limits_each_host_separately():
+    limiter = HostRateLimiter(20, burst=1, overrides={"fast.example": 0})
+    assert limiter.bucket("http://a.example/x") is limiter.bucket("http://A.example/y")
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire("http://a.example/icon.png")
+    assert time.monotonic() - start >= 0.15  # 4 waits of 1/20 s
+    start = time.monotonic()
+    limiter.acquire("http://b.example/icon.png")  # its own, full bucket
+    for _ in range(100):
+        limiter.acquire("http://fast.example/icon.png")  # not limited
+    assert time.monotonic() - start < 0.05
@@ -0,0 +1,105 @@
+import json
+import tarfile
+
+import numpy as np
+import pytest
+
+from greybox.utils import ShardReader, ShardWriter
+
+
+def _images(n: int, seed: int = 0) -> list[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    channels = [1, 3, 4]
+    return [
+        rng.integers(0, 256, (i % 5 + 1, i % 7 + 2, channels[i % 3]), dtype=np.uint8)
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize("format", ["tar", "array"])
+def test_round_trip_across_shards(tmp_path, format):
+    images = _images(25)
+    with ShardWriter(tmp_path, format=format, max_items=10) as writer:
+        keys = [
+            writer.write(image, source=f"sheets/{i}.png", bbox=(i, 0, 2, 3), index=i)
+            for i, image in enumerate(images)
+        ]
+    assert keys == [f"{i:09d}" for i in range(25)]
+
+    with ShardReader(tmp_path) as reader:
+        assert len(reader) == 25 and len(reader.shards) == 3
+        for i in [0, 9, 10, 24, -1, 13, 3]:
+            np.testing.assert_array_equal(reader[i], images[i])
+        assert reader.meta(12) == {
+            "key": "000000012",
+            "index": 12,
+            "source": "sheets/12.png",
+            "bbox": [12, 0, 2, 3],
+        }
+        assert len(list(reader)) == 25
+        with pytest.raises(IndexError):
+            reader[25]
+    # a single shard can be opened on its own
+    assert len(ShardReader(reader.shards[2])) == 5
+
+
+def test_array_shards_are_memory_mapped(tmp_path):
+    with ShardWriter(tmp_path, format="array") as writer:
+        writer.write(np.zeros((2, 2, 3), np.uint8))
+    item = ShardReader(tmp_path)[0]
+    assert isinstance(item, np.memmap) and not item.flags.writeable
+
+
+def test_tar_shards_are_webdataset_style(tmp_path):
+    with ShardWriter(tmp_path) as writer:
+        writer.write(_images(1)[0], source="a.png")
+    with tarfile.open(tmp_path / "shard-000000.tar") as archive:
+        assert archive.getnames() == ["000000000.png", "000000000.json"]
+        meta = json.load(archive.extractfile("000000000.json"))
+    assert meta == {"key": "000000000", "source": "a.png"}
+
+
+def test_appends_to_existing_shards_and_hides_unfinished_ones(tmp_path):
+    images = _images(6)
+    with ShardWriter(tmp_path) as writer:
+        for image in images[:3]:
+            writer.write(image)
+    writer = ShardWriter(tmp_path)
+    assert writer.write(images[3]) == "000000003"
+    # not closed (as after a crash): the unfinished shard is not visible
+    assert len(ShardReader(tmp_path)) == 3
+    writer.close()
+    reader = ShardReader(tmp_path)
+    assert len(reader) == 4
+    np.testing.assert_array_equal(reader[3], images[3])
+
+
+@pytest.mark.parametrize("image_format", ["png", "webp"])
+def test_tar_shards_round_trip_every_image_format(tmp_path, image_format):
+    rng = np.random.default_rng(1)
+    images = [rng.integers(0, 256, (5, 7, c), dtype=np.uint8) for c in (1, 2, 3, 4)] + [
+        np.full((10, 5, 4), 255, np.uint8)
+    ]  # fully opaque, stored as RGB by webp
+    with ShardWriter(
+        # webp stays lossless whatever the params
+        tmp_path,
+        image_format=image_format,
+        image_params={"lossless": False},
+    ) as writer:
+        for image in images:
+            writer.write(image)
+    reader = ShardReader(tmp_path)
+    for i, image in enumerate(images):
+        np.testing.assert_array_equal(reader[i], image)
+
+
+def test_rejects_invalid_images(tmp_path):
+    with ShardWriter(tmp_path) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((2, 2), np.float32))
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((2, 2, 2, 2), np.uint8))
+    with pytest.raises(ValueError):
+        ShardWriter(tmp_path, format="zip")
+    with pytest.raises(ValueError, match="lossy"):
+        ShardWriter(tmp_path, image_format="jpeg")
@@ -0,0 +1,176 @@
+import io
+import os
+import tarfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from greybox.utils import FileClassifier, FileExtractor
+from greybox.utils import _sniff
+from greybox.utils._sniff import SNIFF_SIZE, sniff, sniff_file, suffix_of
+
+
+def _image(format: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(np.zeros((4, 4, 3), np.uint8)).save(buffer, format)
+    return buffer.getvalue()
+
+
+def _tar_gz() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        info = tarfile.TarInfo("a.png")
+        info.size = 3
+        archive.addfile(info, io.BytesIO(b"abc"))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "format, ext",
+    [
+        ("PNG", ".png"),
+        ("JPEG", ".jpeg"),
+        ("GIF", ".gif"),
+        ("BMP", ".bmp"),
+        ("TIFF", ".tiff"),
+        ("WEBP", ".webp"),
+        ("ICO", ".ico"),
+    ],
+)
+def test_sniff_recognises_images(format, ext):
+    assert sniff(_image(format)[:SNIFF_SIZE]) == ext
+
+
+def test_sniff_other_types_and_content_types():
+    assert sniff(b"PK\x03\x04rest") == ".zip"
+    assert sniff(b"\x00\x00\x00\x18ftypmp42") == ".mp4"
+    assert sniff(b"\x00\x00\x00\x18ftypavif") == ".avif"
+    assert sniff(b"wOF2...") == ".woff2"
+    assert sniff(b"\x00" * 257 + b"ustar\x0000") == ".tar"
+    assert sniff(b'  <?xml version="1.0"?>\n<svg xmlns="...">') == ".svg"
+    # the content type is only used if the bytes are not recognised
+    assert sniff(b"<html>", "image/png; charset=binary") == ".png"
+    assert sniff(_image("GIF"), "image/png") == ".gif"
+    assert sniff(b"<html>", "text/html") is None
+    assert sniff(b"") is None
+
+
+def test_suffix_of():
+    assert suffix_of("Pack.TAR.GZ") == ".tar.gz"
+    assert suffix_of("a/b.c/icon.JPG") == ".jpeg"
+    assert suffix_of("pack.tgz") == ".tar.gz"
+    assert suffix_of("notes.gz") == ".gz"
+    assert suffix_of("README") == ""
+
+
+def test_sniff_file_trusts_the_bytes_over_the_name(tmp_path):
+    files = {
+        "icon.jpg": _image("PNG"),  # mislabeled
+        "ICON.PNG": _image("PNG"),
+        "download": _image("GIF"),
+        "pack.tar.gz": _tar_gz(),
+        "pack.dat": _tar_gz(),
+        "font.woff2": b"not really",  # unrecognised, named for a known type
+        "notes.txt": b"hello",
+        "empty.png": b"",
+    }
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    assert {name: sniff_file(tmp_path / name) for name in files} == {
+        "icon.jpg": ".png",
+        "ICON.PNG": ".png",
+        "download": ".gif",
+        "pack.tar.gz": ".tar.gz",
+        "pack.dat": ".gz",
+        "font.woff2": ".woff2",
+        "notes.txt": None,
+        "empty.png": None,
+    }
+    assert sniff_file(tmp_path / "missing.png") is None
+    assert sniff_file("a.bin", _image("JPEG")[:SNIFF_SIZE]) == ".jpeg"
+
+
+def _files(root, n: int) -> list:
+    formats = ["PNG", "JPEG", "GIF"]
+    paths = []
+    for i in range(n):
+        path = root / f"{i:03d}"
+        path.write_bytes(_image(formats[i % 3]) if i % 4 else b"text")
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_classify_all_keeps_the_order(tmp_path, workers):
+    paths = _files(tmp_path, 50)
+    expected = [(path, sniff_file(path)) for path in paths]
+    classifier = FileClassifier(workers=workers, batch_size=7)
+    assert list(classifier.classify_all(paths)) == expected
+    assert classifier.category(".jpeg") == "image" and classifier.category(None) is None
+
+
+def test_classifier_cache_skips_unchanged_files(tmp_path, monkeypatch):
+    (tmp_path / "files").mkdir()
+    paths = _files(tmp_path / "files", 10)
+    cache = tmp_path / "cache" / "sniff.sqlite"
+    reads = []
+
+    def counting_sniff_file(path, header=None):
+        reads.append(path)
+        return sniff_file(path, header)
+
+    monkeypatch.setattr(_sniff, "sniff_file", counting_sniff_file)
+    classifier = FileClassifier(cache=cache)
+    first = list(classifier.classify_all(paths))
+    classifier.close()
+    assert len(reads) == 10
+
+    # a second scan, by a new process, only reads the changed file
+    paths[1].write_bytes(b"text")
+    os.utime(paths[1], ns=(0, 0))
+    classifier = FileClassifier(cache=cache, workers=2, batch_size=3)
+    second = list(classifier.classify_all(paths))
+    assert classifier.classify(paths[1]) is None
+    classifier.close()
+    assert reads[10:] == [paths[1]]
+    assert second == [(paths[1], None) if p == paths[1] else (p, e) for p, e in first]
+
+
+def test_find_all_finds_files_by_content(tmp_path):
+    files = {
+        "ICON.PNG": _image("PNG"),
+        "photo.JPG": _image("JPEG"),
+        "download": _image("GIF"),
+        "renamed.txt": _image("BMP"),
+        "font.WOFF2": b"wOF2...",
+        "notes.txt": b"hello",
+    }
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    found = {p.name for p in FileExtractor().find_all(tmp_path, depth=0)}
+    assert found == {"ICON.PNG", "photo.JPG", "download", "renamed.txt", "font.WOFF2"}
+
+
+def test_find_all_classifies_each_file_once(tmp_path, monkeypatch):
+    import zipfile
+
+    reads = []
+
+    def counting_sniff_file(path, header=None):
+        reads.append(path.name)
+        return sniff_file(path, header)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("inner.png", _image("PNG"))
+    (tmp_path / "ICON.PNG").write_bytes(_image("PNG"))
+    (tmp_path / "pack.zip").write_bytes(buffer.getvalue())
+    # an archive without a suffix
+    (tmp_path / "download").write_bytes(buffer.getvalue())
+    (tmp_path / "link.png").symlink_to(tmp_path / "ICON.PNG")
+    monkeypatch.setattr(_sniff, "sniff_file", counting_sniff_file)
+    found = [p.name for p in FileExtractor().find_all(tmp_path)]
+    assert sorted(found) == ["ICON.PNG", "inner.png", "inner.png"]
+    # the symlink is skipped, the archives are only sniffed by the walk
+    assert sorted(reads) == sorted(["download", "pack.zip", *found])
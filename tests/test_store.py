@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from greybox.scrape import MetadataStore
+
+
+def test_write_drops_duplicate_keys(tmp_path):
+    with MetadataStore(tmp_path / "meta.sqlite") as store:
+        assert store.write([{"appId": "a", "title": "A"}, {"appid": "b"}]) == 2
+        # already stored, and repeated within one write
+        assert store.write([{"appid": "a", "title": "new"}, {"appid": "c"}] * 2) == 1
+        assert len(store) == 3 and "c" in store and "d" not in store
+        assert store.existing_ids() == {"a", "b", "c"}
+        assert store.read(["appId", "title"]).to_dict("records")[0] == {
+            "appid": "a",
+            "title": "A",
+        }
+    # persisted across sessions
+    with MetadataStore(tmp_path / "meta.sqlite") as store:
+        assert store.write([{"appid": "b"}]) == 0
+        assert len(store) == 3
+
+
+def test_write_adds_columns_and_serializes_values(tmp_path):
+    with MetadataStore(tmp_path / "meta.sqlite") as store:
+        store.write(pd.DataFrame({"appid": ["a"], "price": [0.99]}))
+        store.write([{"appid": "b", "categories": ["Puzzle", "Casual"]}])
+        assert store.columns == ["appid", "price", "categories"]
+        frame = store.read()
+        assert (
+            frame["categories"].isna()[0]
+            and frame["categories"][1] == '["Puzzle", "Casual"]'
+        )
+        chunks = list(store.read(["appid", "missing"], chunksize=1))
+        assert [c.columns.tolist() for c in chunks] == [["appid"], ["appid"]]
+        with pytest.raises(KeyError):
+            store.write([{"title": "no key"}])
+
+
+def test_import_csv(tmp_path):
+    pd.DataFrame({"appId": ["a", "b", "a"], "title": ["A", "B", "C"]}).to_csv(
+        tmp_path / "old.csv", index=False
+    )
+    with MetadataStore(tmp_path / "meta.sqlite") as store:
+        assert store.import_csv([tmp_path / "old.csv"]) == 2
+        assert store.read(["title"])["title"].tolist() == ["A", "B"]